@@ -4,9 +4,11 @@ import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap, BoundaryNorm
 import numpy as np
 import matplotlib.patches as mpatches
-import geopandas as gpd
 from matplotlib.offsetbox import AnchoredOffsetbox, TextArea, HPacker, VPacker, DrawingArea
 from matplotlib.patches import Rectangle
+from uw211.cache import read_csv_cached
+from uw211.bivariate import bivariate_classify
+from uw211.geo import load_zip_shapes
 
 # to open virtual environment: venv\Scripts\activate
 
@@ -15,7 +17,7 @@ df_callers = pd.read_csv('New_211_Client_Cleaned.csv')
 df_callers['zip_code'] = df_callers['zip_code'].astype(str).str.zfill(5)
 
 # load ZIP-level demographic indicators (Poverty & ALICE)
-df_demo = pd.read_csv('211 Area Indicators_ZipZCTA.csv', low_memory=False)
+df_demo = read_csv_cached('211 Area Indicators_ZipZCTA.csv')
 df_demo['zip_code'] = df_demo['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
 df_demo = df_demo[['zip_code', 'Pct_Poverty_Households', 'Pct_Below.ALICE_Households']]
 df_demo.columns = ['zip_code', 'poverty_rate', 'poverty_alice_sum']
@@ -30,8 +32,6 @@ df = pd.merge(df_callers, df_demo, on='zip_code', how='inner')
 df = df.dropna(subset=['callers_per_1000', 'poverty_rate', 'alice_rate'])
 
 # !!!! ==== POVERTY RATE vs CALLERS PER 1000 HEAT MAP ==== !!!!
-df['poverty_quartile'] = pd.qcut(df['poverty_rate'], 4, labels=[1, 2, 3, 4])
-df['caller_quartile'] = pd.qcut(df['callers_per_1000'], 4, labels=[1, 2, 3, 4])
 
 color_matrix = [
     ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
@@ -40,14 +40,11 @@ color_matrix = [
     ["#CCCCCC", "#CCCCCC", "#F47925", "#D12626"]
 ]
 
-# empty 4x4 count grid
-count_grid = np.zeros((4, 4), dtype=int)
-
-# count loop (adjusted for 4 quantiles)
-for _, row in df.iterrows():
-    x = int(row["poverty_quartile"]) - 1
-    y = 4 - int(row["caller_quartile"])
-    count_grid[y, x] += 1
+# quartiles of every indicator vs caller rate at once (same cut points as pd.qcut(..., 4)):
+# 4x4 count grids (row 0 = top caller quartile) + each ZIP's cell and color from color_matrix
+grids, cells = bivariate_classify(df, ['poverty_rate', 'alice_rate', 'poverty_alice_sum'], 'callers_per_1000',
+                                  k=4, colors=color_matrix)
+count_grid = grids['poverty_rate']
 
 # plot
 fig, ax = plt.subplots(figsize=(7, 6))
@@ -90,15 +87,7 @@ plt.show()
 
 # !!!! ==== ALICE RATE vs CALLERS PER 1000 HEAT MAP ==== !!!!
 
-df["alice_quartile"] = pd.qcut(df["alice_rate"], 4, labels=[1, 2, 3, 4])
-df["caller_quartile"] = pd.qcut(df["callers_per_1000"], 4, labels=[1, 2, 3, 4])
-
-alice_grid = np.zeros((4, 4), dtype=int)
-
-for _, row in df.iterrows():
-    x = int(row["alice_quartile"]) - 1
-    y = 4 - int(row["caller_quartile"])  # 4 - since we're in a 4x4 grid
-    alice_grid[y, x] += 1
+alice_grid = grids['alice_rate']
 
 color_matrix_alice = [
     ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
@@ -147,15 +136,7 @@ plt.tight_layout()
 plt.show()
 
 # !!!! ==== POVERTY + ALICE SUM vs CALLERS PER 1000 HEAT MAP ==== !!!!
-df["sum_quartile"] = pd.qcut(df["poverty_alice_sum"], 4, labels=[1, 2, 3, 4])
-df["caller_quartile"] = pd.qcut(df["callers_per_1000"], 4, labels=[1, 2, 3, 4])
-
-sum_grid = np.zeros((4, 4), dtype=int)
-
-for _, row in df.iterrows():
-    x = int(row["sum_quartile"]) - 1
-    y = 4 - int(row["caller_quartile"])  # reverse Y for top-bottom
-    sum_grid[y, x] += 1
+sum_grid = grids['poverty_alice_sum']
 
 color_matrix_sum = [
     ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
@@ -211,29 +192,11 @@ AND REFLECTING THAT INFO BY COLOR CODING THE ZIPS ON A MAP
 THE FOLLOWING CODE IS JUST THAT
 
 '''
-# combine quartile positions into a tuple (y, x) format
-df['bivariate_cell'] = list(zip(
-    4 - df['caller_quartile'].astype(int),  # y = reversed caller quartile
-    df['poverty_quartile'].astype(int) - 1  # x = poverty quartile (0-based)
-))
-
-# define color matrix
-color_matrix = [
-    ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
-    ["#5082F0", "#CCCCCC", "#CCCCCC", "#CCCCCC"],
-    ["#CCCCCC", "#CCCCCC", "#CCCCCC", "#F47925"],
-    ["#CCCCCC", "#CCCCCC", "#F47925", "#D12626"]
-]
+# each ZIP's heat map cell (caller quartile row, poverty quartile column) and its color, from bivariate_classify above
+df['bivariate_color'] = cells['poverty_rate_color']
 
-# map (y, x) to color
-color_dict = {(y, x): color_matrix[y][x] for y in range(4) for x in range(4)}
-df['bivariate_color'] = df['bivariate_cell'].map(color_dict)
-
-# load and prepare geojson
-geojson_url = 'https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json'
-gdf = gpd.read_file(geojson_url)
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
-gdf = gdf[gdf['zip_code'].isin(df['zip_code'])]
+# load and prepare geojson (only ZIPs with caller data)
+gdf = load_zip_shapes(df['zip_code'])
 gdf = gdf.merge(df[['zip_code', 'bivariate_color']], on='zip_code', how='left')
 
 
@@ -306,25 +269,8 @@ plt.show()
 NOW WE'RE DOING THE SAME THING BUT WITH ALICE RATE
 AND CALLERS PER 1000
 '''
-# combine quartile positions into a tuple (y, x) format
-df['bivariate_cell_alice'] = list(zip(
-    4 - df['caller_quartile'].astype(int),  # y = reversed caller quartile
-    df['alice_quartile'].astype(int) - 1     # x = alice quartile (0-based)
-))
-
-# define the color matrix again for mapping
-color_matrix_alice = [
-    ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
-    ["#5082F0", "#CCCCCC", "#CCCCCC", "#CCCCCC"],
-    ["#CCCCCC", "#CCCCCC", "#CCCCCC", "#F47925"],
-    ["#CCCCCC", "#CCCCCC", "#F47925", "#D12626"]
-]
-
-# flatten it to a dict mapping (y, x) → color
-color_dict_alice = {(y, x): color_matrix_alice[y][x] for y in range(4) for x in range(4)}
-
-# assign each zip its color
-df['bivariate_color_alice'] = df['bivariate_cell_alice'].map(color_dict_alice)
+# assign each zip its color (caller quartile row, alice quartile column)
+df['bivariate_color_alice'] = cells['alice_rate_color']
 
 # merge with gdf that now has bivariate_color_alice
 gdf = gdf.merge(df[['zip_code', 'bivariate_color_alice']], on='zip_code', how='left')
@@ -403,25 +349,8 @@ plt.show()
 NOW WE'RE DOING THE SAME THING BUT WITH POVERTY + ALICE SUM
 AND CALLERS PER 1000    
 '''
-# combine quartile positions into a tuple (y, x) format
-df['bivariate_cell_sum'] = list(zip(
-    4 - df['caller_quartile'].astype(int),  # y = reversed caller quartile
-    df['sum_quartile'].astype(int) - 1      # x = sum quartile (0-based)
-))
-
-# define the color matrix again for mapping
-color_matrix_sum = [
-    ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
-    ["#5082F0", "#CCCCCC", "#CCCCCC", "#CCCCCC"],
-    ["#CCCCCC", "#CCCCCC", "#CCCCCC", "#F47925"],
-    ["#CCCCCC", "#CCCCCC", "#F47925", "#D12626"]
-]
-
-# flatten it to a dict mapping (y, x) → color
-color_dict_sum = {(y, x): color_matrix_sum[y][x] for y in range(4) for x in range(4)}
-
-# assign each zip its color
-df['bivariate_color_sum'] = df['bivariate_cell_sum'].map(color_dict_sum)
+# assign each zip its color (caller quartile row, poverty + alice sum quartile column)
+df['bivariate_color_sum'] = cells['poverty_alice_sum_color']
 
 # merge with gdf that now has bivariate_color_sum
 gdf = gdf.merge(df[['zip_code', 'bivariate_color_sum']], on='zip_code', how='left')
@@ -1,13 +1,19 @@
-import geopandas as gpd
 import pandas as pd
-from esda.moran import Moran
 import matplotlib.pyplot as plt
 from esda.moran import Moran_Local
 from splot.esda import lisa_cluster
-from libpysal.weights import Queen
 import numpy as np
+from uw211.cache import read_csv_cached
+from uw211.geo import load_zip_shapes
+from uw211.weights import queen_weights
+from uw211.lisa import bivariate_lisa_table, moran_global
+from uw211.rates import moran_rate
 np.random.seed(42)
 
+# 'permutation' (999 draws, the reported results) or 'analytic' for quick exploratory passes:
+# normal-approximation p-values, no permutations, so re-runs with different choices take milliseconds
+INFERENCE = 'permutation'
+
 # to open virtual environment: venv\Scripts\activate
 
 '''
@@ -55,50 +61,52 @@ Example use:
 
 '''
 
-geojson_url = 'https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json'
-gdf = gpd.read_file(geojson_url)
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
+gdf = load_zip_shapes()
 
 df = pd.read_csv("New_211_Client_Cleaned.csv")
 df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
 
 # Morans I: Callers per 1,000 & ZIP
 gdf = gdf[gdf['zip_code'].isin(df['zip_code'])]
-gdf = gdf.merge(df[['zip_code', 'callers_per_1000']], on='zip_code')
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+gdf = gdf.merge(df[['zip_code', 'total_callers', 'callers_per_1000']], on='zip_code')
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
 y = gdf['callers_per_1000'].fillna(0).values
-moran = Moran(y, w)
+moran = moran_global(y, w, INFERENCE)
 print(f"Moran's I: {moran.I:.4f}")
-print(f"P-value (permutation): {moran.p_sim:.4f}")
+print(f"P-value ({moran.inference}): {moran.p:.4f}")
 
 # prep for economic instability Morans I
 # load economic indicator data (poverty + ALICE)
 # load economic indicator data (poverty + ALICE)
-df_demo = pd.read_csv("211 Area Indicators_ZipZCTA.csv")
+df_demo = read_csv_cached("211 Area Indicators_ZipZCTA.csv")
 df_demo['zip_code'] = df_demo['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
 
 # select and rename relevant columns
 # rename columns to match intended usage
-df_demo = df_demo[['zip_code', 'Pct_Poverty_Households', 'Pct_Below.ALICE_Households']]
-df_demo.columns = ['zip_code', 'poverty_rate', 'poverty_alice_sum']
+df_demo = df_demo[['zip_code', 'Pct_Poverty_Households', 'Pct_Below.ALICE_Households', 'Pop_Estimate']]
+df_demo.columns = ['zip_code', 'poverty_rate', 'poverty_alice_sum', 'population']
 
 # merge into GDF
 gdf = gdf.merge(df_demo, on='zip_code', how='left')
 
 gdf['alice_rate'] = gdf['poverty_alice_sum'] - gdf['poverty_rate']
 
+# callers as a rate (Moran_Rate): EB standardized from the caller counts and population instead of
+# callers_per_1000, so low-population ZIPs like 78205 don't drive the result
+moran_eb = moran_rate(gdf['total_callers'], gdf['population'], w, INFERENCE)
+print(f"[Callers, EB rate] Moran's I: {moran_eb.I:.4f}, p = {moran_eb.p:.4f} ({moran_eb.inference})")
+
 # poverty
-moran_pov = Moran(gdf['poverty_rate'].fillna(0).values, w)
-print(f"[Poverty] Moran's I: {moran_pov.I:.4f}, p = {moran_pov.p_sim:.4f}")
+moran_pov = moran_global(gdf['poverty_rate'].fillna(0).values, w, INFERENCE)
+print(f"[Poverty] Moran's I: {moran_pov.I:.4f}, p = {moran_pov.p:.4f} ({moran_pov.inference})")
 
 # ALICE
-moran_alice = Moran(gdf['alice_rate'].fillna(0).values, w)
-print(f"[ALICE] Moran's I: {moran_alice.I:.4f}, p = {moran_alice.p_sim:.4f}")
+moran_alice = moran_global(gdf['alice_rate'].fillna(0).values, w, INFERENCE)
+print(f"[ALICE] Moran's I: {moran_alice.I:.4f}, p = {moran_alice.p:.4f} ({moran_alice.inference})")
 
 # combo
-moran_combo = Moran(gdf['poverty_alice_sum'].fillna(0).values, w)
-print(f"[Poverty+ALICE] Moran's I: {moran_combo.I:.4f}, p = {moran_combo.p_sim:.4f}")
+moran_combo = moran_global(gdf['poverty_alice_sum'].fillna(0).values, w, INFERENCE)
+print(f"[Poverty+ALICE] Moran's I: {moran_combo.I:.4f}, p = {moran_combo.p:.4f} ({moran_combo.inference})")
 
 
 '''
@@ -139,18 +147,21 @@ CODE FOR BIVARIATE MORANS I (ECONOMIC INSTABILITY & CALLER RATE) & VISUALS
 '''
 # !!!! ==== POVERTY & CALLER RATE CODE & VISUAL ==== !!!!
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
+
 
-from esda.moran import Moran_Local_BV
+# all three bivariate tests at once: one spatial lag of the caller rate and one set of permutation draws
+# shared by poverty, ALICE and the combined sum (long table, one block of ZIPs per pair)
+biv = bivariate_lisa_table(gdf, ['poverty_rate', 'alice_rate', 'poverty_alice_sum'], ['callers_per_1000'], w,
+                           permutations=999, seed=42, n_jobs=-1, inference=INFERENCE)
 
-biv_poverty = Moran_Local_BV(gdf['poverty_rate'], gdf['callers_per_1000'], w, permutations=999, seed=42)
+biv_poverty = biv[biv['x'] == 'poverty_rate']
 
 # add results to GDF
-gdf['biv_poverty_I'] = biv_poverty.Is
-gdf['biv_poverty_p'] = biv_poverty.p_sim
-gdf['biv_poverty_quadrant'] = biv_poverty.q
-gdf['biv_poverty_sig'] = biv_poverty.p_sim < 0.05
+gdf['biv_poverty_I'] = biv_poverty['biv_I'].to_numpy()
+gdf['biv_poverty_p'] = biv_poverty['biv_p'].to_numpy()
+gdf['biv_poverty_quadrant'] = biv_poverty['biv_q'].to_numpy(dtype=float)  # NaN where a ZIP had no score
+gdf['biv_poverty_sig'] = biv_poverty['biv_p'].to_numpy() < 0.05
 
 # filter to significant results only
 gdf_plot = gdf[gdf['biv_poverty_sig'] == True]
@@ -208,15 +219,14 @@ plt.show()
 
 # !!!! ==== ALICE & CALLER RATE CODE & VISUAL ==== !!!!
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
 
-biv_alice = Moran_Local_BV(gdf['alice_rate'], gdf['callers_per_1000'], w, permutations=999, seed=42)
+biv_alice = biv[biv['x'] == 'alice_rate']
 
-gdf['biv_alice_I'] = biv_alice.Is
-gdf['biv_alice_p'] = biv_alice.p_sim
-gdf['biv_alice_q'] = biv_alice.q
-gdf['biv_alice_sig'] = biv_alice.p_sim < 0.05
+gdf['biv_alice_I'] = biv_alice['biv_I'].to_numpy()
+gdf['biv_alice_p'] = biv_alice['biv_p'].to_numpy()
+gdf['biv_alice_q'] = biv_alice['biv_q'].to_numpy(dtype=float)
+gdf['biv_alice_sig'] = biv_alice['biv_p'].to_numpy() < 0.05
 
 quad_colors_ALICE = {
     1: '#CCCCCC',
@@ -259,18 +269,17 @@ plt.show()
 
 # !!!! ==== ALICE + POVERTY SUM & CALLER RATE CODE & VISUAL ==== !!!!
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
 
 print(gdf[['poverty_alice_sum', 'callers_per_1000']].head())
 print(gdf[['poverty_alice_sum', 'callers_per_1000']].isna().sum())
 
-biv_combined = Moran_Local_BV(gdf['poverty_alice_sum'], gdf['callers_per_1000'], w, permutations=999, seed=42)
+biv_combined = biv[biv['x'] == 'poverty_alice_sum']
 
-gdf['biv_comb_I'] = biv_combined.Is
-gdf['biv_comb_p'] = biv_combined.p_sim
-gdf['biv_comb_q'] = biv_combined.q
-gdf['biv_comb_sig'] = biv_combined.p_sim < 0.05
+gdf['biv_comb_I'] = biv_combined['biv_I'].to_numpy()
+gdf['biv_comb_p'] = biv_combined['biv_p'].to_numpy()
+gdf['biv_comb_q'] = biv_combined['biv_q'].to_numpy(dtype=float)
+gdf['biv_comb_sig'] = biv_combined['biv_p'].to_numpy() < 0.05
 
 quad_colors_COMBO = {
     1: '#CCCCCC',
@@ -318,26 +327,8 @@ plt.show()
 PRINT DIFF P AND RHO VALS
 '''
 
-moran_cols_pov = [
-    'zip_code', 'poverty_rate', 'callers_per_1000',
-    'biv_poverty_I', 'biv_poverty_p',
-    'biv_poverty_quadrant', 'biv_poverty_sig', 'biv_poverty_label'
-]
-
-moran_cols_alice = [
-    'zip_code', 'alice_rate', 'callers_per_1000',
-    'biv_alice_I', 'biv_alice_p',
-    'biv_alice_q', 'biv_alice_sig', 'biv_alice_label'
-]
-
-moran_cols_sum = [
-    'zip_code', 'poverty_alice_sum', 'callers_per_1000',
-    'biv_comb_I', 'biv_comb_p',
-    'biv_comb_q', 'biv_comb_sig', 'biv_comb_label'
-]
-
-gdf = gdf.reset_index(drop=True)
+# one long table for all three pairs (x, y, values, I, p, quadrant, significance, label)
+biv_labels = {'poverty_rate': quad_labels_POV, 'alice_rate': quad_labels_ALICE, 'poverty_alice_sum': quad_labels_COMBO}
+biv['biv_label'] = [biv_labels[x].get(q) if pd.notna(q) else None for x, q in zip(biv['x'], biv['biv_q'])]
 
-gdf[moran_cols_pov].to_csv('morans_i_data_csvs/Bivariate_Poverty_vs_CallerRate_LISA.csv', index=False)
-gdf[moran_cols_alice].to_csv('morans_i_data_csvs/Bivariate_ALICE_vs_CallerRate_LISA.csv', index=False)
-gdf[moran_cols_sum].to_csv('morans_i_data_csvs/Bivariate_PovertyALICE_vs_CallerRate_LISA.csv', index=False)
\ No newline at end of file
+biv.to_csv('morans_i_data_csvs/Bivariate_LISA_All_Pairs.csv', index=False)
\ No newline at end of file
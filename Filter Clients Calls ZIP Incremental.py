@@ -0,0 +1,30 @@
+from uw211.cache import read_csv_cached
+from uw211.incremental import update_client_counts, STATE_PATH
+
+'''
+Incremental refresh of 'New_211_Client_Cleaned.csv'.
+
+This produces the same ZIP-level caller counts as 'Filter Clients Calls ZIP.py' (valid census ZIPs only,
+callers whose first call is Phantom / Wrong # removed), but only processes the rows that were appended to the
+Client and Interaction tabs since the last run. The first run (or a run after the exports were re-issued
+instead of appended to) processes everything and builds the state in .cache/incremental/.
+
+Use this for the monthly refresh; run 'Filter Clients Calls ZIP.py' when you want the full cleaning
+summaries and maps. Delete the state file to force a full rebuild.
+'''
+
+# load ZIP-level census data (valid ZIP list + population)
+df_area = read_csv_cached('211 Area Indicators_ZipZCTA.csv')
+
+zip_data, summary = update_client_counts(df_area)
+
+print("\n[Incremental Refresh Summary]")
+print(f"Full rebuild: {summary['rebuilt']}")
+print(f"New client rows processed: {summary['new_client_rows']}")
+print(f"New interaction rows processed: {summary['new_interaction_rows']}")
+print(f"Newly counted callers: {summary['new_callers']}")
+print(f"State saved to '{STATE_PATH}'")
+
+# preview top ZIPs
+print("\nTop ZIPs by callers per 1,000 residents:")
+print(zip_data.sort_values(by='callers_per_1000', ascending=False).head(10))
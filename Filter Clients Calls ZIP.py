@@ -1,9 +1,11 @@
 import pandas as pd
-import ast
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import numpy as np
+from uw211.loaders import load_clients, load_interactions
+from uw211.aggregates import build_zip_aggregates
+from uw211.cache import read_csv_cached
+from uw211.geo import load_zip_shapes
 
 '''
 This Python file performs a similar role as 'Client ZIP Code Cleanup.py' but is specifically 
@@ -23,37 +25,21 @@ operations, system diagnostics, or workload evaluation.
 
 
 # load the CSV files
-df_client = pd.read_csv('211 Call Data_Client Tab_All Years.csv', low_memory=False)
-df_area = pd.read_csv('211 Area Indicators_ZipZCTA.csv', low_memory=False)
-df_interaction = pd.read_csv('211 Call Data_Interaction Tab_All Years.csv', low_memory=False)
+# the client + interaction tabs are streamed in chunks with only the columns we use (see uw211/loaders.py),
+# deduped by Client_Id / Interaction_Id and with the 5-digit ZIP + first call type already extracted
+df_client_unique = load_clients()
+df_area = read_csv_cached('211 Area Indicators_ZipZCTA.csv')
+df_interaction = load_interactions()
 
 # drop duplicate Client_Id to get unique callers
-print("Before:", df_client.shape)
-df_client_unique = df_client.drop_duplicates(subset=['Client_Id'])
+print("Before:", df_client_unique.attrs['rows_read'])
 print("After:", df_client_unique.shape)
 
-'''
-Now were cleaning out the ZIPS and ZIPS that were not listed in census data provided by nonprofit
-'''
-# extract 5-digit ZIP codes and standardize
-df_client_unique.loc[:, 'zip_code'] = (
-    df_client_unique['ClientAddressus_ClientAddressus_zip']
-    .astype(str)
-    .str.extract(r'(\d{5})')
-)
-# extract valid ZIPs from census data
-df_area['zip_code'] = df_area['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
-valid_zips = df_area['zip_code'].dropna().unique()
-
-# keep only callers from ZIPs present in the area indicators
-df_client_valid = df_client_unique[df_client_unique['zip_code'].isin(valid_zips)]
-
 '''
 Now were cleaning duplicates of interaction ID
 '''
-# drop duplicate interactions by Interaction_Id
-print("Before deduplication:", df_interaction.shape)
-df_interaction = df_interaction.drop_duplicates(subset=['Interaction_Id'])
+# duplicate interactions by Interaction_Id were dropped while streaming
+print("Before deduplication:", df_interaction.attrs['rows_read'])
 print("After deduplication:", df_interaction.shape)
 
 '''
@@ -62,41 +48,22 @@ Now were cleaning out the call types
 # see raw call types before cleaning
 print(df_interaction['InteractionOption_CallType'].value_counts())
 
-# drop rows where call type is missing
-df_interaction = df_interaction[df_interaction['InteractionOption_CallType'].notna()]
-
-# convert call type to string (if needed)
-df_interaction['InteractionOption_CallType'] = df_interaction['InteractionOption_CallType'].astype(str)
-
-# safely parse and extract the first call type
-def clean_call_type(val):
-    try:
-        parsed = ast.literal_eval(val)
-        return parsed[0] if isinstance(parsed, list) and len(parsed) > 0 else None
-    except:
-        return None
-
-df_interaction['clean_call_type'] = df_interaction['InteractionOption_CallType'].apply(clean_call_type)
-
-# drop rows where parsing failed (i.e., call type is still None)
+# the first call type was parsed while streaming (clean_call_type is None when missing or malformed)
+# drop rows where call type is missing or parsing failed
 df_interaction = df_interaction[df_interaction['clean_call_type'].notna()]
 
 '''
 [Caller Filtering (done after call-level filtering but before removing bad calls)]
 We dedupe to one call per caller, then remove 'Phantom' and 'Wrong #' here to accurately track loss of callers
-'''
 
-# keep only interactions from callers with valid ZIPs
-df_interaction_valid_zip = df_interaction[df_interaction['Client_Id'].isin(df_client_valid['Client_Id'])]
-
-# drop to one call per caller
-df_one_call_per_caller = df_interaction_valid_zip.drop_duplicates(subset='Client_Id')
-total_valid_zip_unique_callers = df_one_call_per_caller['Client_Id'].nunique()
-
-# remove Phantom/Wrong # from that deduped set
-bad_call_types = ['Phantom', 'Wrong #']
-df_callers_final = df_one_call_per_caller[~df_one_call_per_caller['clean_call_type'].isin(bad_call_types)]
-total_final_callers = df_callers_final['Client_Id'].nunique()
+Now were cleaning out the ZIPS and ZIPS that were not listed in census data provided by nonprofit.
+Both ZIP-level variants (this strict one and the inclusive one from 'starter/Old Client ZIP Code Cleanup.py')
+come out of one pass over the deduped data, see uw211/aggregates.py
+'''
+aggregates = build_zip_aggregates(df_client_unique, df_area, df_interaction)
+summary = aggregates['summary']
+total_valid_zip_unique_callers = summary['valid_zip_callers']
+total_final_callers = summary['final_callers']
 
 # Print a clear summary
 print("\n[Caller Filtering Summary]")
@@ -118,44 +85,14 @@ print(f"Bad calls removed: {before_filtering - after_filtering}")
 
 '''
 Finally tying everything together into one new csv
+Now what we need specifically for the Spearmens code later on is a rate, so the CSV also has
+ZIP-level population and callers per 1,000 residents
 '''
-
-# use the cleaned caller list from earlier (after filtering Phantom/Wrong #)
-valid_client_ids = df_callers_final['Client_Id'].unique()
-final_callers = df_client_valid[df_client_valid['Client_Id'].isin(valid_client_ids)]
-
-# count unique callers by ZIP
-zip_counts = final_callers['zip_code'].value_counts().reset_index()
-zip_counts.columns = ['zip_code', 'total_callers']
-
-# save final cleaned ZIP-level callers CSV
-zip_counts.to_csv('New_211_Client_Cleaned.csv', index=False)
+zip_data = aggregates['strict']
 
 # preview top rows
 print("\nTop ZIPs by total unique callers:")
-print(zip_counts.head(10))
-
-'''
-Now what we need specifically for the Spearmens code later on is a rate, the following is that code for the CSV
-We're pulling from ZIP-level population and calculating callers per 1,000 residents
-'''
-
-# count unique callers by ZIP
-zip_counts = final_callers['zip_code'].value_counts().reset_index()
-zip_counts.columns = ['zip_code', 'total_callers']
-
-# get ZIP population
-zip_pop = df_area[['zip_code', 'Pop_Estimate']].dropna()
-zip_pop.columns = ['zip_code', 'population']
-
-# merge caller counts with population
-zip_data = pd.merge(zip_counts, zip_pop, on='zip_code', how='left')
-
-# fill missing population with 1 to avoid divide-by-zero
-zip_data['population'] = zip_data['population'].fillna(1)
-
-# calc callers per 1,000 residents
-zip_data['callers_per_1000'] = (zip_data['total_callers'] / zip_data['population']) * 1000
+print(zip_data[['zip_code', 'total_callers']].head(10))
 
 # save final cleaned and enriched dataset
 zip_data.to_csv('New_211_Client_Cleaned.csv', index=False)
@@ -169,9 +106,7 @@ FINALLY, lets visualize all this scrumptious code
 '''
 
 # load ZIP-level shapefile/GeoJSON
-geojson_url = 'https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json'
-gdf = gpd.read_file(geojson_url)
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
+gdf = load_zip_shapes()
 
 # merge with 2-1-1 ZIP data
 df_map = pd.read_csv('New_211_Client_Cleaned.csv')
@@ -1,12 +1,21 @@
 import pandas as pd
-import geopandas as gpd
-from esda.moran import Moran
 import matplotlib.pyplot as plt
-from esda.moran import Moran_Local
 from splot.esda import lisa_cluster
-from libpysal.weights import Queen
 import numpy as np
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.cache import read_csv_cached
+from uw211.geo import load_zip_shapes
+from uw211.weights import subset_weights
+from uw211.lisa import bivariate_lisa_table, moran_global, moran_local
+from uw211.spearman import spearman_table
 np.random.seed(42)
+
+# 'permutation' (999 draws, the reported results) or 'analytic' for quick exploratory passes:
+# normal-approximation p-values, no permutations, so re-runs with different choices take milliseconds
+INFERENCE = 'permutation'
+
 '''
 !!!!!! ====== BEXAR COUNTY ZIP CODE CLEANED DATASET ====== !!!!!!
 This script loads the cleaned 211 caller data, extracts ZIP codes, and merges it with county
@@ -15,12 +24,11 @@ The resulting dataset contains caller information along with the corresponding c
 This is useful for further analysis or visualization focused on Bexar County.
 '''
 import pandas as pd
-from scipy.stats import spearmanr
 
 df_clean = pd.read_csv('New_211_Client_Cleaned.csv')
 df_clean['zip_code'] = df_clean['zip_code'].astype(str).str.zfill(5)
 
-df_demo = pd.read_csv("211 Area Indicators_ZipZCTA.csv")
+df_demo = read_csv_cached("211 Area Indicators_ZipZCTA.csv")
 df_demo['zip_code'] = df_demo['Zip_Name'].astype(str).str.zfill(5)
 
 df_county_ref = df_demo[['zip_code', 'County_Name']].dropna().drop_duplicates()
@@ -39,9 +47,11 @@ df_final = df_bexar.merge(df_econ, on='zip_code', how='left')
 
 df_final = df_final.dropna(subset=['callers_per_1000', 'poverty_rate', 'alice_rate', 'poverty_alice_sum'])
 
-rho_poverty, pval_poverty = spearmanr(df_final['callers_per_1000'], df_final['poverty_rate'])
-rho_alice, pval_alice = spearmanr(df_final['callers_per_1000'], df_final['alice_rate'])
-rho_combo, pval_combo = spearmanr(df_final['callers_per_1000'], df_final['poverty_alice_sum'])
+# all three indicators vs caller rate at once, with permutation p-values and bootstrap 95% CIs (uw211/spearman.py)
+metrics = {'Poverty Rate': 'poverty_rate', 'ALICE Rate': 'alice_rate', 'Below Alice': 'poverty_alice_sum'}
+df_spearman = spearman_table(df_final, metrics, 'callers_per_1000', n_jobs=-1)
+rho_poverty, rho_alice, rho_combo = df_spearman['Spearman ρ']
+pval_poverty, pval_alice, pval_combo = df_spearman['p-value']
 
 print("\n[Below ALICE Stats - Bexar County]")
 print(df_final['poverty_alice_sum'].describe())
@@ -51,6 +61,7 @@ print("\n[Spearman Correlation Results - Bexar County]")
 print(f"Poverty Rate vs Callers per 1,000 → ρ = {rho_poverty:.3f}, p = {pval_poverty:.4f}")
 print(f"ALICE Rate vs Callers per 1,000 → ρ = {rho_alice:.3f}, p = {pval_alice:.4f}")
 print(f"Combined Poverty + ALICE vs Callers per 1,000 → ρ = {rho_combo:.3f}, p = {pval_combo:.4f}")
+print(df_spearman.to_string(index=False))
 
 df_no_78205 = df_final[df_final['zip_code'] != '78205'].copy()
 
@@ -82,61 +93,60 @@ df = pd.read_csv('bexar_specific/Bexar_County_ZIP_Eco_Indicator_Data.csv')
 df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
 
 # load TX ZIP shapefile
-geojson_url = 'https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json'
-gdf = gpd.read_file(geojson_url)
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
+gdf = load_zip_shapes()
 
 # merge and FILTER to Bexar ZIPs
 gdf = gdf.merge(df, on='zip_code', how='left')
 gdf = gdf[gdf['zip_code'].isin(df['zip_code'])]  # only Bexar ZIPs with data
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = subset_weights(gdf['zip_code'])  # Bexar cut of the statewide Queen contiguity, row-standardized
 
 # run Morans I
 # callers per 1,000
-moran_callers = Moran(gdf['callers_per_1000'].fillna(0).values, w)
-print(f"[Callers/1000] Moran's I: {moran_callers.I:.4f}, p = {moran_callers.p_sim:.4f}")
+moran_callers = moran_global(gdf['callers_per_1000'].fillna(0).values, w, INFERENCE)
+print(f"[Callers/1000] Moran's I: {moran_callers.I:.4f}, p = {moran_callers.p:.4f} ({moran_callers.inference})")
 
 # poverty Rate
-moran_pov = Moran(gdf['poverty_rate'].fillna(0).values, w)
-print(f"[Poverty] Moran's I: {moran_pov.I:.4f}, p = {moran_pov.p_sim:.4f}")
+moran_pov = moran_global(gdf['poverty_rate'].fillna(0).values, w, INFERENCE)
+print(f"[Poverty] Moran's I: {moran_pov.I:.4f}, p = {moran_pov.p:.4f} ({moran_pov.inference})")
 
 # ALICE Rate
-moran_alice = Moran(gdf['alice_rate'].fillna(0).values, w)
-print(f"[ALICE] Moran's I: {moran_alice.I:.4f}, p = {moran_alice.p_sim:.4f}")
+moran_alice = moran_global(gdf['alice_rate'].fillna(0).values, w, INFERENCE)
+print(f"[ALICE] Moran's I: {moran_alice.I:.4f}, p = {moran_alice.p:.4f} ({moran_alice.inference})")
 
 # sum
-moran_combo = Moran(gdf['poverty_alice_sum'].fillna(0).values, w)
-print(f"[Poverty+ALICE] Moran's I: {moran_combo.I:.4f}, p = {moran_combo.p_sim:.4f}")
+moran_combo = moran_global(gdf['poverty_alice_sum'].fillna(0).values, w, INFERENCE)
+print(f"[Poverty+ALICE] Moran's I: {moran_combo.I:.4f}, p = {moran_combo.p:.4f} ({moran_combo.inference})")
 
 '''
 RUNNING LISA FOR MORANS I ECONOMIC INSTABILITY - COMMENT OUT FOR TIME PURPOSES ONCE VISUALS ARE MADE
 '''
 
+# results are memoized under .cache/memo/ (uw211/memo.py), so re-runs with the same data load instead of recomputing
+
 # LISA for callers per 1,000
-lisa_callers = Moran_Local(gdf['callers_per_1000'].fillna(0).values, w)
+lisa_callers = moran_local(gdf['callers_per_1000'].fillna(0).values, w, permutations=999, seed=42)
 fig, ax = lisa_cluster(lisa_callers, gdf, p=0.05)
 plt.title("LISA Cluster Map: Callers per 1,000")
 plt.tight_layout()
 plt.show()
 
 # LISA for poverty rate
-lisa_pov = Moran_Local(gdf['poverty_rate'].fillna(0).values, w)
+lisa_pov = moran_local(gdf['poverty_rate'].fillna(0).values, w, permutations=999, seed=42)
 fig, ax = lisa_cluster(lisa_pov, gdf, p=0.05)
 plt.title("LISA Cluster Map: Poverty Rate")
 plt.tight_layout()
 plt.show()
 
 # LISA for ALICE rate
-lisa_alice = Moran_Local(gdf['alice_rate'].fillna(0).values, w)
+lisa_alice = moran_local(gdf['alice_rate'].fillna(0).values, w, permutations=999, seed=42)
 fig, ax = lisa_cluster(lisa_alice, gdf, p=0.05)
 plt.title("LISA Cluster Map: ALICE Rate")
 plt.tight_layout()
 plt.show()
 
 # LISA for poverty + ALICE (sum)
-lisa_combo = Moran_Local(gdf['poverty_alice_sum'].fillna(0).values, w)
+lisa_combo = moran_local(gdf['poverty_alice_sum'].fillna(0).values, w, permutations=999, seed=42)
 fig, ax = lisa_cluster(lisa_combo, gdf, p=0.05)
 plt.title("LISA Cluster Map: Below Alice")
 plt.tight_layout()
@@ -148,18 +158,21 @@ CODE FOR BIVARIATE MORANS I (ECONOMIC INSTABILITY & CALLER RATE) & VISUALS
 '''
 # !!!! ==== POVERTY & CALLER RATE CODE & VISUAL ==== !!!!
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = subset_weights(gdf['zip_code'])  # Bexar cut of the statewide Queen contiguity, row-standardized
 
-from esda.moran import Moran_Local_BV
 
-biv_poverty = Moran_Local_BV(gdf['poverty_rate'], gdf['callers_per_1000'], w, permutations=999, seed=42)
+# all three bivariate tests at once: one spatial lag of the caller rate and one set of permutation draws
+# shared by poverty, ALICE and the combined sum (long table, one block of ZIPs per pair)
+biv = bivariate_lisa_table(gdf, ['poverty_rate', 'alice_rate', 'poverty_alice_sum'], ['callers_per_1000'], w,
+                           permutations=999, seed=42, n_jobs=-1, inference=INFERENCE)
+
+biv_poverty = biv[biv['x'] == 'poverty_rate']
 
 # add results to GDF
-gdf['biv_poverty_I'] = biv_poverty.Is
-gdf['biv_poverty_p'] = biv_poverty.p_sim
-gdf['biv_poverty_quadrant'] = biv_poverty.q
-gdf['biv_poverty_sig'] = biv_poverty.p_sim < 0.05
+gdf['biv_poverty_I'] = biv_poverty['biv_I'].to_numpy()
+gdf['biv_poverty_p'] = biv_poverty['biv_p'].to_numpy()
+gdf['biv_poverty_quadrant'] = biv_poverty['biv_q'].to_numpy(dtype=float)  # NaN where a ZIP had no score
+gdf['biv_poverty_sig'] = biv_poverty['biv_p'].to_numpy() < 0.05
 
 # filter to significant results only
 gdf_plot = gdf[gdf['biv_poverty_sig'] == True]
@@ -217,15 +230,14 @@ plt.show()
 
 # !!!! ==== ALICE & CALLER RATE CODE & VISUAL ==== !!!!
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = subset_weights(gdf['zip_code'])  # Bexar cut of the statewide Queen contiguity, row-standardized
 
-biv_alice = Moran_Local_BV(gdf['alice_rate'], gdf['callers_per_1000'], w, permutations=999, seed=42)
+biv_alice = biv[biv['x'] == 'alice_rate']
 
-gdf['biv_alice_I'] = biv_alice.Is
-gdf['biv_alice_p'] = biv_alice.p_sim
-gdf['biv_alice_q'] = biv_alice.q
-gdf['biv_alice_sig'] = biv_alice.p_sim < 0.05
+gdf['biv_alice_I'] = biv_alice['biv_I'].to_numpy()
+gdf['biv_alice_p'] = biv_alice['biv_p'].to_numpy()
+gdf['biv_alice_q'] = biv_alice['biv_q'].to_numpy(dtype=float)
+gdf['biv_alice_sig'] = biv_alice['biv_p'].to_numpy() < 0.05
 
 quad_colors_ALICE = {
     1: '#CCCCCC',
@@ -268,18 +280,17 @@ plt.show()
 
 # !!!! ==== ALICE + POVERTY SUM & CALLER RATE CODE & VISUAL ==== !!!!
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = subset_weights(gdf['zip_code'])  # Bexar cut of the statewide Queen contiguity, row-standardized
 
 print(gdf[['poverty_alice_sum', 'callers_per_1000']].head())
 print(gdf[['poverty_alice_sum', 'callers_per_1000']].isna().sum())
 
-biv_combined = Moran_Local_BV(gdf['poverty_alice_sum'], gdf['callers_per_1000'], w, permutations=999, seed=42)
+biv_combined = biv[biv['x'] == 'poverty_alice_sum']
 
-gdf['biv_comb_I'] = biv_combined.Is
-gdf['biv_comb_p'] = biv_combined.p_sim
-gdf['biv_comb_q'] = biv_combined.q
-gdf['biv_comb_sig'] = biv_combined.p_sim < 0.05
+gdf['biv_comb_I'] = biv_combined['biv_I'].to_numpy()
+gdf['biv_comb_p'] = biv_combined['biv_p'].to_numpy()
+gdf['biv_comb_q'] = biv_combined['biv_q'].to_numpy(dtype=float)
+gdf['biv_comb_sig'] = biv_combined['biv_p'].to_numpy() < 0.05
 
 quad_colors_COMBO = {
     1: '#CCCCCC',
@@ -327,29 +338,11 @@ plt.show()
 PRINT DIFF P AND RHO VALS
 '''
 
-moran_cols_pov = [
-    'zip_code', 'poverty_rate', 'callers_per_1000',
-    'biv_poverty_I', 'biv_poverty_p',
-    'biv_poverty_quadrant', 'biv_poverty_sig', 'biv_poverty_label'
-]
-
-moran_cols_alice = [
-    'zip_code', 'alice_rate', 'callers_per_1000',
-    'biv_alice_I', 'biv_alice_p',
-    'biv_alice_q', 'biv_alice_sig', 'biv_alice_label'
-]
-
-moran_cols_combo = [
-    'zip_code', 'poverty_alice_sum', 'callers_per_1000',
-    'biv_comb_I', 'biv_comb_p',
-    'biv_comb_q', 'biv_comb_sig', 'biv_comb_label'
-]
-
-gdf = gdf.reset_index(drop=True)
+# one long table for all three pairs (x, y, values, I, p, quadrant, significance, label)
+biv_labels = {'poverty_rate': quad_labels_POV, 'alice_rate': quad_labels_ALICE, 'poverty_alice_sum': quad_labels_COMBO}
+biv['biv_label'] = [biv_labels[x].get(q) if pd.notna(q) else None for x, q in zip(biv['x'], biv['biv_q'])]
 
-gdf[moran_cols_pov].to_csv('bexar_specific/Bexar_Bivariate_Poverty_LISA.csv', index=False)
-gdf[moran_cols_alice].to_csv('bexar_specific/Bexar_Bivariate_ALICE_LISA.csv', index=False)
-gdf[moran_cols_combo].to_csv('bexar_specific/Bexar_Bivariate_Sum_LISA.csv', index=False)
+biv.to_csv('bexar_specific/Bexar_Bivariate_LISA_All_Pairs.csv', index=False)
 
 # bring in total_callers from df_bexar instead of df
 df_total_callers = df_bexar[['zip_code', 'total_callers']].drop_duplicates()
\ No newline at end of file
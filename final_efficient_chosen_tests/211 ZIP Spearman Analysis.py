@@ -1,21 +1,31 @@
 import pandas as pd
-from scipy.stats import spearmanr
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.ticker import FuncFormatter
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.cache import read_csv_cached
+from uw211.influence import influence_table, leave_k_out
+from uw211.rates import eb_rates
+from uw211.spearman import spearman_table
 
 # to open virtual environment: venv\Scripts\activate
 
+# ZIP left out of the outlier-excluded plots: 78205 as requested by the nonprofit,
+# None = the most influential ZIP from the leave-one-out analysis below
+OUTLIER_ZIP = '78205'
+
 # load cleaned ZIP-level caller data
 df_callers = pd.read_csv('New_211_Client_Cleaned.csv')
 df_callers['zip_code'] = df_callers['zip_code'].astype(str).str.zfill(5)
 
 # load ZIP-level demographic indicators
-df_demo = pd.read_csv('211 Area Indicators_ZipZCTA.csv')
+df_demo = read_csv_cached('211 Area Indicators_ZipZCTA.csv')
 
 # keep correct columns from demo data
-df_demo = df_demo[['GEO.display_label', 'Pct_Poverty_Households', 'Pct_Below.ALICE_Households']]
-df_demo.columns = ['zip_code', 'poverty_rate', 'poverty_alice_sum']
+df_demo = df_demo[['GEO.display_label', 'Pct_Poverty_Households', 'Pct_Below.ALICE_Households', 'Pop_Estimate']]
+df_demo.columns = ['zip_code', 'poverty_rate', 'poverty_alice_sum', 'pop_estimate']
 
 # extract just ZIP codes
 df_demo['zip_code'] = df_demo['zip_code'].astype(str).str.extract(r'(\d{5})')
@@ -34,10 +44,34 @@ df = pd.merge(df_callers, df_demo, on='zip_code', how='inner')
 # drop missing values
 df = df.dropna(subset=['callers_per_1000', 'poverty_rate', 'alice_rate', 'poverty_alice_sum'])
 
-# run Spearman correlations
-rho_poverty, pval_poverty = spearmanr(df['callers_per_1000'], df['poverty_rate'])
-rho_alice, pval_alice = spearmanr(df['callers_per_1000'], df['alice_rate'])
-rho_combo, pval_combo = spearmanr(df['callers_per_1000'], df['poverty_alice_sum'])
+# Empirical Bayes smoothed callers per 1,000 (uw211/rates.py): steadies rates that rest on only a few callers
+# or residents. It doesn't handle 78205 - that rate rests on thousands of callers, so smoothing barely moves it -
+# which is why OUTLIER_ZIP is still dropped by hand for the outlier-excluded plots below
+df['callers_per_1000_eb'] = eb_rates(df['total_callers'], df['pop_estimate'])
+
+# run Spearman correlations: all three indicators ranked once against the caller rate (uw211/spearman.py),
+# plus permutation p-values and bootstrap 95% confidence intervals spread over every core
+metrics = {'Poverty Rate': 'poverty_rate', 'ALICE Rate': 'alice_rate', 'Below Alice': 'poverty_alice_sum'}
+df_spearman = spearman_table(df, metrics, 'callers_per_1000', n_jobs=-1)
+rho_poverty, rho_alice, rho_combo = df_spearman['Spearman ρ']
+pval_poverty, pval_alice, pval_combo = df_spearman['p-value']
+
+# same correlations on the EB smoothed rate (ZIPs with no population estimate left out)
+df_spearman_eb = spearman_table(df, metrics, 'callers_per_1000_eb', n_jobs=-1)
+rho_poverty_eb, rho_alice_eb, rho_combo_eb = df_spearman_eb['Spearman ρ']
+pval_poverty_eb, pval_alice_eb, pval_combo_eb = df_spearman_eb['p-value']
+
+# leave-one-out influence (uw211/influence.py): every rho above and the global Moran's I of each column,
+# recomputed with each ZIP left out in turn, ZIPs ranked by how far their removal moves the results
+full, influence = influence_table(df, list(metrics.values()), 'callers_per_1000')
+influence.to_csv('final_efficient_chosen_tests/211_ZIP_Influence.csv', index=False)
+print("\n[Most Influential ZIPs - Leave-One-Out]")
+print(influence[['zip_code', 'influence'] + [col for col in influence.columns if col.endswith('_change')]]
+      .head(10).to_string(index=False))
+print("\n[Leave-3-Out: Most Influential ZIP Dropped Each Step]")
+print(leave_k_out(df, list(metrics.values()), 'callers_per_1000', k=3).to_string(index=False))
+if OUTLIER_ZIP is None:
+    OUTLIER_ZIP = influence['zip_code'].iloc[0]
 
 # print summary stats
 print("\n[Below Alice Stats]")
@@ -48,13 +82,13 @@ print(f"\nMaximum combined poverty + ALICE rate: {df['poverty_alice_sum'].max()
 df['poverty_rate_percent'] = df['poverty_rate'] * 100
 df['alice_rate_percent'] = df['alice_rate'] * 100
 
-# remove zip 78205 before plotting
-df_no_78205 = df[df['zip_code'] != '78205'].copy()
+# remove the outlier ZIP (78205) before plotting
+df_no_outlier = df[df['zip_code'] != OUTLIER_ZIP].copy()
 
 # add percent columns for visuals
-df_no_78205['poverty_rate_percent'] = df_no_78205['poverty_rate'] * 100
-df_no_78205['alice_rate_percent'] = df_no_78205['alice_rate'] * 100
-df_no_78205['poverty_alice_sum_percent'] = df_no_78205['poverty_alice_sum'] * 100
+df_no_outlier['poverty_rate_percent'] = df_no_outlier['poverty_rate'] * 100
+df_no_outlier['alice_rate_percent'] = df_no_outlier['alice_rate'] * 100
+df_no_outlier['poverty_alice_sum_percent'] = df_no_outlier['poverty_alice_sum'] * 100
 
 # print Spearman correlation results
 print("\n[Spearman Correlation Results]")
@@ -62,6 +96,16 @@ print(f"Poverty Rate vs Callers per 1,000 → ρ = {rho_poverty:.3f}, p = {pval_
 print(f"ALICE Rate vs Callers per 1,000 → ρ = {rho_alice:.3f}, p = {pval_alice:.4f}")
 print(f"Below Alice Rate (Combined Economic Instability) vs Callers per 1,000 → ρ = {rho_combo:.3f}, p = {pval_combo:.4f}")
 
+print("\n[Spearman Correlation Results - EB Smoothed Callers per 1,000]")
+print(f"Poverty Rate vs EB Callers per 1,000 → ρ = {rho_poverty_eb:.3f}, p = {pval_poverty_eb:.4f}")
+print(f"ALICE Rate vs EB Callers per 1,000 → ρ = {rho_alice_eb:.3f}, p = {pval_alice_eb:.4f}")
+print(f"Below Alice Rate vs EB Callers per 1,000 → ρ = {rho_combo_eb:.3f}, p = {pval_combo_eb:.4f}")
+
+print("\n[Spearman Permutation p-values and Bootstrap Confidence Intervals]")
+print(df_spearman.to_string(index=False))
+print("\n[EB Smoothed Callers per 1,000]")
+print(df_spearman_eb.to_string(index=False))
+
 
 '''
 VISUALIZATION CODE
@@ -81,7 +125,7 @@ sns.regplot(
 
 # label all ZIPs
 for _, row in df.iterrows():
-    offset = 15 if row['zip_code'] == '78205' else 5
+    offset = 15 if row['zip_code'] == OUTLIER_ZIP else 5
     plt.annotate(
         row['zip_code'],
         xy=(row['poverty_rate_percent'], row['callers_per_1000']),
@@ -117,7 +161,7 @@ sns.regplot(
 
 # label all ZIPs
 for _, row in df.iterrows():
-    offset = 15 if row['zip_code'] == '78205' else 5
+    offset = 15 if row['zip_code'] == OUTLIER_ZIP else 5
     plt.annotate(
         row['zip_code'],
         xy=(row['alice_rate_percent'], row['callers_per_1000']),
@@ -157,7 +201,7 @@ sns.regplot(
 
 # label all zips
 for _, row in df.iterrows():
-    offset = 15 if row['zip_code'] == '78205' else 5
+    offset = 15 if row['zip_code'] == OUTLIER_ZIP else 5
     plt.annotate(
         row['zip_code'],
         xy=(row['poverty_alice_sum_percent'], row['callers_per_1000']),
@@ -204,7 +248,7 @@ sns.regplot(
 plt.ylim(0, 1000)
 
 # label all ZIPs
-for _, row in df_no_78205.iterrows():
+for _, row in df_no_outlier.iterrows():
     plt.annotate(
         row['zip_code'],
         xy=(row['poverty_rate_percent'], row['callers_per_1000']),
@@ -240,7 +284,7 @@ sns.regplot(
 plt.ylim(0, 1000)
 
 # label all ZIPs
-for _, row in df_no_78205.iterrows():
+for _, row in df_no_outlier.iterrows():
     plt.annotate(
         row['zip_code'],
         xy=(row['alice_rate_percent'], row['callers_per_1000']),
@@ -267,13 +311,13 @@ plt.figure(figsize=(16, 9))
 # scatterplot with smoothed line
 sns.regplot(
     x='poverty_alice_sum_percent', y='callers_per_1000',
-    data=df_no_78205, lowess=True, truncate=False,
+    data=df_no_outlier, lowess=True, truncate=False,
     scatter_kws={'alpha': 0.6}, line_kws={'color': 'purple'}
 )
 # y limit
 plt.ylim(0, 1000)
 # label all zips
-for _, row in df_no_78205.iterrows():
+for _, row in df_no_outlier.iterrows():
     plt.annotate(
         row['zip_code'],
         xy=(row['poverty_alice_sum_percent'], row['callers_per_1000']),
@@ -302,7 +346,7 @@ plt.show()
 !!!!!! ====== NONPROFIT REQUESTED ZOOMED IN SPEARMEN VISUALS - EXCLUDING OUTLIER ====== !!!!!!
 
 '''
-df = df[df['zip_code'] != '78205']
+df = df[df['zip_code'] != OUTLIER_ZIP]
 
 # !!!! ==== POVERTY RATE & CALLER RATE - NO 78205 ==== !!!!
 
@@ -315,7 +359,7 @@ sns.regplot(
     scatter_kws={'alpha': 0.6}, line_kws={'color': 'red'}
 )
 plt.ylim(0, 400)            # ADDED CHANGE IN CODE FOR VISUAL
-for _, row in df_no_78205.iterrows():
+for _, row in df_no_outlier.iterrows():
     plt.annotate(
         row['zip_code'],
         xy=(row['poverty_rate_percent'], row['callers_per_1000']),
@@ -344,7 +388,7 @@ sns.regplot(
     scatter_kws={'alpha': 0.6}, line_kws={'color': 'orange'}
 )
 plt.ylim(0, 400)            # ADDED CHANGE IN CODE FOR VISUAL
-for _, row in df_no_78205.iterrows():
+for _, row in df_no_outlier.iterrows():
     plt.annotate(
         row['zip_code'],
         xy=(row['alice_rate_percent'], row['callers_per_1000']),
@@ -372,7 +416,7 @@ plt.figure(figsize=(16, 9))
 # scatterplot with smoothed trendline
 sns.regplot(
     x='poverty_alice_sum_percent', y='callers_per_1000',
-    data=df_no_78205, lowess=True,
+    data=df_no_outlier, lowess=True,
     scatter_kws={'alpha': 0.6}, line_kws={'color': 'purple'}
 )
 
@@ -380,7 +424,7 @@ sns.regplot(
 plt.ylim(0, 400)
 
 # label all zips
-for _, row in df_no_78205.iterrows():
+for _, row in df_no_outlier.iterrows():
     plt.annotate(
         row['zip_code'],
         xy=(row['poverty_alice_sum_percent'], row['callers_per_1000']),
@@ -403,13 +447,7 @@ plt.tight_layout()
 plt.show()
 
 
-# CODE TO CREATE SPEARMEN CSV
-spearman_results = {
-    'Metric': ['Poverty Rate', 'ALICE Rate', 'Below Alice'],
-    'Spearman ρ': [rho_poverty, rho_alice, rho_combo],
-    'p-value': [pval_poverty, pval_alice, pval_combo]
-}
-df_spearman = pd.DataFrame(spearman_results)
+# CODE TO CREATE SPEARMEN CSV (Metric, Spearman ρ, p-value, then the permutation p-value and 95% CI)
 df_spearman.to_csv('final_efficient_chosen_tests/211_Spearman_Correlation_Results.csv', index=False)
 
 # save merged df to CSV for future reference
@@ -1,9 +1,13 @@
 import matplotlib.pyplot as plt
 import pandas as pd
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.offsetbox import AnchoredText
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.crosstab import ALIGNMENT, CROSSTAB_LABELS, CUBE_PATH, AlignmentCube, lisa_crosstabs
+from uw211.geo import load_zip_shapes
 '''
 This script performs cross-tabulation analysis between LISA results for economic need (poverty) and demand (caller rate).
 It generates a 4x4 matrix showing the relationship between local spatial autocorrelation in poverty rates
@@ -12,43 +16,50 @@ The output is saved as a CSV file for further analysis.
 Technically it's a 5x5 matrix since we include 'NS' (not significant) as a fifth category.
 This is useful for understanding how areas with high/low poverty rates correlate with areas that have high/low demand for 2-1-1 services.
 It helps identify patterns of need and demand that can inform resource allocation and service delivery strategies.
+
+Bexar poverty / below ALICE LISA against the statewide caller rate LISA, both as saved by 'LISA Batch.py'
+(the BEXAR_LISA_*_Results.csv files and the alignment cube), so the matrices and maps always match that run's
+INFERENCE / CORRECTION, cross-tabulated with uw211/crosstab.py, see 'Cross Tabulation LISA x LISA.py'.
+Run 'LISA Batch.py' first.
 '''
 
+bexar_paths = {'poverty': "final_efficient_chosen_tests/BEXAR_LISA_Poverty_Results.csv",
+               'alice': "final_efficient_chosen_tests/BEXAR_LISA_Below_ALICE_Results.csv"}
+for path in [CUBE_PATH, *bexar_paths.values()]:
+    if not os.path.exists(path):
+        sys.exit(f"no LISA results at '{path}', run 'final_efficient_chosen_tests/LISA Batch.py' first")
 
-# load LISA results
-df_callers = pd.read_csv("final_efficient_chosen_tests/LISA_CallerRate_Results.csv")
-df_poverty = pd.read_csv("final_efficient_chosen_tests/BEXAR_LISA_Poverty_Results.csv")
+# statewide caller rate LISA labels
+lisa_callers = AlignmentCube.load().labels()
 
-# merge both on ZIP
-df = pd.merge(df_callers, df_poverty, on='zip_code', how='inner')
+# Bexar poverty + below ALICE LISA labels, a row per ZIP scored on either
+lisa_bexar = None
+for name, path in bexar_paths.items():
+    table = pd.read_csv(path, dtype={'zip_code': str})[['zip_code', f'lisa_{name}_quad_label']]
+    table['zip_code'] = table['zip_code'].str.zfill(5)
+    lisa_bexar = table if lisa_bexar is None else lisa_bexar.merge(table, on='zip_code', how='outer')
 
-# build 5x5 matrix (the 5th row/column is for 'NS' - not significant)
-matrix = pd.crosstab(
-    df['lisa_poverty_quad_label'],  # rows: economic need
-    df['lisa_callers_quad_label'],  # cols: demand
-    rownames=['Poverty LISA'],
-    colnames=['Caller Rate LISA']
-)
+# Bexar ZIPs with a statewide caller label: 5x5 matrices + each ZIP's alignment class / map colour
+matrices, alignment = lisa_crosstabs(lisa_bexar, {'poverty': 'Poverty LISA', 'alice': 'Below ALICE LISA'},
+                                     caller_table=lisa_callers)
 
+# build 5x5 matrix (the 5th row/column is for 'NS' - not significant)
+matrix = matrices['poverty']
 print(matrix)
 matrix.to_csv("final_efficient_chosen_tests/BEXAR_CrossTab_Caller_vs_Poverty.csv")
 print("Cross-tab matrix saved as 'BEXAR_CrossTab_Caller_vs_Poverty.csv'")
 
+# cell fill and text colour per alignment class (aligned, underserved, misaligned, NS)
+cell_colors = ['#E0E0E0', '#D12626', '#21296B', '#FFFFFF']
+text_colors = ['black', 'white', 'white', 'black']
+
 '''
 The following is the visualization code for the cross-tab matrix.
 This part is optional and can be used to create a heatmap of the cross-tab results.
 '''
 
-# load your matrix
-matrix = pd.read_csv("final_efficient_chosen_tests/BEXAR_CrossTab_Caller_vs_Poverty.csv", index_col=0)
-
-# order of labels
-labels = ['HH', 'LH', 'HL', 'LL', 'NS']
-matrix = matrix.reindex(index=labels, columns=labels)
-
-# define cell fill
-blue_cells = [('LH', 'HH'), ('LH', 'HL'), ('LL', 'HH'), ('LL', 'HL')]
-red_cells   = [('HH', 'LH'), ('HH', 'LL'), ('HL', 'LH'), ('HL', 'LL')]
+# order of labels (rows / columns of the matrix)
+labels = CROSSTAB_LABELS
 
 # set up plot
 fig, ax = plt.subplots(figsize=(8, 8))
@@ -58,21 +69,11 @@ ax.invert_yaxis()
 
 for y, row_label in enumerate(labels):
     for x, col_label in enumerate(labels):
-        count = matrix.loc[row_label, col_label] if pd.notna(matrix.loc[row_label, col_label]) else 0
-
-        # fill color
-        if row_label == 'NS' or col_label == 'NS':
-            facecolor = '#FFFFFF'     # white
-            text_color = 'black'
-        elif (row_label, col_label) in blue_cells:
-            facecolor = '#21296B'     # COLD SPOTS
-            text_color = 'white'
-        elif (row_label, col_label) in red_cells:
-            facecolor = '#D12626'     # HOT SPOTS
-            text_color = 'white'
-        else:
-            facecolor = '#E0E0E0'     # gray
-            text_color = 'black'
+        count = matrix.iloc[y, x]
+
+        # fill color: white NS, blue misaligned (COLD SPOTS), red underserved (HOT SPOTS), gray aligned
+        facecolor = cell_colors[ALIGNMENT[y, x]]
+        text_color = text_colors[ALIGNMENT[y, x]]
 
         # draw cell
         ax.add_patch(plt.Rectangle((x, y), 1, 1, facecolor=facecolor, edgecolor='black', linewidth=1))
@@ -110,27 +111,12 @@ Now lets do the same for Below ALICE LISA
 This will create a similar cross-tabulation matrix for Below ALICE rates.
 '''
 
-df_alice = pd.read_csv("final_efficient_chosen_tests/BEXAR_LISA_Below_ALICE_Results.csv")
-# merge on ZIP
-df = pd.merge(df_callers, df_alice, on='zip_code', how='inner')
-
-# create 5x5 matrix
-labels = ['HH', 'LH', 'HL', 'LL', 'NS']
-matrix = pd.crosstab(
-    df['lisa_alice_quad_label'],  # rows
-    df['lisa_callers_quad_label'],  # columns
-    rownames=['Below ALICE LISA'],
-    colnames=['Caller Rate LISA']
-)
-
+# 5x5 matrix, already computed with the poverty one (full grid, missing labels count 0)
+matrix = matrices['alice']
 print(matrix)
 matrix.to_csv("final_efficient_chosen_tests/BEXAR_CrossTab_Caller_vs_Below_ALICE.csv")
 print("Cross-tab matrix saved as 'BEXAR_CrossTab_Caller_vs_Below_ALICE.csv'")
 
-
-# force full grid in case a label is missing
-matrix = matrix.reindex(index=labels, columns=labels, fill_value=0)
-
 fig, ax = plt.subplots(figsize=(8, 8))
 ax.set_xlim(0, 5)
 ax.set_ylim(0, 5)
@@ -138,21 +124,11 @@ ax.invert_yaxis()
 
 for y, row_label in enumerate(labels):
     for x, col_label in enumerate(labels):
-        count = matrix.loc[row_label, col_label]
+        count = matrix.iloc[y, x]
 
         # fill + text color
-        if row_label == 'NS' or col_label == 'NS':
-            facecolor = '#FFFFFF'
-            text_color = 'black'
-        elif (row_label, col_label) in blue_cells:
-            facecolor = '#21296B'
-            text_color = 'white'
-        elif (row_label, col_label) in red_cells:
-            facecolor = '#D12626'
-            text_color = 'white'
-        else:
-            facecolor = '#E0E0E0'
-            text_color = 'black'
+        facecolor = cell_colors[ALIGNMENT[y, x]]
+        text_color = text_colors[ALIGNMENT[y, x]]
 
         # draw box
         ax.add_patch(plt.Rectangle((x, y), 1, 1, facecolor=facecolor, edgecolor='black', linewidth=1))
@@ -189,57 +165,18 @@ Now lets throw all this onto a map
 This will visualize the cross-tab results on a map of Texas ZIP codes.
 '''
 # load ZIP shapefile
-gdf_shape = gpd.read_file("https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json")
-gdf_shape['zip_code'] = gdf_shape['ZCTA5CE10'].astype(str).str.zfill(5)
+gdf_shape = load_zip_shapes()
 
-# merge in LISA results (for Below ALICE map)
-df = pd.merge(df_callers[['zip_code', 'lisa_callers_quad_label']],
-              df_alice[['zip_code', 'lisa_alice_quad_label']],
-              on='zip_code', how='inner')
+# per-ZIP alignment (for Below ALICE map), ZIPs with both a caller and a below ALICE label
+df = alignment.dropna(subset=['alice_color'])
 
 # merge
-df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
 gdf_shape['zip_code'] = gdf_shape['zip_code'].astype(str).str.zfill(5)
 
 gdf = gdf_shape.merge(df, on='zip_code', how='inner')
 
-# create combo label
-gdf['combo'] = list(zip(gdf['lisa_alice_quad_label'], gdf['lisa_callers_quad_label']))
-
-# define combo color logic
-blue_cells = [('LH', 'HH'), ('LH', 'HL'), ('LL', 'HH'), ('LL', 'HL')]
-red_cells   = [('HH', 'LH'), ('HH', 'LL'), ('HL', 'LH'), ('HL', 'LL')]
-ns_cells     = [('NS', x) for x in labels] + [(x, 'NS') for x in labels]
-
-def assign_color(combo):
-    if combo in blue_cells:
-        return '#21296B'  # blue
-    elif combo in red_cells:
-        return '#D12626'  # red
-    elif combo in ns_cells:
-        return '#FFFFFF'  # not significant
-    else:
-        return '#CCCCCC'  # aligned/neutral
-
-# create combo label
-gdf['combo'] = list(zip(gdf['lisa_alice_quad_label'], gdf['lisa_callers_quad_label']))
-
-# define combo color logic
-blue_cells = [('LH', 'HH'), ('LH', 'HL'), ('LL', 'HH'), ('LL', 'HL')]
-red_cells   = [('HH', 'LH'), ('HH', 'LL'), ('HL', 'LH'), ('HL', 'LL')]
-ns_cells     = [('NS', x) for x in labels] + [(x, 'NS') for x in labels]
-
-def assign_color(combo):
-    if combo in blue_cells:
-        return '#21296B'  # blue
-    elif combo in red_cells:
-        return '#D12626'  # red
-    elif combo in ns_cells:
-        return '#FFFFFF'  # not significant
-    else:
-        return '#CCCCCC'  # aligned/neutral
-
-gdf['color'] = gdf['combo'].apply(assign_color)
+# combo color: blue misaligned, red underserved, white not significant, gray aligned/neutral
+gdf['color'] = gdf['alice_color']
 
 
 # filter ZIPs with red or blue color
@@ -1,20 +1,21 @@
 import pandas as pd
-import geopandas as gpd
-from libpysal.weights import Queen
 from esda.moran import Moran_Local
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.geo import load_zip_shapes
+from uw211.weights import subset_weights
 
 df_demo = pd.read_csv('bexar_specific/Bexar_County_ZIP_Eco_Indicator_Data.csv')
 df_demo['zip_code'] = df_demo['zip_code'].astype(str).str.zfill(5)
 
-gdf = gpd.read_file("https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json")
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
-gdf = gdf[gdf['zip_code'].isin(df_demo['zip_code'])]
+# load shapefile (only ZIPs in the demo data)
+gdf = load_zip_shapes(df_demo['zip_code'])
 
 gdf = gdf.merge(df_demo[['zip_code', 'poverty_rate']], on='zip_code', how='left')
 gdf = gdf.dropna(subset=['poverty_rate'])
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = subset_weights(gdf['zip_code'])  # Bexar cut of the statewide Queen contiguity, row-standardized
 
 lisa_poverty = Moran_Local(gdf['poverty_rate'].values, w, permutations=999, seed=42)
 
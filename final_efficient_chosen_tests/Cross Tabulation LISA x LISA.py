@@ -1,9 +1,14 @@
 import matplotlib.pyplot as plt
 import pandas as pd
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.offsetbox import AnchoredText
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.cache import read_csv_cached
+from uw211.crosstab import ALIGNMENT, CROSSTAB_LABELS, CUBE_PATH, AlignmentCube, lisa_crosstabs
+from uw211.geo import load_zip_shapes
 '''
 This script performs cross-tabulation analysis between LISA results for economic need (poverty) and demand (caller rate).
 It generates a 4x4 matrix showing the relationship between local spatial autocorrelation in poverty rates
@@ -12,43 +17,38 @@ The output is saved as a CSV file for further analysis.
 Technically it's a 5x5 matrix since we include 'NS' (not significant) as a fifth category.
 This is useful for understanding how areas with high/low poverty rates correlate with areas that have high/low demand for 2-1-1 services.
 It helps identify patterns of need and demand that can inform resource allocation and service delivery strategies.
-'''
 
+The quad labels come from the alignment cube 'LISA Batch.py' saves (CUBE_PATH), so the matrices and maps here
+always describe the batch run's labels, whatever INFERENCE / CORRECTION it used, and every matrix plus each
+ZIP's underserved / misaligned class comes from uw211/crosstab.py in one pass instead of reading the
+*_Results.csv files back, pd.crosstab per pair and an apply over (need, caller) tuples.
+Run 'LISA Batch.py' first.
+'''
 
-# load LISA results
-df_callers = pd.read_csv("final_efficient_chosen_tests/LISA_CallerRate_Results.csv")
-df_poverty = pd.read_csv("final_efficient_chosen_tests/LISA_Poverty_Results.csv")
+if not os.path.exists(CUBE_PATH):
+    sys.exit(f"no LISA labels at '{CUBE_PATH}', run 'final_efficient_chosen_tests/LISA Batch.py' first")
+lisa = AlignmentCube.load().labels()
 
-# merge both on ZIP
-df = pd.merge(df_callers, df_poverty, on='zip_code', how='inner')
+# every need indicator vs caller rate at once: 5x5 matrices + each ZIP's alignment class / map colour
+matrices, alignment = lisa_crosstabs(lisa, {'poverty': 'Poverty LISA', 'alice': 'Below ALICE LISA'})
 
 # build 5x5 matrix (the 5th row/column is for 'NS' - not significant)
-matrix = pd.crosstab(
-    df['lisa_poverty_quad_label'],  # rows: economic need
-    df['lisa_callers_quad_label'],  # cols: demand
-    rownames=['Poverty LISA'],
-    colnames=['Caller Rate LISA']
-)
-
+matrix = matrices['poverty']
 print(matrix)
 matrix.to_csv("final_efficient_chosen_tests/CrossTab_Caller_vs_Poverty.csv")
 print("Cross-tab matrix saved as 'CrossTab_Caller_vs_Poverty.csv'")
 
+# cell fill and text colour per alignment class (aligned, underserved, misaligned, NS)
+cell_colors = ['#E0E0E0', '#D12626', '#21296B', '#FFFFFF']
+text_colors = ['black', 'white', 'white', 'black']
+
 '''
 The following is the visualization code for the cross-tab matrix.
 This part is optional and can be used to create a heatmap of the cross-tab results.
 '''
 
-# load your matrix
-matrix = pd.read_csv("final_efficient_chosen_tests/CrossTab_Caller_vs_Poverty.csv", index_col=0)
-
-# order of labels
-labels = ['HH', 'LH', 'HL', 'LL', 'NS']
-matrix = matrix.reindex(index=labels, columns=labels)
-
-# define cell fill
-blue_cells = [('LH', 'HH'), ('LH', 'HL'), ('LL', 'HH'), ('LL', 'HL')]
-red_cells   = [('HH', 'LH'), ('HH', 'LL'), ('HL', 'LH'), ('HL', 'LL')]
+# order of labels (rows / columns of the matrix)
+labels = CROSSTAB_LABELS
 
 # set up plot
 fig, ax = plt.subplots(figsize=(8, 8))
@@ -58,21 +58,11 @@ ax.invert_yaxis()
 
 for y, row_label in enumerate(labels):
     for x, col_label in enumerate(labels):
-        count = matrix.loc[row_label, col_label] if pd.notna(matrix.loc[row_label, col_label]) else 0
-
-        # fill color
-        if row_label == 'NS' or col_label == 'NS':
-            facecolor = '#FFFFFF'     # white
-            text_color = 'black'
-        elif (row_label, col_label) in blue_cells:
-            facecolor = '#21296B'     # COLD SPOTS
-            text_color = 'white'
-        elif (row_label, col_label) in red_cells:
-            facecolor = '#D12626'     # HOT SPOTS
-            text_color = 'white'
-        else:
-            facecolor = '#E0E0E0'     # gray
-            text_color = 'black'
+        count = matrix.iloc[y, x]
+
+        # fill color: white NS, blue misaligned (COLD SPOTS), red underserved (HOT SPOTS), gray aligned
+        facecolor = cell_colors[ALIGNMENT[y, x]]
+        text_color = text_colors[ALIGNMENT[y, x]]
 
         # draw cell
         ax.add_patch(plt.Rectangle((x, y), 1, 1, facecolor=facecolor, edgecolor='black', linewidth=1))
@@ -110,27 +100,12 @@ Now lets do the same for Below ALICE LISA
 This will create a similar cross-tabulation matrix for Below ALICE rates.
 '''
 
-df_alice = pd.read_csv("final_efficient_chosen_tests/LISA_Below_ALICE_Results.csv")
-# merge on ZIP
-df = pd.merge(df_callers, df_alice, on='zip_code', how='inner')
-
-# create 5x5 matrix
-labels = ['HH', 'LH', 'HL', 'LL', 'NS']
-matrix = pd.crosstab(
-    df['lisa_alice_quad_label'],  # rows
-    df['lisa_callers_quad_label'],  # columns
-    rownames=['Below ALICE LISA'],
-    colnames=['Caller Rate LISA']
-)
-
+# 5x5 matrix, already computed with the poverty one (full grid, missing labels count 0)
+matrix = matrices['alice']
 print(matrix)
 matrix.to_csv("final_efficient_chosen_tests/CrossTab_Caller_vs_Below_ALICE.csv")
 print("Cross-tab matrix saved as 'CrossTab_Caller_vs_Below_ALICE.csv'")
 
-
-# force full grid in case a label is missing
-matrix = matrix.reindex(index=labels, columns=labels, fill_value=0)
-
 fig, ax = plt.subplots(figsize=(8, 8))
 ax.set_xlim(0, 5)
 ax.set_ylim(0, 5)
@@ -138,21 +113,11 @@ ax.invert_yaxis()
 
 for y, row_label in enumerate(labels):
     for x, col_label in enumerate(labels):
-        count = matrix.loc[row_label, col_label]
+        count = matrix.iloc[y, x]
 
         # fill + text color
-        if row_label == 'NS' or col_label == 'NS':
-            facecolor = '#FFFFFF'
-            text_color = 'black'
-        elif (row_label, col_label) in blue_cells:
-            facecolor = '#21296B'
-            text_color = 'white'
-        elif (row_label, col_label) in red_cells:
-            facecolor = '#D12626'
-            text_color = 'white'
-        else:
-            facecolor = '#E0E0E0'
-            text_color = 'black'
+        facecolor = cell_colors[ALIGNMENT[y, x]]
+        text_color = text_colors[ALIGNMENT[y, x]]
 
         # draw box
         ax.add_patch(plt.Rectangle((x, y), 1, 1, facecolor=facecolor, edgecolor='black', linewidth=1))
@@ -189,25 +154,18 @@ Now lets throw all this onto a map
 This will visualize the cross-tab results on a map of Texas ZIP codes.
 '''
 # load ZIP shapefile
-gdf_shape = gpd.read_file("https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json")
-gdf_shape['zip_code'] = gdf_shape['ZCTA5CE10'].astype(str).str.zfill(5)
+gdf_shape = load_zip_shapes()
 
-# merge in LISA results (for Below ALICE map)
-df = pd.merge(df_callers[['zip_code', 'lisa_callers_quad_label']],
-              df_alice[['zip_code', 'lisa_alice_quad_label']],
-              on='zip_code', how='inner')
+# per-ZIP alignment (for Below ALICE map), ZIPs with both a caller and a below ALICE label
+df = alignment.dropna(subset=['alice_color'])
 
 # merge
-df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
 gdf_shape['zip_code'] = gdf_shape['zip_code'].astype(str).str.zfill(5)
 
 gdf = gdf_shape.merge(df, on='zip_code', how='inner')
 
-# create combo label
-gdf['combo'] = list(zip(gdf['lisa_alice_quad_label'], gdf['lisa_callers_quad_label']))
-
 # load ZIP county mapping from area indicators file
-zip_meta = pd.read_csv("211 Area Indicators_ZipZCTA.csv")
+zip_meta = read_csv_cached("211 Area Indicators_ZipZCTA.csv")
 zip_meta = zip_meta[['Zip_Name', 'County_Name']].drop_duplicates()
 zip_meta['Zip_Name'] = zip_meta['Zip_Name'].astype(str).str.zfill(5)
 
@@ -218,50 +176,18 @@ gdf = gdf.merge(
     how='left'
 )
 
-# define combo color logic
-blue_cells = [('LH', 'HH'), ('LH', 'HL'), ('LL', 'HH'), ('LL', 'HL')]
-red_cells   = [('HH', 'LH'), ('HH', 'LL'), ('HL', 'LH'), ('HL', 'LL')]
-ns_cells     = [('NS', x) for x in labels] + [(x, 'NS') for x in labels]
-
-def assign_color(combo):
-    if combo in blue_cells:
-        return '#21296B'  # blue
-    elif combo in red_cells:
-        return '#D12626'  # red
-    elif combo in ns_cells:
-        return '#FFFFFF'  # not significant
-    else:
-        return '#CCCCCC'  # aligned/neutral
-
 # dissolve counties for black boundaries
 county_boundaries = gdf.dissolve(by='County_Name', as_index=False)
 
-# create combo label
-gdf['combo'] = list(zip(gdf['lisa_alice_quad_label'], gdf['lisa_callers_quad_label']))
-
-# define combo color logic
-blue_cells = [('LH', 'HH'), ('LH', 'HL'), ('LL', 'HH'), ('LL', 'HL')]
-red_cells   = [('HH', 'LH'), ('HH', 'LL'), ('HL', 'LH'), ('HL', 'LL')]
-ns_cells     = [('NS', x) for x in labels] + [(x, 'NS') for x in labels]
-
-def assign_color(combo):
-    if combo in blue_cells:
-        return '#21296B'  # blue
-    elif combo in red_cells:
-        return '#D12626'  # red
-    elif combo in ns_cells:
-        return '#FFFFFF'  # not significant
-    else:
-        return '#CCCCCC'  # aligned/neutral
-
-gdf['color'] = gdf['combo'].apply(assign_color)
+# combo color: blue misaligned, red underserved, white not significant, gray aligned/neutral
+gdf['color'] = gdf['alice_color']
 
 
 # filter ZIPs with red or blue color
 labeled_zips = gdf[gdf['color'].isin(['#21296B', '#D12626'])]
 # Check red ZIPs that have missing county names
 missing_county = labeled_zips[labeled_zips['County_Name'].isna()]
-print(missing_county[['zip_code', 'combo']])
+print(missing_county[['zip_code', 'alice_alignment']])
 
 # plot map
 fig, ax = plt.subplots(figsize=(12, 12))
@@ -324,6 +250,17 @@ blue_zips = labeled_zips[labeled_zips['color'] == '#21296B']['zip_code'].tolist(
 print("Red ZIPs:", red_zips)
 print("Blue ZIPs:", blue_zips)
 print("Total red:", len(red_zips), "Total blue:", len(blue_zips))
+
+# how often those labels hold up under other seeds (written by 'LISA Batch.py')
+ensemble_path = "final_efficient_chosen_tests/LISA_Seed_Ensemble.csv"
+if os.path.exists(ensemble_path):
+    ensemble = pd.read_csv(ensemble_path, dtype={'zip_code': str})
+    ensemble['zip_code'] = ensemble['zip_code'].str.zfill(5)
+    stability = ensemble.set_index('zip_code')[['ens_alice_modal', 'ens_alice_stability', 'ens_alice_p_sd',
+                                                'ens_callers_modal', 'ens_callers_stability', 'ens_callers_p_sd']]
+    for name, zips in [('Red', red_zips), ('Blue', blue_zips)]:
+        print(f"{name} ZIP label stability across seeds (share of seeds giving the modal label):")
+        print(stability.reindex(zips).to_string())
 # Build ZIP text for display
 zip_legend_text = (
     "Underserved ZIPs:\n" + ', '.join(red_zips) + "\n\n" +
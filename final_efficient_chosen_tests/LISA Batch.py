@@ -0,0 +1,132 @@
+import pandas as pd
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.cache import read_csv_cached
+from uw211.crosstab import CUBE_PATH, AlignmentCube
+from uw211.ensemble import ENSEMBLE_SEEDS, lisa_ensemble
+from uw211.geo import load_zip_shapes
+from uw211.lisa import geary_table, hotspot_table, lisa_table
+from uw211.rates import eb_zscores
+
+'''
+One-run version of 'LISA Poverty.py', 'LISA Below Alice.py', 'LISA Caller Rate.py' and the two Bexar copies.
+
+All the variables are scored in one batch (uw211/lisa.py): the 999 conditional permutations (seed 42) are
+drawn once per ZIP set and every variable is scored against them, instead of each script loading the shapes,
+building weights and running Moran_Local for a single column. Each variable still uses only the ZIPs where
+it isn't missing, so the *_Results.csv files start with the same columns the single-variable scripts write.
+
+Also writes LISA_ALICE_Only_Results.csv (ALICE households not counting poverty, below ALICE - poverty),
+which the single scripts didn't have.
+
+INFERENCE = 'analytic' swaps the permutations for normal-approximation p-values (milliseconds, for quick
+exploratory passes); the files then get lisa_<name>_z and lisa_<name>_inference columns saying so.
+
+GI_STAR_Results.csv (Getis-Ord Gi* hot / cold spots) and LOCAL_GEARY_Results.csv (local Geary for each
+variable, plus a multivariate one over poverty, below ALICE and caller rate) come out of the same run,
+reusing the weights and the neighbour draws.
+
+Every file also gets FDR (Benjamini-Hochberg) and Bonferroni adjusted p-values / significance flags after
+the original columns. CORRECTION picks which significance the quad labels use ('none' = raw p < 0.05, as before).
+
+With ENSEMBLE = True, LISA_Seed_Ensemble.csv re-runs the statewide LISA under ENSEMBLE_SEEDS seeds (42, 43, ...)
+in parallel and records how often each ZIP got each quad label and how far its p-value moved (uw211/ensemble.py),
+so labels that only hold up under seed 42 can be spotted. It's off by default: it costs ENSEMBLE_SEEDS full runs.
+
+LISA_CallerRate_EB_Results.csv is the population-aware version of the caller rate LISA (esda's Moran_Local_Rate):
+it scores the Empirical Bayes standardized rate from total_callers and Pop_Estimate (uw211/rates.py), so a ZIP
+with few residents doesn't stand out just because its callers_per_1000 rests on a handful of callers. Downtown
+78205 still stands out: its rate is built on thousands of callers, and its EB z-score stays far above every
+other ZIP's.
+
+LISA_Alignment_Cube.csv lists every combination of statewide quad labels (poverty, below ALICE, ALICE only,
+caller rate) that has ZIPs, with the ZIP codes. The same cube is saved to .cache/lisa/ for querying without
+re-merging the result files, e.g. AlignmentCube.load().zips(poverty='HH', alice_only='NS', callers='LL').
+'''
+
+INFERENCE = 'permutation'
+CORRECTION = 'none'  # 'none', 'fdr' or 'bonferroni'
+ENSEMBLE = False  # seed-stability ensemble, see above
+
+# statewide: poverty + ALICE from the area indicators, caller rate from the cleaned 2-1-1 data
+df_demo = read_csv_cached("211 Area Indicators_ZipZCTA.csv")
+df_demo['zip_code'] = df_demo['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
+df_demo = df_demo[['zip_code', 'Pct_Poverty_Households', 'Pct_Below.ALICE_Households', 'Pop_Estimate']]
+df_demo.columns = ['zip_code', 'poverty_rate', 'alice_rate', 'population']
+df_demo['alice_only_rate'] = df_demo['alice_rate'] - df_demo['poverty_rate']
+
+df_callers = pd.read_csv("New_211_Client_Cleaned.csv")
+df_callers['zip_code'] = df_callers['zip_code'].astype(str).str.zfill(5)
+
+# shapes for every ZIP in either file, each variable gets its own non-missing rows below
+gdf = load_zip_shapes(pd.concat([df_demo['zip_code'], df_callers['zip_code']]).dropna().unique())
+gdf = gdf.merge(df_demo, on='zip_code', how='left')
+gdf = gdf.merge(df_callers[['zip_code', 'total_callers', 'callers_per_1000']], on='zip_code', how='left')
+# EB standardized caller rate, missing where there's no caller count or no population to divide by
+gdf['callers_eb_z'] = eb_zscores(gdf['total_callers'], gdf['population'])
+
+variables = {
+    'poverty': 'poverty_rate',
+    'alice': 'alice_rate',
+    'alice_only': 'alice_only_rate',
+    'callers': 'callers_per_1000',
+}
+# n_jobs=-1: permutations spread over every core, same results as n_jobs=1
+lisa = lisa_table(gdf, variables, n_jobs=-1, inference=INFERENCE, correction=CORRECTION)
+
+
+def save_results(table, name, path):
+    # same columns (and rows) the single-variable LISA scripts write, then the adjusted p-values / flags
+    cols = ['zip_code', f'lisa_{name}_q', f'lisa_{name}_p', f'lisa_{name}_sig', f'lisa_{name}_quad_label',
+            f'lisa_{name}_p_fdr', f'lisa_{name}_sig_fdr', f'lisa_{name}_p_bonferroni', f'lisa_{name}_sig_bonferroni']
+    if INFERENCE == 'analytic':
+        cols += [f'lisa_{name}_z', f'lisa_{name}_inference']  # so approximate p-values can't pass for the real ones
+    table.dropna(subset=[f'lisa_{name}_q'])[cols].to_csv(path, index=False)
+    print(f"LISA {name} saved to '{path}'")
+
+
+save_results(lisa, 'poverty', "final_efficient_chosen_tests/LISA_Poverty_Results.csv")
+save_results(lisa, 'alice', "final_efficient_chosen_tests/LISA_Below_ALICE_Results.csv")
+save_results(lisa, 'alice_only', "final_efficient_chosen_tests/LISA_ALICE_Only_Results.csv")
+save_results(lisa, 'callers', "final_efficient_chosen_tests/LISA_CallerRate_Results.csv")
+
+# all four statewide labels at once: ZIP counts per label combination + the ZIPs in each (uw211/crosstab.py)
+cube = AlignmentCube(lisa, list(variables))
+cube.save()
+cube.cells().to_csv("final_efficient_chosen_tests/LISA_Alignment_Cube.csv", index=False)
+print(f"alignment cube saved to '{CUBE_PATH}' and 'final_efficient_chosen_tests/LISA_Alignment_Cube.csv'")
+
+# caller rate LISA on the EB standardized rate (kept out of `variables`: Gi* needs non-negative values)
+lisa_eb = lisa_table(gdf, {'callers_eb': 'callers_eb_z'}, n_jobs=-1, inference=INFERENCE, correction=CORRECTION)
+save_results(lisa_eb, 'callers_eb', "final_efficient_chosen_tests/LISA_CallerRate_EB_Results.csv")
+
+# Gi* hot / cold spots and local Geary (each variable + poverty / ALICE / callers together) on the same rows,
+# scored against the same cached weights and neighbour draws as the LISA run above
+hotspots = hotspot_table(gdf, variables, n_jobs=-1, inference=INFERENCE, correction=CORRECTION)
+geary = geary_table(gdf, variables, n_jobs=-1, correction=CORRECTION,
+                    multivariate={'poverty_alice_callers': ['poverty_rate', 'alice_rate', 'callers_per_1000']})
+for table, path in [(hotspots, "final_efficient_chosen_tests/GI_STAR_Results.csv"),
+                    (geary, "final_efficient_chosen_tests/LOCAL_GEARY_Results.csv")]:
+    scored = [col for col in table.columns if col.endswith('_q')]
+    table.dropna(subset=scored, how='all').to_csv(path, index=False)
+    print(f"saved '{path}'")
+
+# how stable the statewide quad labels are across seeds (only means something for permutation p-values)
+if ENSEMBLE and INFERENCE == 'permutation':
+    ensemble = lisa_ensemble(gdf, variables, seeds=ENSEMBLE_SEEDS, correction=CORRECTION)
+    ensemble.to_csv("final_efficient_chosen_tests/LISA_Seed_Ensemble.csv", index=False)
+    print(f"label stability over {ENSEMBLE_SEEDS} seeds saved to 'final_efficient_chosen_tests/LISA_Seed_Ensemble.csv'")
+
+# Bexar County: poverty + below ALICE from the cleaned Bexar dataset
+df_bexar = pd.read_csv('bexar_specific/Bexar_County_ZIP_Eco_Indicator_Data.csv')
+df_bexar['zip_code'] = df_bexar['zip_code'].astype(str).str.zfill(5)
+
+gdf_bexar = load_zip_shapes(df_bexar['zip_code'])
+gdf_bexar = gdf_bexar.merge(df_bexar[['zip_code', 'poverty_rate', 'poverty_alice_sum']], on='zip_code', how='left')
+
+lisa_bexar = lisa_table(gdf_bexar, {'poverty': 'poverty_rate', 'alice': 'poverty_alice_sum'}, n_jobs=-1,
+                         inference=INFERENCE, correction=CORRECTION)
+
+save_results(lisa_bexar, 'poverty', "final_efficient_chosen_tests/BEXAR_LISA_Poverty_Results.csv")
+save_results(lisa_bexar, 'alice', "final_efficient_chosen_tests/BEXAR_LISA_Below_ALICE_Results.csv")
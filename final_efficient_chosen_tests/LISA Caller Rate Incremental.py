@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.geo import load_zip_shapes
+from uw211.lisa_update import (lisa_state, lisa_state_path, load_lisa_state, save_lisa_state, state_table,
+                               update_lisa)
+from uw211.memo import memo_key
+from uw211.weights import queen_weights
+
+'''
+Incremental version of 'LISA Caller Rate.py' for small corrections to New_211_Client_Cleaned.csv.
+
+The first run does the full 999-permutation LISA (seed 42) and keeps its state in .cache/incremental/.
+After that, re-running the cleanup with a fixed ZIP typo changes a handful of caller rates; this script
+compares the new file with the state, updates only the changed ZIPs' neighbourhoods and the draws they
+appear in (uw211/lisa_update.py) and rewrites LISA_CallerRate_Results.csv with the same columns
+'LISA Batch.py' writes. If ZIPs were added or dropped the weights change, and it starts over with a full run.
+'''
+
+STATE_PATH = lisa_state_path('callers')
+
+# load ZIP caller rate data, same rows as 'LISA Caller Rate.py'
+df = pd.read_csv("New_211_Client_Cleaned.csv")
+df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
+
+gdf = load_zip_shapes(df['zip_code'])
+gdf = gdf.merge(df[['zip_code', 'callers_per_1000']], on='zip_code', how='left')
+gdf = gdf.dropna(subset=['callers_per_1000'])
+
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
+weights_key = memo_key('weights', [], w)
+y = gdf['callers_per_1000'].to_numpy(dtype=float)
+
+state = load_lisa_state(STATE_PATH)
+if state is None or state.get('weights_key') != weights_key or not state['zips'].equals(pd.Index(gdf['zip_code'])):
+    print("No matching LISA state (first run, or the ZIP set changed) - full run")
+    state = lisa_state(y, w, zips=gdf['zip_code'])
+    state['weights_key'] = weights_key
+else:
+    changed = np.flatnonzero(state['y'] != y)
+    print(f"{len(changed)} ZIP(s) changed: {', '.join(gdf['zip_code'].iloc[changed])}")
+    if len(changed):
+        update_lisa(state, dict(zip(gdf['zip_code'].iloc[changed], y[changed])))
+save_lisa_state(state, STATE_PATH)
+
+lisa = state_table(state, 'callers')
+cols = ['zip_code', 'lisa_callers_q', 'lisa_callers_p', 'lisa_callers_sig', 'lisa_callers_quad_label',
+        'lisa_callers_p_fdr', 'lisa_callers_sig_fdr', 'lisa_callers_p_bonferroni', 'lisa_callers_sig_bonferroni']
+lisa[cols].to_csv("final_efficient_chosen_tests/LISA_CallerRate_Results.csv", index=False)
+print(f"LISA Caller Rate updated! Results saved to 'LISA_CallerRate_Results.csv' (state in '{STATE_PATH}')")
@@ -1,25 +1,23 @@
 import pandas as pd
-import geopandas as gpd
-from libpysal.weights import Queen
 from esda.moran import Moran_Local
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.geo import load_zip_shapes
+from uw211.weights import queen_weights
 
 # load ZIP caller rate data
 df = pd.read_csv("New_211_Client_Cleaned.csv")
 df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
 
-# load shapefile
-gdf = gpd.read_file("https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json")
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
-
-# keep only ZIPs with caller data
-gdf = gdf[gdf['zip_code'].isin(df['zip_code'])]
+# load shapefile (only ZIPs with caller data)
+gdf = load_zip_shapes(df['zip_code'])
 
 # merge in caller rate
 gdf = gdf.merge(df[['zip_code', 'callers_per_1000']], on='zip_code', how='left')
 gdf = gdf.dropna(subset=['callers_per_1000'])
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
 
 # LISA on caller rate
 lisa_callers = Moran_Local(gdf['callers_per_1000'].values, w, permutations=999, seed=42)
@@ -1,27 +1,26 @@
 import pandas as pd
-import geopandas as gpd
-from libpysal.weights import Queen
 from esda.moran import Moran_Local
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.cache import read_csv_cached
+from uw211.geo import load_zip_shapes
+from uw211.weights import queen_weights
 
 # load poverty data
-df_demo = pd.read_csv("211 Area Indicators_ZipZCTA.csv")
+df_demo = read_csv_cached("211 Area Indicators_ZipZCTA.csv")
 df_demo['zip_code'] = df_demo['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
 df_demo = df_demo[['zip_code', 'Pct_Poverty_Households']]
 df_demo.columns = ['zip_code', 'poverty_rate']
 
-# load shapefile
-gdf = gpd.read_file("https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json")
-gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
-
-# filter to ZIPs in poverty data
-gdf = gdf[gdf['zip_code'].isin(df_demo['zip_code'])]
+# load shapefile (only ZIPs in the demo data)
+gdf = load_zip_shapes(df_demo['zip_code'])
 
 # merge in poverty rate
 gdf = gdf.merge(df_demo, on='zip_code', how='left')
 gdf = gdf.dropna(subset=['poverty_rate'])
 
-w = Queen.from_dataframe(gdf)
-w.transform = 'r'
+w = queen_weights(gdf)  # cached Queen contiguity, row-standardized
 
 # LISA on poverty
 lisa_poverty = Moran_Local(gdf['poverty_rate'].values, w, permutations=999, seed=42)
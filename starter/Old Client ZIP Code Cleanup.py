@@ -1,5 +1,13 @@
+import os
+import sys
+
 import pandas as pd
 
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.loaders import load_clients
+from uw211.aggregates import build_zip_aggregates
+from uw211.cache import read_csv_cached
+
 # to open virtual environment: venv\Scripts\activate
 
 '''
@@ -8,7 +16,7 @@ Its primary goal is to generate cleaned ZIP code data for overall call volume an
 visualization, particularly for exploratory and operations-focused use cases.
 
 Key actions:
-- Removes full-row duplicates and deduplicates by Client_Id (to count unique callers)
+- Deduplicates by Client_Id, first row per caller wins (to count unique callers)
 - Standardizes ZIP code format and handles missing/invalid entries
 - Joins ZIP-level census data (population estimates) to compute normalized call rates
 - Outputs ZIP-level summaries and visualizations (e.g., total callers, callers per 1,000 residents)
@@ -25,27 +33,28 @@ of ZIP-based call patterns across the region.
 
 
 # load CSVs
-df = pd.read_csv('211 Call Data_Client Tab_All Years.csv')
-df_public = pd.read_csv('211 Area Indicators_ZipZCTA.csv')
+# the client tab is streamed in chunks and deduped by Client_Id (see uw211/loaders.py), every column is kept
+# because Old_211_Client_Cleaned.csv writes the client rows back out
+df_clean = load_clients(all_columns=True)
+internal_cols = ['client_code', 'zip_code']  # added by the loader, not part of the client tab
+df_public = read_csv_cached('211 Area Indicators_ZipZCTA.csv')
 
 # preview columns
-print("Column names:", df.columns.tolist())
-print(df.head())
+print("Column names:", df_clean.columns.drop(internal_cols).tolist())
+print(df_clean.drop(columns=internal_cols).head())
 
-# check original shape
-print(f"Original shape: {df.shape}")
+# check original size
+print(f"Original rows: {df_clean.attrs['rows_read']}")
 
-# remove full-row duplicates
-duplicates = df[df.duplicated()]
-print(f"Number of duplicate rows: {duplicates.shape[0]}")
+# duplicates by client ID
+print(f"Number of duplicate Client_Id rows: {df_clean.attrs['rows_read'] - len(df_clean)}")
 
 # drop duplicates by client ID
-print("Before:", df.shape)
-df_clean = df.drop_duplicates(subset=['Client_Id'])
+print("Before:", df_clean.attrs['rows_read'])
 print("After:", df_clean.shape)
 
 # save cleaned version
-df_clean.to_csv('starter/Old_211_Client_Cleaned.csv', index=False)
+df_clean.drop(columns=internal_cols).to_csv('starter/Old_211_Client_Cleaned.csv', index=False)
 
 # clean ZIP code column
 df_clean['ClientAddressus_ClientAddressus_zip'] = (
@@ -58,30 +67,18 @@ df_clean['ClientAddressus_ClientAddressus_zip'] = (
 )
 
 # save again just in case
-df_clean.to_csv('starter/Old_211_Client_Cleaned.csv', index=False)
+df_clean.drop(columns=internal_cols).to_csv('starter/Old_211_Client_Cleaned.csv', index=False)
 
 # check how many unknown ZIPs
 unknown_count = df_clean[df_clean['ClientAddressus_ClientAddressus_zip'] == 'Unknown'].shape[0]
 print(f"Number of 'Unknown' ZIP codes: {unknown_count}")
 
-# count calls per ZIP
-zip_counts = df_clean['ClientAddressus_ClientAddressus_zip'].value_counts().reset_index()
-zip_counts.columns = ['zip_code', 'total_callers']
-
-# clean ZIP codes to match format
-zip_counts['zip_code'] = zip_counts['zip_code'].astype(str).str.extract(r'(\d{5})')
-
-# pull ZIP + pop
-df_public['zip_code'] = df_public['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
-zip_pop = df_public[['zip_code', 'Pop_Estimate']]
-zip_pop.columns = ['zip_code', 'population']
-
-# merge + calc calls per 1000
-zip_data = pd.merge(zip_counts, zip_pop, on='zip_code', how='left')
-zip_data['population'] = zip_data['population'].fillna(1)
-zip_data['callers_per_1000'] = (zip_data['total_callers'] / zip_data['population']) * 1000
-zip_data = zip_data.dropna(subset=['zip_code'])
-zip_data = zip_data[zip_data['population'] > 500]  # or try 750 for smoother scaling
+# count calls per raw ZIP entry (like value_counts, ZIP+4 variants stay separate rows), pull ZIP + pop and
+# calc calls per 1000 (ZIPs with population over 500 only)
+# same single-pass aggregation 'Filter Clients Calls ZIP.py' uses, see uw211/aggregates.py
+aggregates = build_zip_aggregates(df_clean, df_public)
+zip_counts = aggregates['inclusive']
+zip_data = aggregates['inclusive_rates']
 
 # save final results
 zip_data.to_csv('starter/Old_Callers_Per_1000.csv', index=False)
@@ -1,4 +1,9 @@
 import pandas as pd
+import os
+import sys
+sys.path.append(os.getcwd())  # scripts are run from the repo root
+from uw211.cache import read_csv_cached
+from uw211.geo import zip_geojson
 
 '''
 This Python script processes and visualizes economic hardship data by ZIP code for the 2-1-1 Alamo Region.
@@ -19,7 +24,7 @@ Note: This file does not handle 2-1-1 call data. It focuses exclusively on censu
 '''
 
 # load the cleaned ZIP indicator data
-df = pd.read_csv('211 Area Indicators_ZipZCTA.csv')
+df = read_csv_cached('211 Area Indicators_ZipZCTA.csv')
 
 # extract and clean relevant columns
 df['zip_code'] = df['GEO.display_label'].astype(str).str.extract(r'(\d{5})')
@@ -58,10 +63,13 @@ poverty_rate = 0.40 → 40% of households are in poverty
 poverty_rate = 0.15 → 15% are in poverty
 '''
 
+# ZIP shapes for the maps below (local copy, only the ZIPs we're plotting)
+zip_shapes = zip_geojson(df_econ['zip_code'])
+
 # create choropleth map of poverty rate
 fig = px.choropleth(
     df_econ,
-    geojson='https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json',
+    geojson=zip_shapes,
     locations='zip_code',
     featureidkey='properties.ZCTA5CE10',
     color='poverty_rate',
@@ -77,7 +85,7 @@ fig.show()
 # ALICE rate map
 fig = px.choropleth(
     df_econ,
-    geojson='https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json',
+    geojson=zip_shapes,
     locations='zip_code',
     featureidkey='properties.ZCTA5CE10',
     color='alice_rate',
@@ -105,7 +113,7 @@ Higher alice_rate = More people living paycheck to paycheck or struggling to sta
 # poverty + ALICE
 fig = px.choropleth(
     df_econ,
-    geojson='https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json',
+    geojson=zip_shapes,
     locations='zip_code',
     featureidkey='properties.ZCTA5CE10',
     color='econ_instability',
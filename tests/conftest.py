@@ -0,0 +1,86 @@
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from libpysal.weights import lat2W
+from scipy import sparse
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the scripts run from the repo root
+
+from uw211.weights import weights_from_adjacency  # noqa: E402
+
+'''
+Shared fixtures: a small queen lattice stands in for the ZIP shapes (no GeoJSON download, no NDA data), with
+ZIP-like string ids so the table functions can be driven the same way the scripts drive them.
+'''
+
+SIDE = 8
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # memoized results, caches and state files land in a throwaway .cache/
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def lattice():
+    # (binary CSR adjacency, row-standardized W) of an 8 x 8 queen lattice
+    w = lat2W(SIDE, SIDE, rook=False)
+    adjacency = sparse.csr_matrix(w.sparse)
+    return adjacency, weights_from_adjacency(adjacency)
+
+
+@pytest.fixture
+def zips():
+    return np.array([f'{78000 + i}' for i in range(SIDE * SIDE)])
+
+
+@pytest.fixture
+def lattice_subsets(lattice, zips, monkeypatch):
+    # subset_weights cut from the lattice instead of the statewide ZIP adjacency
+    adjacency, _ = lattice
+    position = {z: i for i, z in enumerate(zips)}
+
+    def subset_weights(subset, transform='r', silence_warnings=False):
+        rows = [position[str(z)] for z in subset]
+        return weights_from_adjacency(adjacency[rows][:, rows], transform, silence_warnings)
+
+    import uw211.influence
+    import uw211.lisa
+    monkeypatch.setattr(uw211.lisa, 'subset_weights', subset_weights)
+    monkeypatch.setattr(uw211.influence, 'subset_weights', subset_weights)
+    return subset_weights
+
+
+@pytest.fixture
+def frame(zips):
+    # ZIP table with a few skewed, non-negative indicator columns (rates are never negative)
+    rng = np.random.default_rng(7)
+    n = len(zips)
+    return pd.DataFrame({
+        'zip_code': zips,
+        'poverty_rate': rng.gamma(2.0, 0.08, n),
+        'alice_rate': rng.beta(4, 6, n),
+        'callers_per_1000': rng.lognormal(1.0, 0.8, n),
+        'population': rng.integers(200, 40000, n).astype(float),
+    })
+
+
+@pytest.fixture
+def zip_geojson():
+    # 6 x 6 grid of square "ZIPs" written as a GeoJSON like the OpenDataDE file (ZCTA5CE10 property), rows
+    # shuffled so nothing depends on the file being sorted; one ZCTA is 4 digits (leading zero dropped)
+    rng = np.random.default_rng(13)
+    cells = [(r, c) for r in range(6) for c in range(6)]
+    codes = [str(78200 + 6 * r + c) for r, c in cells]
+    codes[0] = '7820'
+    gdf = gpd.GeoDataFrame({'ZCTA5CE10': codes, 'ALAND10': rng.integers(1000, 9000, len(cells))},
+                           geometry=[box(c, r, c + 1, r + 1) for r, c in cells], crs='EPSG:4326')
+    gdf = gdf.iloc[rng.permutation(len(gdf))].reset_index(drop=True)
+    gdf.to_file('zips.geojson', driver='GeoJSON')
+    return 'zips.geojson'
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uw211.aggregates import build_zip_aggregates
+from uw211.ids import IdTable
+from uw211.loaders import CALL_TYPE_COL, CLIENT_ZIP_COL, clean_call_type, load_clients, load_interactions
+
+
+@pytest.fixture
+def tabs(zips):
+    # client / interaction tabs with ZIP+4s, 'Unknown'-style ZIPs, ZIPs outside the area file and bad call types
+    rng = np.random.default_rng(31)
+    ids = [f'C{k}' for k in range(200)]
+    raw_zips = np.concatenate([zips[:12], [f'{zips[0]}-4410', f'{zips[3]}-0001', '99999', '0', '', 'nan']])
+    pd.DataFrame({
+        'Client_Id': rng.choice(ids, 260),
+        CLIENT_ZIP_COL: rng.choice(raw_zips, 260),
+        'Other': 'x',
+    }).to_csv('clients.csv', index=False)
+    pd.DataFrame({
+        'Interaction_Id': rng.integers(0, 500, 600).astype(str),
+        'Client_Id': rng.choice(ids + ['C999'], 600),
+        CALL_TYPE_COL: rng.choice(["['Food']", "['Phantom']", "['Wrong #']", "['Housing', 'Food']", '', 'bad'], 600),
+    }).to_csv('interactions.csv', index=False)
+    area = pd.DataFrame({'GEO.display_label': [f'ZCTA5 {z}' for z in zips[:10]],
+                         'Pop_Estimate': [300, 800, 1500, 2500, 400, 9000, 12000, 700, 650, 20000]})
+    return area
+
+
+def _starter_tables(area):
+    # the baseline 'starter/Old Client ZIP Code Cleanup.py' steps
+    df = pd.read_csv('clients.csv', dtype={CLIENT_ZIP_COL: 'str'})
+    df_clean = df.drop_duplicates(subset=['Client_Id']).copy()
+    df_clean[CLIENT_ZIP_COL] = (df_clean[CLIENT_ZIP_COL].fillna('Unknown').replace('', 'Unknown').astype(str)
+                                .str.strip().replace(['', 'nan', '0.0', '0'], 'Unknown'))
+    zip_counts = df_clean[CLIENT_ZIP_COL].value_counts().reset_index()
+    zip_counts.columns = ['zip_code', 'total_callers']
+    zip_counts['zip_code'] = zip_counts['zip_code'].astype(str).str.extract(r'(\d{5})')
+    zip_pop = pd.DataFrame({'zip_code': area['GEO.display_label'].astype(str).str.extract(r'(\d{5})', expand=False),
+                            'population': area['Pop_Estimate']})
+    zip_data = pd.merge(zip_counts, zip_pop, on='zip_code', how='left')
+    zip_data['population'] = zip_data['population'].fillna(1)
+    zip_data['callers_per_1000'] = (zip_data['total_callers'] / zip_data['population']) * 1000
+    zip_data = zip_data.dropna(subset=['zip_code'])
+    zip_data = zip_data[zip_data['population'] > 500]
+    return df_clean, zip_counts, zip_data
+
+
+def _strict_table(area):
+    # the baseline 'Filter Clients Calls ZIP.py' steps
+    df_client = pd.read_csv('clients.csv', dtype={CLIENT_ZIP_COL: 'str'}).drop_duplicates(subset=['Client_Id'])
+    df_client['zip_code'] = df_client[CLIENT_ZIP_COL].astype(str).str.extract(r'(\d{5})', expand=False)
+    valid_zips = area['GEO.display_label'].astype(str).str.extract(r'(\d{5})', expand=False).dropna().unique()
+    df_client_valid = df_client[df_client['zip_code'].isin(valid_zips)]
+    df_interaction = pd.read_csv('interactions.csv', dtype=str).drop_duplicates(subset=['Interaction_Id'])
+    df_interaction = df_interaction[df_interaction[CALL_TYPE_COL].notna()].copy()
+    df_interaction['clean_call_type'] = df_interaction[CALL_TYPE_COL].astype(str).apply(clean_call_type)
+    df_interaction = df_interaction[df_interaction['clean_call_type'].notna()]
+    calls = df_interaction[df_interaction['Client_Id'].isin(df_client_valid['Client_Id'])]
+    first = calls.drop_duplicates(subset='Client_Id')
+    final = first[~first['clean_call_type'].isin(['Phantom', 'Wrong #'])]
+    callers = df_client_valid[df_client_valid['Client_Id'].isin(final['Client_Id'].unique())]
+    zip_counts = callers['zip_code'].value_counts().reset_index()
+    zip_counts.columns = ['zip_code', 'total_callers']
+    return zip_counts, len(first), len(final)
+
+
+def _by_zip(df):
+    # value_counts leaves the order of tied counts open, compare row sets
+    return df.sort_values(['total_callers', 'zip_code'], na_position='first').reset_index(drop=True)
+
+
+def test_inclusive_tables_match_the_starter_script(tabs):
+    area = tabs
+    df_clean, zip_counts, zip_data = _starter_tables(area)
+    df = load_clients('clients.csv', client_ids=IdTable())
+    df[CLIENT_ZIP_COL] = (df[CLIENT_ZIP_COL].fillna('Unknown').replace('', 'Unknown').astype(str)
+                          .str.strip().replace(['', 'nan', '0.0', '0'], 'Unknown'))
+    aggregates = build_zip_aggregates(df, area)
+
+    # ZIP+4 entries and the 'Unknown' row (no zip_code) stay separate rows
+    assert aggregates['inclusive']['zip_code'].isna().sum() == 1
+    assert aggregates['inclusive']['zip_code'].duplicated().any()
+    pd.testing.assert_frame_equal(_by_zip(aggregates['inclusive']), _by_zip(zip_counts), check_dtype=False)
+    pd.testing.assert_frame_equal(_by_zip(aggregates['inclusive_rates']), _by_zip(zip_data), check_dtype=False)
+    assert aggregates['summary']['unique_callers'] == len(df_clean)
+
+
+def test_strict_table_matches_the_filter_script(tabs):
+    area = tabs
+    zip_counts, valid_zip_callers, final_callers = _strict_table(area)
+    client_ids = IdTable()
+    df_client = load_clients('clients.csv', client_ids=client_ids)
+    df_interaction = load_interactions('interactions.csv', client_ids=client_ids, interaction_ids=IdTable())
+    aggregates = build_zip_aggregates(df_client, area, df_interaction)
+
+    strict = aggregates['strict']
+    pd.testing.assert_frame_equal(_by_zip(strict[['zip_code', 'total_callers']]), _by_zip(zip_counts),
+                                  check_dtype=False)
+    assert aggregates['summary']['valid_zip_callers'] == valid_zip_callers
+    assert aggregates['summary']['final_callers'] == final_callers
+    np.testing.assert_allclose(strict['callers_per_1000'], strict['total_callers'] / strict['population'] * 1000)
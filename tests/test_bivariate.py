@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uw211.bivariate import BIVARIATE_COLORS, bivariate_classify, bivariate_grid, quantile_codes
+
+
+def _qcut(values, k):
+    return pd.qcut(values, k, labels=False).fillna(-1).astype(int).to_numpy()
+
+
+@pytest.mark.parametrize('k', [3, 4, 5])
+def test_quantile_codes_match_qcut(frame, k):
+    for col in ['poverty_rate', 'alice_rate', 'callers_per_1000']:
+        np.testing.assert_array_equal(quantile_codes(frame[col], k), _qcut(frame[col], k))
+
+
+def test_missing_values_get_minus_one_and_stay_out_of_the_cut_points(frame):
+    values = frame['poverty_rate'].copy()
+    values.iloc[[0, 5, 6]] = np.nan
+    codes = quantile_codes(values)
+    assert (codes[[0, 5, 6]] == -1).all()
+    np.testing.assert_array_equal(codes, _qcut(values, 4))
+
+
+def test_ties_that_repeat_a_cut_point_raise_like_qcut():
+    values = pd.Series([0.0] * 10 + [1.0, 2.0])
+    with pytest.raises(ValueError):
+        pd.qcut(values, 4, labels=False)
+    with pytest.raises(ValueError):
+        quantile_codes(values)
+
+
+def test_grouped_codes_cut_each_group_on_its_own(frame):
+    groups = np.repeat(['2022', '2023'], len(frame) // 2)
+    codes = quantile_codes(frame['callers_per_1000'], groups=groups)
+    for year in ['2022', '2023']:
+        rows = groups == year
+        np.testing.assert_array_equal(codes[rows], _qcut(frame.loc[rows, 'callers_per_1000'], 4))
+
+
+def test_grid_and_colors_match_the_iterrows_version(frame):
+    grids, cells = bivariate_classify(frame, ['poverty_rate'], 'callers_per_1000')
+    frame = frame.assign(x_q=_qcut(frame['poverty_rate'], 4), y_q=_qcut(frame['callers_per_1000'], 4))
+
+    # what the heat map scripts did row by row
+    grid = np.zeros((4, 4), dtype=int)
+    colors = []
+    for _, row in frame.iterrows():
+        grid[3 - row['y_q'], row['x_q']] += 1
+        colors.append(BIVARIATE_COLORS[3 - row['y_q']][row['x_q']])
+    np.testing.assert_array_equal(grids['poverty_rate'], grid)
+    assert cells['poverty_rate_color'].tolist() == colors
+    np.testing.assert_array_equal(bivariate_grid(frame['x_q'], frame['y_q']), grid)
@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+
+from uw211.cache import CACHE_DIR, read_csv_cached
+
+
+def _write(path, rows):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def _arrow_files():
+    return sorted(name for name in os.listdir(CACHE_DIR) if name.endswith('.arrow'))
+
+
+def test_matches_read_csv():
+    _write('area.csv', {'GEO.display_label': ['ZCTA5 78201', 'ZCTA5 78207'], 'Pop_Estimate': [1200, None],
+                        'flag': ['True', 'false'], 'County_Name': ['Bexar', 'Bexar']})
+    pd.testing.assert_frame_equal(read_csv_cached('area.csv'), pd.read_csv('area.csv'), check_dtype=False)
+
+
+def test_changed_export_is_rebuilt():
+    _write('clients.csv', {'Client_Id': ['C1', 'C2'], 'zip': ['78201', '78207']})
+    read_csv_cached('clients.csv')
+    first = _arrow_files()
+
+    _write('clients.csv', {'Client_Id': ['C1', 'C2', 'C3'], 'zip': ['78201', '78207', '78250']})
+    assert read_csv_cached('clients.csv')['Client_Id'].tolist() == ['C1', 'C2', 'C3']
+    assert len(_arrow_files()) == 1 and _arrow_files() != first
+
+
+def test_replaced_export_is_rebuilt():
+    # same size, written elsewhere and moved over the old one
+    _write('clients.csv', {'Client_Id': ['C1', 'C2'], 'zip': ['78201', '78207']})
+    read_csv_cached('clients.csv')
+    _write('incoming/clients.csv', {'Client_Id': ['C1', 'C2'], 'zip': ['78205', '78207']})
+    os.replace('incoming/clients.csv', 'clients.csv')
+    assert read_csv_cached('clients.csv')['zip'].tolist() == [78205, 78207]
+    assert len(_arrow_files()) == 1
+
+
+def test_similar_and_same_named_exports_keep_their_own_copies():
+    _write('Clients.csv', {'Client_Id': ['C1']})
+    _write('Clients-2024.csv', {'Client_Id': ['C2']})
+    _write('2023/Clients.csv', {'Client_Id': ['C3']})
+    for _ in range(2):
+        assert read_csv_cached('Clients-2024.csv')['Client_Id'].tolist() == ['C2']
+        assert read_csv_cached('Clients.csv')['Client_Id'].tolist() == ['C1']
+        assert read_csv_cached('2023/Clients.csv')['Client_Id'].tolist() == ['C3']
+    assert len(_arrow_files()) == 3
+
+    # refreshing one of them only replaces its own copy
+    _write('Clients.csv', {'Client_Id': ['C1', 'C4']})
+    read_csv_cached('Clients.csv')
+    assert len(_arrow_files()) == 3
+    assert read_csv_cached('2023/Clients.csv')['Client_Id'].tolist() == ['C3']
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uw211.crosstab import (ALIGNMENT_CLASSES, CROSSTAB_LABELS, AlignmentCube, alignment_matrices, label_codes,
+                            lisa_crosstabs)
+
+NAMES = ['poverty', 'alice', 'callers']
+
+
+@pytest.fixture
+def labels(zips):
+    rng = np.random.default_rng(3)
+    table = pd.DataFrame({'zip_code': zips})
+    for name in NAMES:
+        table[f'lisa_{name}_quad_label'] = rng.choice(np.array(CROSSTAB_LABELS, dtype=object), len(zips),
+                                                      p=[0.15, 0.1, 0.1, 0.15, 0.5])
+    table.loc[[4, 30], 'lisa_alice_quad_label'] = None  # not scored (missing value)
+    return table
+
+
+def _assign_color(need, caller):
+    # the membership tests the cross-tab scripts used for the map colours
+    if need == 'NS' or caller == 'NS':
+        return 'not significant'
+    if need in ('HH', 'HL') and caller in ('LH', 'LL'):
+        return 'underserved'
+    if need in ('LH', 'LL') and caller in ('HH', 'HL'):
+        return 'misaligned'
+    return 'aligned'
+
+
+def test_matrices_match_pd_crosstab(labels):
+    matrices, _ = lisa_crosstabs(labels, {'poverty': 'Poverty LISA', 'alice': 'Below ALICE LISA'})
+    for name in ['poverty', 'alice']:
+        expected = pd.crosstab(labels[f'lisa_{name}_quad_label'], labels['lisa_callers_quad_label'])
+        expected = expected.reindex(index=CROSSTAB_LABELS, columns=CROSSTAB_LABELS, fill_value=0)
+        np.testing.assert_array_equal(matrices[name].to_numpy(), expected.to_numpy())
+
+
+def test_alignment_classes_match_the_membership_tests(labels):
+    _, zips = lisa_crosstabs(labels, {'poverty': 'Poverty LISA', 'alice': 'Below ALICE LISA'})
+    for name in ['poverty', 'alice']:
+        expected = ['NA' if pd.isna(need) else _assign_color(need, caller)
+                    for need, caller in zip(labels[f'lisa_{name}_quad_label'], labels['lisa_callers_quad_label'])]
+        assert zips[f'{name}_alignment'].fillna('NA').tolist() == expected
+    assert set(zips['poverty_alignment']) <= set(ALIGNMENT_CLASSES)
+
+
+def test_alignment_matrices_skip_missing_labels():
+    need = label_codes(np.array([['HH'], [None], ['NS']], dtype=object))
+    callers = label_codes(np.array(['LL', 'HH', None], dtype=object))
+    counts = alignment_matrices(need, callers)
+    assert counts.sum() == 1 and counts[0, 0, 3] == 1
+
+
+def test_cube_selections_match_brute_force_masks(labels):
+    cube = AlignmentCube(labels, NAMES)
+    filled = labels.fillna({'lisa_alice_quad_label': 'NA'})
+    rng = np.random.default_rng(5)
+    for _ in range(50):
+        selection, mask = {}, np.ones(len(labels), dtype=bool)
+        for name in NAMES:
+            if rng.random() < 0.3:
+                continue
+            chosen = list(rng.choice(CROSSTAB_LABELS + ['NA'], rng.integers(1, 3), replace=False))
+            selection[name] = chosen[0] if len(chosen) == 1 else chosen
+            mask &= filled[f'lisa_{name}_quad_label'].isin(chosen).to_numpy()
+        assert cube.count(**selection) == mask.sum()
+        assert cube.zips(**selection).tolist() == labels.loc[mask, 'zip_code'].tolist()
+
+
+def test_cube_marginal_is_the_pairwise_crosstab(labels):
+    cube = AlignmentCube(labels, NAMES)
+    matrices, _ = lisa_crosstabs(labels, {'alice': 'Below ALICE LISA'})
+    np.testing.assert_array_equal(cube.crosstab('alice', 'callers').to_numpy(), matrices['alice'].to_numpy())
+    assert cube.cells()['zips'].sum() == len(labels)
+
+
+def test_cube_round_trips_through_a_bare_file_name(labels):
+    cube = AlignmentCube(labels, NAMES)
+    cube.save('cube.pkl')
+    assert AlignmentCube.load('cube.pkl').count(poverty='HH') == cube.count(poverty='HH')
+
+
+def test_cube_rejects_unknown_names_and_labels(labels):
+    cube = AlignmentCube(labels, NAMES)
+    with pytest.raises(KeyError):
+        cube.count(income='HH')
+    with pytest.raises(ValueError):
+        cube.count(poverty='HX')
+
+
+def test_saved_cube_labels_give_the_same_crosstabs(labels):
+    # what the cross-tab scripts read back from 'LISA Batch.py' instead of rerunning the LISA
+    AlignmentCube(labels, NAMES).save('cube.pkl')
+    saved = AlignmentCube.load('cube.pkl').labels()
+    indicators = {'poverty': 'Poverty LISA', 'alice': 'Below ALICE LISA'}
+    matrices, zips = lisa_crosstabs(labels, indicators)
+    saved_matrices, saved_zips = lisa_crosstabs(saved, indicators)
+    for name in indicators:
+        pd.testing.assert_frame_equal(saved_matrices[name], matrices[name])
+    pd.testing.assert_frame_equal(saved_zips, zips)
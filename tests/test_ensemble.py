@@ -0,0 +1,29 @@
+import numpy as np
+
+from uw211.ensemble import ENSEMBLE_LABELS, lisa_ensemble
+from uw211.lisa import lisa_table
+
+PERMUTATIONS = 99
+VARIABLES = {'poverty': 'poverty_rate', 'callers': 'callers_per_1000'}
+
+
+def test_seed_42_alone_gives_the_lisa_table_labels(lattice, lattice_subsets, frame):
+    _, w = lattice
+    frame.loc[[6, 50], 'poverty_rate'] = np.nan
+    ensemble = lisa_ensemble(frame, VARIABLES, seeds=[42], w=w, permutations=PERMUTATIONS, n_jobs=1)
+    table = lisa_table(frame, VARIABLES, w, permutations=PERMUTATIONS, cache=False)
+    for name in VARIABLES:
+        assert ensemble[f'ens_{name}_modal'].tolist() == table[f'lisa_{name}_quad_label'].tolist()
+        np.testing.assert_allclose(ensemble[f'ens_{name}_p_mean'], table[f'lisa_{name}_p'])
+    assert ensemble.loc[[6, 50], 'ens_poverty_stability'].isna().all()
+
+
+def test_shares_and_p_ranges(lattice, frame):
+    _, w = lattice
+    ensemble = lisa_ensemble(frame, VARIABLES, seeds=5, w=w, permutations=PERMUTATIONS, n_jobs=2)
+    for name in VARIABLES:
+        shares = ensemble[[f'ens_{name}_{label}' for label in ENSEMBLE_LABELS]]
+        np.testing.assert_allclose(shares.sum(axis=1), 1)
+        np.testing.assert_allclose(ensemble[f'ens_{name}_stability'], shares.max(axis=1))
+        assert (ensemble[f'ens_{name}_p_min'] <= ensemble[f'ens_{name}_p_mean'] + 1e-12).all()
+        assert (ensemble[f'ens_{name}_p_mean'] <= ensemble[f'ens_{name}_p_max'] + 1e-12).all()
@@ -0,0 +1,52 @@
+import json
+
+import geopandas as gpd
+import pandas as pd
+
+from uw211.geo import SHAPES_PATH, geometry_version, ingest_zip_shapes, load_zip_shapes
+
+
+def _read_geojson(path):
+    # what the scripts did on every run
+    gdf = gpd.read_file(path)
+    gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
+    return gdf
+
+
+def test_store_round_trips_the_geojson_in_its_row_order(zip_geojson):
+    ingest_zip_shapes(zip_geojson)
+    expected = _read_geojson(zip_geojson)
+    gdf = load_zip_shapes()
+    assert gdf['zip_code'].tolist() == expected['zip_code'].tolist()
+    assert '07820' in set(gdf['zip_code'])
+    assert gdf.geometry.geom_equals(expected.geometry).all()
+    pd.testing.assert_frame_equal(pd.DataFrame(gdf.drop(columns='geometry')),
+                                  pd.DataFrame(expected.drop(columns='geometry')), check_dtype=False)
+
+
+def test_zip_and_column_filters(zip_geojson):
+    ingest_zip_shapes(zip_geojson)
+    expected = _read_geojson(zip_geojson)
+    wanted = ['78235', '78201', 7820, '99999']
+    gdf = load_zip_shapes(zips=wanted, columns=['ALAND10'])
+    assert gdf.columns.tolist() == ['zip_code', 'ALAND10', 'geometry']
+    in_file_order = expected.loc[expected['zip_code'].isin(['78235', '78201', '07820']), 'zip_code']
+    assert gdf['zip_code'].tolist() == in_file_order.tolist()
+
+
+def test_store_from_an_older_format_is_reingested_from_its_source(zip_geojson):
+    ingest_zip_shapes(zip_geojson)
+    expected = _read_geojson(zip_geojson)
+
+    # what format 1 left behind: rows sorted by ZIP, no format in the meta file
+    sorted_shapes = load_zip_shapes().sort_values('zip_code')
+    sorted_shapes.to_parquet(SHAPES_PATH, index=False)
+    meta_path = SHAPES_PATH.replace('.parquet', '.json')
+    with open(meta_path) as f:
+        meta = json.load(f)
+    del meta['format']
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    assert load_zip_shapes()['zip_code'].tolist() == expected['zip_code'].tolist()
+    assert geometry_version() == meta['version']
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from uw211.ids import IdTable, first_occurrence, in_set
+
+
+def _ids(n, seed):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(np.array([f'C{k}' for k in range(50)] + [None], dtype=object), n)
+    return pd.Series(ids, dtype=object)
+
+
+def test_first_occurrence_matches_drop_duplicates():
+    ids = _ids(300, 1)
+    codes = IdTable().encode(ids)
+    expected = ids.drop_duplicates().index.to_numpy()
+    np.testing.assert_array_equal(first_occurrence(codes), expected)
+
+
+def test_in_set_matches_isin():
+    table = IdTable()
+    ids = _ids(300, 2)
+    members = _ids(40, 3).dropna()
+    codes = table.encode(ids)
+    member_codes = table.encode(members, add=False)
+    expected = ids.isin(members).to_numpy() & ids.notna().to_numpy()  # a missing ID is never a member
+    np.testing.assert_array_equal(in_set(codes, member_codes[member_codes >= 0]), expected)
+
+
+def test_codes_are_stable_across_saves():
+    table = IdTable()
+    first = table.encode(['C1', 'C2', None, 'C1'])
+    assert first.tolist() == [0, 1, -1, 0]
+    table.save('ids.pkl')
+    loaded = IdTable.load('ids.pkl')
+    assert loaded.encode(['C2', 'C3', 'C1']).tolist() == [1, 2, 0]
+    assert loaded.encode(['C9'], add=False).tolist() == [-1] and len(loaded) == 3
+    assert loaded.decode([2, 0]).tolist() == ['C3', 'C1']
+    assert len(IdTable.load('missing.pkl')) == 0
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uw211.aggregates import BAD_CALL_TYPES
+from uw211.incremental import update_client_counts
+from uw211.loaders import CALL_TYPE_COL, CLIENT_ZIP_COL, parse_call_types
+
+CALL_TYPES = ["['Food']", "['Phantom']", "['Wrong #', 'Food']", "['Utilities', 'Housing']", '', 'not a list']
+
+
+@pytest.fixture
+def exports(zips):
+    # client / interaction exports with repeated IDs, ZIP+4s, ZIPs outside the area and interactions for
+    # clients whose row only shows up later
+    rng = np.random.default_rng(19)
+    ids = [f'C{k}' for k in range(300)]
+    clients = pd.DataFrame({
+        'Client_Id': rng.choice(ids, 500),
+        CLIENT_ZIP_COL: [f'{z}-1234' if k % 7 == 0 else z for k, z in
+                         enumerate(rng.choice(np.append(zips[:20], ['99999', '']), 500))],
+        'Other': 'x',
+    })
+    interactions = pd.DataFrame({
+        'Interaction_Id': rng.integers(0, 1500, 2000).astype(str),
+        'Client_Id': rng.choice(ids + ['C900', 'C901'], 2000),
+        CALL_TYPE_COL: rng.choice(CALL_TYPES, 2000),
+    })
+    area = pd.DataFrame({'GEO.display_label': [f'ZCTA5 {z}' for z in zips[:20]],
+                         'Pop_Estimate': np.arange(1000, 21000, 1000)})
+    return clients, interactions, area
+
+
+def _strict_counts(clients, interactions, area):
+    # what 'Filter Clients Calls ZIP.py' counts, straight from the full exports
+    clients = clients.drop_duplicates('Client_Id').set_index('Client_Id')
+    zip_code = clients[CLIENT_ZIP_COL].astype(str).str.extract(r'(\d{5})', expand=False)
+    interactions = interactions.drop_duplicates('Interaction_Id')
+    call_type = parse_call_types(interactions[CALL_TYPE_COL])
+    first = interactions.assign(call_type=call_type)[call_type.notna()].drop_duplicates('Client_Id')
+    first = first.set_index('Client_Id')['call_type']
+    valid = area['GEO.display_label'].str.extract(r'(\d{5})', expand=False)
+    counted = zip_code.isin(valid) & first.reindex(zip_code.index).notna()
+    counted &= ~first.reindex(zip_code.index).isin(BAD_CALL_TYPES)
+    return zip_code[counted].value_counts().rename('total_callers').rename_axis('zip_code')
+
+
+def _by_zip(zip_data):
+    return zip_data.sort_values('zip_code').reset_index(drop=True)
+
+
+def test_appended_batches_match_a_full_run(exports):
+    clients, interactions, area = exports
+    for k in range(1, 5):
+        clients.iloc[:len(clients) * k // 4].to_csv('clients.csv', index=False)
+        interactions.iloc[:len(interactions) * k // 4].to_csv('interactions.csv', index=False)
+        zip_data, summary = update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl',
+                                                 output_path='out.csv', chunksize=60)
+        assert not summary['rebuilt'] or k == 1
+        assert summary['new_client_rows'] == len(clients) // 4
+
+    full, _ = update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='full.pkl',
+                                   output_path='full.csv', chunksize=60)
+    pd.testing.assert_frame_equal(_by_zip(zip_data), _by_zip(full))
+    expected = _strict_counts(clients, interactions, area)
+    assert zip_data.set_index('zip_code')['total_callers'].sort_index().to_dict() == expected.sort_index().to_dict()
+
+
+def test_rewritten_export_rebuilds_the_state(exports):
+    clients, interactions, area = exports
+    clients.to_csv('clients.csv', index=False)
+    interactions.to_csv('interactions.csv', index=False)
+    update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl', output_path='out.csv')
+
+    clients = clients.iloc[::-1]
+    clients.to_csv('clients.csv', index=False)
+    zip_data, summary = update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl',
+                                             output_path='out.csv')
+    assert summary['rebuilt']
+    expected = _strict_counts(clients, interactions, area)
+    assert zip_data.set_index('zip_code')['total_callers'].sort_index().to_dict() == expected.sort_index().to_dict()
+
+
+def test_quoted_newline_at_the_tail_is_left_for_the_next_refresh(zips):
+    # the export was cut inside a quoted free-text field: the tail ends in a newline but not in a record
+    area = pd.DataFrame({'GEO.display_label': [f'ZCTA5 {z}' for z in zips[:3]], 'Pop_Estimate': [1000, 2000, 3000]})
+    header = f'Client_Id,{CLIENT_ZIP_COL},Notes\n'
+    first = f'C1,{zips[0]},"one line"\nC2,{zips[1]},plain\nC3,{zips[2]},"two\nlines"\n'
+    cut = f'C4,{zips[0]},"moved in,\n'
+    rest = f'then moved out"\nC5,{zips[1]},""\n'
+    with open('interactions.csv', 'w', newline='') as f:
+        f.write(f'Interaction_Id,Client_Id,{CALL_TYPE_COL}\n')
+        f.writelines(f'{k},C{k},"[\'Food\']"\n' for k in range(1, 6))
+
+    with open('clients.csv', 'w', newline='') as f:
+        f.write(header + first + cut)
+    _, summary = update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl',
+                                      output_path='out.csv')
+    assert summary['new_client_rows'] == 3
+
+    with open('clients.csv', 'a', newline='') as f:
+        f.write(rest)
+    zip_data, summary = update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl',
+                                             output_path='out.csv')
+    assert not summary['rebuilt'] and summary['new_client_rows'] == 2
+    clients = pd.read_csv('clients.csv', dtype=str)
+    assert clients['Notes'][3] == 'moved in,\nthen moved out'
+    interactions = pd.read_csv('interactions.csv', dtype=str)
+    expected = _strict_counts(clients, interactions, area)
+    assert zip_data.set_index('zip_code')['total_callers'].sort_index().to_dict() == expected.sort_index().to_dict()
+
+
+def test_states_from_an_older_format_are_rebuilt(exports):
+    clients, interactions, area = exports
+    clients.to_csv('clients.csv', index=False)
+    interactions.to_csv('interactions.csv', index=False)
+    update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl', output_path='out.csv')
+    state = pd.read_pickle('state.pkl')
+    del state['format']
+    pd.to_pickle(state, 'state.pkl')
+    _, summary = update_client_counts(area, 'clients.csv', 'interactions.csv', state_path='state.pkl',
+                                      output_path='out.csv')
+    assert summary['rebuilt'] and summary['new_client_rows'] == len(clients)
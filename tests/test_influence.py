@@ -0,0 +1,50 @@
+import numpy as np
+from esda.moran import Moran
+from scipy.stats import spearmanr
+
+from uw211.influence import influence_table, moran_i, moran_loo, spearman_loo
+from uw211.weights import weights_from_adjacency
+
+
+def test_spearman_loo_matches_brute_force(frame):
+    X = frame[['poverty_rate', 'alice_rate']].to_numpy()
+    X = np.column_stack([X, np.round(X[:, 0], 1)])  # ties
+    y = frame['callers_per_1000'].to_numpy()
+    loo = spearman_loo(X, y)
+    for i in range(len(y)):
+        keep = np.arange(len(y)) != i
+        for j in range(X.shape[1]):
+            np.testing.assert_allclose(loo[i, j], spearmanr(X[keep, j], y[keep]).statistic)
+
+
+def test_moran_i_matches_esda(lattice, frame):
+    _, w = lattice
+    for col in ['poverty_rate', 'callers_per_1000']:
+        y = frame[col].to_numpy()
+        np.testing.assert_allclose(moran_i(y, w), Moran(y, w, permutations=0).I)
+
+
+def test_moran_loo_matches_brute_force(lattice, frame):
+    # includes the corner ZIPs (3 neighbours) and a line of ZIPs with a single neighbour left
+    adjacency, _ = lattice
+    adjacency = adjacency.tolil()
+    for a, b in [(0, 9), (7, 14)]:
+        adjacency[a, b] = adjacency[b, a] = 0
+    adjacency = adjacency.tocsr()
+    adjacency.eliminate_zeros()
+    w = weights_from_adjacency(adjacency, silence_warnings=True)
+    y = frame['callers_per_1000'].to_numpy()
+    loo = moran_loo(y, w)
+    for i in range(len(y)):
+        keep = np.flatnonzero(np.arange(len(y)) != i)
+        cut = weights_from_adjacency(adjacency[keep][:, keep], silence_warnings=True)
+        np.testing.assert_allclose(loo[i], Moran(y[keep], cut, permutations=0).I)
+
+
+def test_influence_table_ranks_the_planted_outlier_first(lattice, lattice_subsets, frame):
+    frame.loc[20, 'callers_per_1000'] = 500.0  # a 78205-style ZIP
+    full, table = influence_table(frame, ['poverty_rate'], 'callers_per_1000')
+    assert table.iloc[0]['zip_code'] == frame.loc[20, 'zip_code']
+    assert table['influence_rank'].tolist() == list(range(1, len(frame) + 1))
+    np.testing.assert_allclose(full['rho_poverty_rate'],
+                               spearmanr(frame['poverty_rate'], frame['callers_per_1000']).statistic)
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+from esda.geary_local import Geary_Local
+from esda.geary_local_mv import Geary_Local_MV
+from esda.getisord import G_Local
+from esda.moran import Moran, Moran_Local, Moran_Local_BV
+
+from uw211.lisa import (bivariate_lisa_table, lisa_table, local_g_batch, local_geary_batch, local_geary_mv,
+                        local_moran_batch, local_moran_bv_batch, local_moran_bv_pairs, moran_global)
+
+PERMUTATIONS = 99
+
+
+def test_local_moran_batch_matches_moran_local(lattice, frame):
+    _, w = lattice
+    Y = frame[['poverty_rate', 'alice_rate', 'callers_per_1000']].to_numpy()
+    result = local_moran_batch(Y, w, permutations=PERMUTATIONS, cache=False)
+    for j in range(Y.shape[1]):
+        esda = Moran_Local(Y[:, j], w, permutations=PERMUTATIONS, seed=42)
+        np.testing.assert_allclose(result['Is'][:, j], esda.Is)
+        np.testing.assert_array_equal(result['q'][:, j], esda.q)
+        np.testing.assert_allclose(result['p_sim'][:, j], esda.p_sim)
+
+
+def test_results_do_not_depend_on_n_jobs(lattice, frame):
+    _, w = lattice
+    Y = frame[['poverty_rate', 'callers_per_1000']].to_numpy()
+    one = local_moran_batch(Y, w, permutations=PERMUTATIONS, cache=False)
+    two = local_moran_batch(Y, w, permutations=PERMUTATIONS, cache=False, n_jobs=2)
+    for key in one:
+        np.testing.assert_array_equal(one[key], two[key])
+
+
+def test_bivariate_matches_moran_local_bv(lattice, frame):
+    _, w = lattice
+    X = frame[['poverty_rate', 'alice_rate']].to_numpy()
+    y = frame['callers_per_1000'].to_numpy()
+    batch = local_moran_bv_batch(X, np.column_stack([y, y]), w, permutations=PERMUTATIONS, cache=False)
+    pairs = local_moran_bv_pairs(X, y[:, None], w, permutations=PERMUTATIONS, cache=False)
+    assert pairs['pairs'] == [(0, 0), (1, 0)]
+    for j in range(X.shape[1]):
+        esda = Moran_Local_BV(X[:, j], y, w, permutations=PERMUTATIONS, seed=42)
+        for result in (batch, pairs):
+            np.testing.assert_allclose(result['Is'][:, j], esda.Is)
+            np.testing.assert_array_equal(result['q'][:, j], esda.q)
+            np.testing.assert_allclose(result['p_sim'][:, j], esda.p_sim)
+
+
+def test_local_g_star_matches_g_local(lattice, frame):
+    _, w = lattice
+    Y = frame[['poverty_rate', 'callers_per_1000']].to_numpy()
+    result = local_g_batch(Y, w, star=True, permutations=PERMUTATIONS, cache=False)
+    for j in range(Y.shape[1]):
+        esda = G_Local(Y[:, j], w, star=True, permutations=PERMUTATIONS, seed=42, n_jobs=1)
+        np.testing.assert_allclose(result['Gs'][:, j], esda.Gs)
+        np.testing.assert_allclose(result['z'][:, j], esda.Zs)
+        np.testing.assert_allclose(result['p_sim'][:, j], esda.p_sim)
+
+
+def test_lisa_table_scores_each_variable_on_its_own_rows(lattice, lattice_subsets, frame):
+    _, w = lattice
+    frame.loc[[3, 40], 'poverty_rate'] = np.nan
+    table = lisa_table(frame, {'poverty': 'poverty_rate', 'callers': 'callers_per_1000'}, w,
+                       permutations=PERMUTATIONS, cache=False)
+
+    assert table['lisa_poverty_q'].isna().sum() == 2
+    scored = frame['poverty_rate'].notna().to_numpy()
+    esda = Moran_Local(frame.loc[scored, 'poverty_rate'].to_numpy(), lattice_subsets(frame.loc[scored, 'zip_code']),
+                       permutations=PERMUTATIONS, seed=42)
+    np.testing.assert_allclose(table.loc[scored, 'lisa_poverty_p'], esda.p_sim)
+
+    esda = Moran_Local(frame['callers_per_1000'].to_numpy(), w, permutations=PERMUTATIONS, seed=42)
+    np.testing.assert_array_equal(table['lisa_callers_q'].to_numpy(dtype=int), esda.q)
+    np.testing.assert_allclose(table['lisa_callers_p'], esda.p_sim)
+
+
+def test_bivariate_table_masks_each_pair(lattice, lattice_subsets, frame):
+    # a missing x only drops that ZIP from the pairs that use that x
+    _, w = lattice
+    frame.loc[[5, 17], 'poverty_rate'] = np.nan
+    table = bivariate_lisa_table(frame, ['poverty_rate', 'alice_rate'], ['callers_per_1000'], w,
+                                 permutations=PERMUTATIONS, cache=False)
+    for x, block in table.groupby('x', sort=False):
+        scored = frame[x].notna().to_numpy()
+        assert block['biv_I'].notna().to_numpy().tolist() == scored.tolist()
+        esda = Moran_Local_BV(frame.loc[scored, x].to_numpy(), frame.loc[scored, 'callers_per_1000'].to_numpy(),
+                              lattice_subsets(frame.loc[scored, 'zip_code']), permutations=PERMUTATIONS, seed=42)
+        np.testing.assert_allclose(block['biv_I'].to_numpy()[scored], esda.Is)
+        np.testing.assert_allclose(block['biv_p'].to_numpy()[scored], esda.p_sim)
+
+
+@pytest.mark.parametrize('correction', ['fdr', 'bonferroni'])
+def test_corrected_labels_only_use_adjusted_significance(lattice, frame, correction):
+    _, w = lattice
+    table = lisa_table(frame, {'callers': 'callers_per_1000'}, w, permutations=PERMUTATIONS, cache=False,
+                       correction=correction)
+    significant = table[f'lisa_callers_sig_{correction}'].to_numpy(dtype=bool)
+    assert (table.loc[~significant, 'lisa_callers_quad_label'] == 'NS').all()
+    assert (table.loc[significant, 'lisa_callers_quad_label'] != 'NS').all()
+
+
+def test_sequential_p_values_agree_with_a_full_run(lattice, frame):
+    _, w = lattice
+    Y = frame[['poverty_rate', 'alice_rate', 'callers_per_1000']].to_numpy()
+    full = local_moran_batch(Y, w, permutations=999, cache=False)
+    early = local_moran_batch(Y, w, permutations=999, sequential=True, cache=False)
+
+    stopped = early['draws'] < 999
+    assert stopped.mean() > 0.5
+    # ZIPs that ran to the end are scored on the same draws, the rest land on the same side of alpha
+    np.testing.assert_array_equal(early['p_sim'][~stopped], full['p_sim'][~stopped])
+    np.testing.assert_array_equal(early['p_sim'] < 0.05, full['p_sim'] < 0.05)
+    np.testing.assert_array_equal(early['q'], full['q'])
+
+
+def test_analytic_z_scores_match_esda_simulated_ones(lattice, frame):
+    # the exact conditional-randomization moments vs esda's z_sim from many permutations
+    _, w = lattice
+    Y = frame[['poverty_rate', 'callers_per_1000']].to_numpy()
+    result = local_moran_batch(Y, w, cache=False, inference='analytic')
+    assert 'p_sim' not in result
+    for j in range(Y.shape[1]):
+        esda = Moran_Local(Y[:, j], w, permutations=9999, seed=42)
+        np.testing.assert_allclose(result['Is'][:, j], esda.Is)
+        np.testing.assert_array_equal(result['q'][:, j], esda.q)
+        np.testing.assert_allclose(result['z'][:, j], esda.z_sim, atol=0.1)
+        np.testing.assert_allclose(result['p_z'][:, j], esda.p_z_sim, atol=0.02)
+
+
+def test_analytic_global_moran_is_esda_p_rand(lattice, frame):
+    _, w = lattice
+    y = frame['callers_per_1000'].to_numpy()
+    moran = moran_global(y, w, inference='analytic')
+    esda = Moran(y, w, permutations=0)
+    assert moran.inference == 'analytic'
+    np.testing.assert_allclose([moran.I, moran.z_rand, moran.p], [esda.I, esda.z_rand, esda.p_rand])
+
+
+def test_local_geary_matches_esda(lattice, frame):
+    # esda doesn't reproduce its own draws for local Geary, so the statistic and the labels are compared
+    # (sig=1 makes esda label every ZIP, the label only depends on localG and the value then)
+    _, w = lattice
+    Y = frame[['poverty_rate', 'callers_per_1000']].to_numpy()
+    result = local_geary_batch(Y, w, permutations=PERMUTATIONS, cache=False)
+    for j in range(Y.shape[1]):
+        esda = Geary_Local(connectivity=w, labels=True, sig=1.0, permutations=PERMUTATIONS).fit(Y[:, j])
+        np.testing.assert_allclose(result['localG'][:, j], esda.localG)
+        np.testing.assert_array_equal(result['q'][:, j], esda.labs)
+
+    mv = local_geary_mv(Y, w, permutations=PERMUTATIONS, cache=False)
+    esda = Geary_Local_MV(connectivity=w, permutations=PERMUTATIONS).fit([Y[:, 0], Y[:, 1]])
+    np.testing.assert_allclose(mv['localG'][:, 0], esda.localG)
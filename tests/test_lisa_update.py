@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from esda.moran import Moran_Local
+
+from uw211.lisa import lisa_table
+from uw211.lisa_update import lisa_state, load_lisa_state, save_lisa_state, state_table, update_lisa
+
+PERMUTATIONS = 99
+
+
+def _assert_matches_full_run(result, y, w):
+    esda = Moran_Local(y, w, permutations=PERMUTATIONS, seed=42)
+    np.testing.assert_allclose(result['Is'], esda.Is)
+    np.testing.assert_array_equal(result['q'], esda.q)
+    np.testing.assert_allclose(result['p_sim'], esda.p_sim)
+
+
+def test_updates_match_a_full_run(lattice, frame):
+    _, w = lattice
+    y = frame['callers_per_1000'].to_numpy(copy=True)
+    state = lisa_state(y, w, zips=frame['zip_code'], permutations=PERMUTATIONS)
+
+    # a corner ZIP and an inner one, then a second round that moves one of them back
+    for changes in [{'78000': 40.0, '78027': 0.1}, {'78027': y[27], '78063': 12.5}]:
+        result = update_lisa(state, changes)
+        for key, value in changes.items():
+            y[int(key) - 78000] = value
+        _assert_matches_full_run(result, y, w)
+
+
+def test_changes_by_position_and_a_saved_state(lattice, frame):
+    _, w = lattice
+    y = frame['poverty_rate'].to_numpy(copy=True)
+    save_lisa_state(lisa_state(y, w, permutations=PERMUTATIONS), 'state.pkl')
+    state = load_lisa_state('state.pkl')
+    y[[10, 11]] = [0.9, 0.0]
+    _assert_matches_full_run(update_lisa(state, {10: 0.9, 11: 0.0}), y, w)
+
+
+def test_state_table_matches_lisa_table(lattice, frame):
+    _, w = lattice
+    state = lisa_state(frame['callers_per_1000'], w, zips=frame['zip_code'], permutations=PERMUTATIONS)
+    update_lisa(state, {'78005': 30.0})
+    frame.loc[5, 'callers_per_1000'] = 30.0
+    full = lisa_table(frame, {'callers': 'callers_per_1000'}, w, permutations=PERMUTATIONS, cache=False)
+    ours = state_table(state, 'callers')
+    for col in ['lisa_callers_q', 'lisa_callers_sig', 'lisa_callers_quad_label']:
+        assert ours[col].tolist() == full[col].tolist()
+    np.testing.assert_allclose(ours['lisa_callers_p'], full['lisa_callers_p'])
+
+
+def test_missing_values_are_refused(lattice, frame):
+    _, w = lattice
+    y = frame['callers_per_1000'].to_numpy(copy=True)
+    state = lisa_state(y, w, permutations=PERMUTATIONS)
+    with pytest.raises(ValueError):
+        update_lisa(state, {3: np.nan})
+    y[3] = np.nan
+    with pytest.raises(ValueError):
+        lisa_state(y, w)
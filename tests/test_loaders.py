@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uw211.ids import IdTable
+from uw211.loaders import (CALL_TYPE_COL, CLIENT_ZIP_COL, all_call_types, clean_call_type, load_clients,
+                           load_interactions, parse_call_types)
+
+
+@pytest.fixture
+def client_tab():
+    # repeated Client_Ids with different ZIPs, ZIP+4s, missing ZIPs and a couple of columns the loader skips
+    rng = np.random.default_rng(23)
+    df = pd.DataFrame({
+        'Client_Id': rng.choice([f'C{k}' for k in range(40)], 120),
+        CLIENT_ZIP_COL: rng.choice(['78201', '78207-1234', '78205.0', '', '78250'], 120),
+        'Age': rng.integers(18, 90, 120),
+        'Notes': rng.choice(['x', 'y, z', ''], 120),
+    })
+    df.to_csv('clients.csv', index=False)
+    return 'clients.csv'
+
+
+@pytest.fixture
+def interaction_tab():
+    rng = np.random.default_rng(29)
+    df = pd.DataFrame({
+        'Interaction_Id': rng.integers(0, 150, 200).astype(str),
+        'Client_Id': rng.choice([f'C{k}' for k in range(40)], 200),
+        CALL_TYPE_COL: rng.choice(["['Food']", "['Phantom']", "['Utilities', 'Housing']", '', '[]', 'oops'], 200),
+        'Junk': 1,
+    })
+    df.to_csv('interactions.csv', index=False)
+    return 'interactions.csv'
+
+
+def test_clients_match_read_csv_and_drop_duplicates(client_tab):
+    # what the cleanup scripts did: full read_csv, then drop_duplicates(subset=['Client_Id'])
+    expected = pd.read_csv(client_tab, dtype={'Client_Id': 'str', CLIENT_ZIP_COL: 'str'})
+    rows_read = len(expected)
+    expected = expected.drop_duplicates(subset=['Client_Id']).reset_index(drop=True)
+
+    df = load_clients(client_tab, chunksize=17, client_ids=IdTable())
+    assert df.attrs['rows_read'] == rows_read
+    pd.testing.assert_frame_equal(df[['Client_Id', CLIENT_ZIP_COL]], expected[['Client_Id', CLIENT_ZIP_COL]],
+                                  check_dtype=False)
+    expected_zip = expected[CLIENT_ZIP_COL].astype(str).str.extract(r'(\d{5})', expand=False)
+    assert df['zip_code'].tolist() == expected_zip.tolist()
+    assert df['client_code'].is_unique
+
+
+def test_all_columns_keeps_the_client_tab_schema(client_tab):
+    expected = pd.read_csv(client_tab, dtype={'Client_Id': 'str', CLIENT_ZIP_COL: 'str'})
+    expected = expected.drop_duplicates(subset=['Client_Id']).reset_index(drop=True)
+    df = load_clients(client_tab, chunksize=17, client_ids=IdTable(), all_columns=True)
+    pd.testing.assert_frame_equal(df.drop(columns=['client_code', 'zip_code']), expected, check_dtype=False)
+
+
+def test_interactions_match_read_csv_and_drop_duplicates(interaction_tab):
+    expected = pd.read_csv(interaction_tab, dtype={'Interaction_Id': 'str', 'Client_Id': 'str', CALL_TYPE_COL: 'str'})
+    rows_read = len(expected)
+    expected = expected.drop_duplicates(subset=['Interaction_Id']).reset_index(drop=True)
+
+    client_ids = IdTable()
+    df = load_interactions(interaction_tab, chunksize=23, client_ids=client_ids, interaction_ids=IdTable())
+    assert df.attrs['rows_read'] == rows_read
+    assert df['Interaction_Id'].tolist() == expected['Interaction_Id'].tolist()
+    assert df['Client_Id'].tolist() == expected['Client_Id'].tolist()
+    assert df['clean_call_type'].astype(object).tolist() == expected[CALL_TYPE_COL].apply(clean_call_type).tolist()
+    np.testing.assert_array_equal(df['client_code'], client_ids.encode(expected['Client_Id']))
+
+
+def test_parse_call_types_matches_apply():
+    values = pd.Series(["['Food']", "['Wrong #', 'Food']", "['Food']", None, np.nan, '', '[]', "'Food'", '[unquoted]',
+                        "['Utilities', 'Housing']"] * 3, index=range(100, 130))
+    parsed = parse_call_types(values)
+    assert parsed.index.equals(values.index)
+    # per value, like .apply did on the object column (pandas 3 string columns skip the missing values in apply)
+    assert parsed.tolist() == [clean_call_type(v) for v in values]
+    assert parse_call_types(values, first_only=False).tolist() == [all_call_types(v) for v in values]
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+from uw211.lisa import local_moran_batch
+from uw211.memo import MEMO_DIR, clear_memo, memo_key, memoized
+
+
+def _counting(values):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'Is': values * 2, 'q': np.arange(len(values))}
+    return compute, calls
+
+
+def _files():
+    return sorted(os.listdir(MEMO_DIR))
+
+
+def test_repeat_call_is_a_hit(lattice):
+    _, w = lattice
+    values = np.linspace(0, 1, 64)
+    compute, calls = _counting(values)
+    first = memoized('lisa', compute, (values,), w, permutations=99, seed=42)
+    second = memoized('lisa', compute, (values.copy(),), w, permutations=99, seed=42)
+    assert len(calls) == 1
+    for key in first:
+        np.testing.assert_array_equal(first[key], second[key])
+
+
+def test_any_input_change_is_a_new_key(lattice):
+    _, w = lattice
+    values = np.linspace(0, 1, 64)
+    compute, calls = _counting(values)
+    memoized('lisa', compute, (values,), w, permutations=99, seed=42)
+    changed = values.copy()
+    changed[5] += 1e-9
+    memoized('lisa', compute, (changed,), w, permutations=99, seed=42)
+    memoized('lisa', compute, (values,), w, permutations=99, seed=43)
+    memoized('lisa', compute, (values,), w, permutations=999, seed=42)
+    memoized('local_g', compute, (values,), w, permutations=99, seed=42)
+    w.transform = 'b'
+    memoized('lisa', compute, (values,), w, permutations=99, seed=42)
+    assert len(calls) == 6 and len(_files()) == 6
+
+
+def test_least_recently_used_results_are_evicted():
+    values = np.zeros(1000)
+    compute, calls = _counting(values)
+
+    def name(seed):
+        return f"lisa-{memo_key('lisa', (values,), seed=seed)}.npz"
+
+    for seed in range(3):
+        memoized('lisa', compute, (values,), seed=seed)
+        os.utime(os.path.join(MEMO_DIR, name(seed)), ns=(10 ** 18 + seed, 10 ** 18 + seed))  # 0 oldest
+    size = os.path.getsize(os.path.join(MEMO_DIR, name(0)))
+
+    # a hit marks seed 0 as recently used, so the next write over the cap evicts seed 1 instead
+    memoized('lisa', compute, (values,), seed=0)
+    assert len(calls) == 3
+    memoized('lisa', compute, (values,), seed=3, max_bytes=3 * size)
+    assert _files() == sorted(name(seed) for seed in (0, 2, 3))
+
+    clear_memo()
+    assert _files() == []
+
+
+def test_lisa_results_come_back_the_same_from_the_memo(lattice, frame):
+    _, w = lattice
+    Y = frame[['poverty_rate', 'callers_per_1000']].to_numpy()
+    fresh = local_moran_batch(Y, w, permutations=99, cache=False)
+    local_moran_batch(Y, w, permutations=99)
+    cached = local_moran_batch(Y, w, permutations=99)
+    assert len(_files()) == 1
+    for key in fresh:
+        np.testing.assert_array_equal(cached[key], fresh[key])
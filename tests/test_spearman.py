@@ -0,0 +1,49 @@
+import numpy as np
+from scipy.stats import spearmanr
+
+from uw211.spearman import spearman_batch, spearman_matrix, spearman_table
+
+
+def _indicators(frame):
+    X = frame[['poverty_rate', 'alice_rate']].to_numpy()
+    X = np.column_stack([X, X.sum(1), np.round(X[:, 0], 1)])  # poverty + ALICE, and a tied column
+    return X, frame['callers_per_1000'].to_numpy()
+
+
+def test_matrix_matches_spearmanr(frame):
+    X, y = _indicators(frame)
+    rho, p = spearman_matrix(X, y)
+    for j in range(X.shape[1]):
+        scipy = spearmanr(X[:, j], y)
+        np.testing.assert_allclose(rho[j, 0], scipy.statistic)
+        np.testing.assert_allclose(p[j, 0], scipy.pvalue)
+
+
+def test_batch_does_not_depend_on_n_jobs(frame):
+    X, y = _indicators(frame)
+    one = spearman_batch(X, y, permutations=250, bootstraps=250)
+    two = spearman_batch(X, y, permutations=250, bootstraps=250, n_jobs=2)
+    for key in one:
+        np.testing.assert_array_equal(one[key], two[key])
+
+
+def test_bootstrap_interval_and_permutation_p(frame):
+    X, y = _indicators(frame)
+    result = spearman_batch(X, y, permutations=199, bootstraps=400)
+    assert ((result['ci_low'] <= result['rho']) & (result['rho'] <= result['ci_high'])).all()
+    assert ((result['p_perm'] >= 1 / 200) & (result['p_perm'] <= 1)).all()
+
+    # a perfectly reversed ranking: rho = -1 and no shuffle gets that far from 0
+    result = spearman_batch(-y, y, permutations=199, bootstraps=0)
+    assert result['rho'][0, 0] == -1 and result['p_perm'][0, 0] == 1 / 200
+    assert np.isnan(result['ci_low']).all()
+
+
+def test_table_drops_incomplete_rows(frame):
+    frame.loc[[2, 8], 'alice_rate'] = np.nan
+    table = spearman_table(frame, {'Poverty Rate': 'poverty_rate', 'ALICE Rate': 'alice_rate'}, 'callers_per_1000',
+                           permutations=0, bootstraps=0)
+    complete = frame.dropna()
+    scipy = spearmanr(complete['poverty_rate'], complete['callers_per_1000'])
+    np.testing.assert_allclose(table.loc[0, 'Spearman ρ'], scipy.statistic)
+    np.testing.assert_allclose(table.loc[0, 'p-value'], scipy.pvalue)
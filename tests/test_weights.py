@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+from libpysal.weights import Queen
+
+import uw211.weights
+from uw211.geo import ingest_zip_shapes, load_zip_shapes
+from uw211.weights import WEIGHTS_DIR, queen_weights, subset_weights
+
+
+@pytest.fixture
+def shapes(zip_geojson):
+    ingest_zip_shapes(zip_geojson)
+    return load_zip_shapes()
+
+
+def _assert_same_weights(w, expected):
+    assert w.id_order == list(range(expected.n))
+    np.testing.assert_allclose(w.sparse.toarray(), expected.sparse.toarray())
+
+
+def _queen(gdf):
+    # what the scripts did
+    w = Queen.from_dataframe(gdf, use_index=False, silence_warnings=True)
+    w.transform = 'r'
+    return w
+
+
+def test_queen_weights_match_queen_from_dataframe(shapes):
+    gdf = shapes.sample(frac=1, random_state=3).reset_index(drop=True)
+    _assert_same_weights(queen_weights(gdf), _queen(gdf))
+
+
+def test_cached_weights_skip_the_polygons_and_follow_the_rows(shapes, monkeypatch):
+    queen_weights(shapes)
+    assert len([name for name in os.listdir(WEIGHTS_DIR) if name.startswith('queen-')]) == 1
+
+    def no_polygons(gdf):
+        raise AssertionError('adjacency should come from the cache')
+    monkeypatch.setattr(uw211.weights, '_queen_adjacency', no_polygons)
+    reordered = shapes.iloc[::-1].reset_index(drop=True)
+    _assert_same_weights(queen_weights(reordered), _queen(reordered))
+
+    # a different ZIP set is a different key
+    with pytest.raises(AssertionError):
+        queen_weights(shapes.iloc[:20])
+
+
+def test_subset_weights_match_queen_on_the_subset(shapes):
+    # two columns of the grid plus the far corner cell: the columns lose neighbours, the corner is an island
+    bounds = shapes.geometry.bounds
+    keep = bounds['minx'].isin([0, 2]) | ((bounds['minx'] == 5) & (bounds['miny'] == 5))
+    subset = shapes[keep].sample(frac=1, random_state=5)
+    subset = subset.reset_index(drop=True)
+    w = subset_weights(subset['zip_code'], silence_warnings=True)
+    expected = _queen(subset)
+    assert expected.islands
+    assert w.islands == expected.islands
+    _assert_same_weights(w, expected)
+
+
+def test_subset_weights_treat_unknown_zips_as_islands(shapes):
+    w = subset_weights(['78201', '99999', '78202'], silence_warnings=True)
+    assert w.islands == [1]
+    assert w.neighbors[0] == [2]
@@ -0,0 +1,6 @@
+'''
+Shared helpers for the 2-1-1 call data scripts.
+
+The analysis scripts in this repo are run from the repo root (every CSV path is relative to it),
+so scripts inside sub-folders add the working directory to sys.path before importing from here.
+'''
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from uw211.ids import first_occurrence, in_set
+from uw211.loaders import CLIENT_ZIP_COL, extract_zip
+
+'''
+ZIP-level aggregate helpers shared by the cleanup scripts.
+
+build_zip_aggregates is the single-pass version of what 'starter/Old Client ZIP Code Cleanup.py' (inclusive)
+and 'Filter Clients Calls ZIP.py' (strict) used to compute separately from their own reads of the raw data.
+The deduped client table is factorized once and every variant is a bincount over those codes:
+- inclusive: every unique caller, no census ZIP check, Phantom / Wrong # kept. Counted per raw ZIP entry like
+  the starter's value_counts, so ZIP+4 variants of a ZIP stay separate rows and 'Unknown' / unparseable
+  entries stay in as a row with no zip_code
+- strict: callers from census ZIPs whose first parseable call isn't Phantom / Wrong #, counted per 5-digit ZIP
+plus callers_per_1000 for the inclusive and strict tables.
+'''
+
+AREA_TAB = '211 Area Indicators_ZipZCTA.csv'
+BAD_CALL_TYPES = ['Phantom', 'Wrong #']
+MIN_POPULATION = 500
+
+
+def area_zips(df_area):
+    # 5-digit ZIPs listed in the census-style area indicators file
+    return df_area['GEO.display_label'].astype(str).str.extract(r'(\d{5})', expand=False)
+
+
+def county_zips(df_area, county):
+    # 5-digit ZIPs the area indicators file puts in `county` (County_Name, not case sensitive)
+    in_county = df_area['County_Name'].astype(str).str.strip().str.lower() == county.lower()
+    return area_zips(df_area[in_county]).dropna().unique()
+
+
+def add_callers_per_1000(zip_counts, df_area):
+    '''
+    Merges ZIP population onto a zip_code / total_callers table and computes callers per 1,000 residents.
+    Missing population is filled with 1 to avoid divide-by-zero (same as the strict cleanup script).
+    '''
+    zip_pop = pd.DataFrame({'zip_code': area_zips(df_area), 'population': df_area['Pop_Estimate']}).dropna()
+
+    zip_data = pd.merge(zip_counts, zip_pop, on='zip_code', how='left')
+    zip_data['population'] = zip_data['population'].fillna(1)
+    zip_data['callers_per_1000'] = (zip_data['total_callers'] / zip_data['population']) * 1000
+    return zip_data
+
+
+def build_zip_aggregates(df_client, df_area, df_interaction=None, min_population=MIN_POPULATION):
+    '''
+    df_client / df_interaction are the deduped frames from uw211.loaders (raw ZIP, zip_code, client_code,
+    clean_call_type).
+    Returns a dict of DataFrames:
+        'inclusive'       zip_code, total_callers, one row per raw ZIP entry (Old_Callers_By_Zip.csv), zip_code is
+                          the 5 digits extracted from it (NaN when there are none)
+        'inclusive_rates' inclusive + population + callers_per_1000, rows with a zip_code and population >
+                          min_population (Old_Callers_Per_1000.csv)
+    and, when df_interaction is given:
+        'strict'          zip_code, total_callers, population, callers_per_1000 (New_211_Client_Cleaned.csv)
+    plus 'summary', a dict with the caller totals the cleanup script prints.
+    '''
+    out = {}
+
+    raw_codes, raw_zips = pd.factorize(df_client[CLIENT_ZIP_COL])
+    inclusive = np.bincount(raw_codes[raw_codes >= 0], minlength=len(raw_zips))
+    out['inclusive'] = _counts_frame(extract_zip(pd.Series(raw_zips, dtype=object)), inclusive)
+    inclusive_rates = add_callers_per_1000(out['inclusive'], df_area).dropna(subset=['zip_code'])
+    out['inclusive_rates'] = inclusive_rates[inclusive_rates['population'] > min_population].reset_index(drop=True)
+
+    zip_codes, zips = pd.factorize(df_client['zip_code'])
+    n_zips = len(zips)
+    out['summary'] = {'unique_callers': len(df_client), 'unknown_zip_callers': int((zip_codes < 0).sum())}
+
+    if df_interaction is None:
+        return out
+
+    # callers whose ZIP is listed in the census data
+    zip_is_valid = np.append(zips.isin(area_zips(df_area).dropna()), False)  # last slot = missing ZIP (-1)
+    client_valid = zip_is_valid[zip_codes]
+
+    # first parseable call per caller with a valid ZIP
+    calls = df_interaction[df_interaction['clean_call_type'].notna()]
+    calls = calls[in_set(calls['client_code'], df_client['client_code'].to_numpy()[client_valid])]
+    first_calls = calls.iloc[first_occurrence(calls['client_code'])]
+
+    # client_code -> ZIP position lookup, so each first call lands on its caller's ZIP
+    # (a missing Client_Id is code -1, it goes to a last slot nobody reads instead of the highest client's ZIP)
+    client_codes = df_client['client_code'].to_numpy()
+    zip_of_client = np.full(int(client_codes.max(initial=-1)) + 2, -1, dtype=np.int64)
+    zip_of_client[client_codes] = zip_codes
+    zip_of_client[-1] = -1
+    call_zip = zip_of_client[first_calls['client_code'].to_numpy()]
+
+    type_codes, types = pd.factorize(first_calls['clean_call_type'].astype(object))
+    n_types = len(types)
+    by_type = np.bincount(call_zip * n_types + type_codes, minlength=n_zips * n_types).reshape(n_zips, n_types)
+
+    strict = by_type[:, ~types.isin(BAD_CALL_TYPES)].sum(axis=1)
+    out['strict'] = add_callers_per_1000(_counts_frame(zips, strict), df_area)
+
+    out['summary'].update({
+        'valid_zip_callers': int(by_type.sum()),
+        'final_callers': int(strict.sum()),
+    })
+    return out
+
+
+def _counts_frame(zips, counts):
+    # zip_code / total_callers sorted like value_counts (most callers first), zero-count ZIPs dropped
+    df = pd.DataFrame({'zip_code': np.asarray(zips, dtype=object), 'total_callers': counts})
+    df = df[df['total_callers'] > 0]
+    return df.sort_values('total_callers', ascending=False, kind='stable').reset_index(drop=True)
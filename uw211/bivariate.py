@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+'''
+Bivariate quantile classes for the caller rate vs need heat maps.
+
+The heat map scripts cut each indicator into quartiles with pd.qcut, then filled the 4x4 count grid with a
+df.iterrows() loop and built each ZIP's map colour from per-row (y, x) tuples looked up in a dict.
+Here every indicator column is cut in one pass (quantile_codes), and a grid is a single np.bincount over the
+combined cell code y * k + x, so the same code handles k other than 4 and ZIP x year panels with
+millions of rows (groups=: one set of cut points and one grid per year).
+
+Cut points and codes are the same as pd.qcut(x, k, labels=False): linear-interpolated quantiles, bins closed
+on the right, the minimum in the first bin, missing values left out (code -1). Like qcut, a column whose
+quantiles repeat (too many ties for k bins) is an error rather than a silently shifted set of classes.
+
+Grids use the heat-map layout: row 0 is the highest y quantile, column 0 the lowest x quantile, so
+grid[k - 1 - y, x] counts the ZIPs in y quantile y and x quantile x, and cell codes / colours index the same
+k x k colour matrix the scripts draw with.
+'''
+
+QUARTILES = 4
+MAX_PARTITION_GROUPS = 256
+BIVARIATE_COLORS = [
+    ["#21296B", "#5082F0", "#CCCCCC", "#CCCCCC"],
+    ["#5082F0", "#CCCCCC", "#CCCCCC", "#CCCCCC"],
+    ["#CCCCCC", "#CCCCCC", "#CCCCCC", "#F47925"],
+    ["#CCCCCC", "#CCCCCC", "#F47925", "#D12626"]
+]
+
+
+def quantile_codes(values, k=QUARTILES, groups=None):
+    '''
+    values: (n,) or (n, m) array / Series / DataFrame. Returns int codes 0..k-1 of the same shape (-1 where
+    missing), column by column, with the cut points computed within each group when groups (n,) is given.
+    '''
+    X = np.asarray(values, dtype=float)
+    flat = X.ndim == 1
+    X = X.reshape(len(X), -1)
+    group_codes, group_names = (np.zeros(len(X), dtype=np.int64), None) if groups is None else pd.factorize(groups)
+
+    codes = np.full(X.shape, -1, dtype=np.int64)
+    for j in range(X.shape[1]):
+        edges = _quantile_edges(X[:, j], group_codes, k)
+        _check_edges(edges, values, j, group_names)
+        known = ~np.isnan(X[:, j]) & (group_codes >= 0)
+        # number of inner cut points below the value = its bin (right-closed, minimum lands in bin 0)
+        inner = edges[group_codes[known], 1:-1]
+        codes[known, j] = (X[known, j][:, None] > inner).sum(1)
+    return codes[:, 0] if flat else codes
+
+
+def bivariate_grid(x_codes, y_codes, k=QUARTILES, groups=None):
+    '''
+    (k, k) counts in heat-map layout (row 0 = top y quantile), or (n groups, k, k) with groups.
+    Rows with a missing code in either variable aren't counted.
+    '''
+    cells = bivariate_cells(x_codes, y_codes, k)
+    known = cells >= 0
+    if groups is None:
+        return np.bincount(cells[known], minlength=k * k).reshape(k, k)
+    group_codes, group_names = pd.factorize(groups)
+    known &= group_codes >= 0
+    counts = np.bincount(group_codes[known] * k * k + cells[known], minlength=len(group_names) * k * k)
+    return counts.reshape(len(group_names), k, k)
+
+
+def bivariate_cells(x_codes, y_codes, k=QUARTILES):
+    # flat heat-map cell per row, (k - 1 - y) * k + x, or -1 if either code is missing
+    x_codes = np.asarray(x_codes)
+    y_codes = np.asarray(y_codes)
+    return np.where((x_codes >= 0) & (y_codes >= 0), (k - 1 - y_codes) * k + x_codes, -1)
+
+
+def bivariate_classify(df, x_cols, y_col, k=QUARTILES, colors=BIVARIATE_COLORS, groups=None):
+    '''
+    Quantile classes of every x column against y_col in one go.
+    Returns (grids, cells):
+        grids  {x column: k x k count grid} (n groups x k x k with groups)
+        cells  DataFrame on df's index with <x>_cell (flat heat-map cell, -1 if missing) and <x>_color
+               (entry of the k x k colours matrix, missing if the cell is) for every x column
+    groups: column name or (n,) array, e.g. the year of a ZIP x year panel.
+    '''
+    if isinstance(groups, str):
+        groups = df[groups].to_numpy()
+    codes = quantile_codes(df[list(x_cols) + [y_col]], k, groups)
+    palette = np.asarray(colors, dtype=object).reshape(k * k)
+
+    grids = {}
+    cells = pd.DataFrame(index=df.index)
+    for j, col in enumerate(x_cols):
+        grids[col] = bivariate_grid(codes[:, j], codes[:, -1], k, groups)
+        cell = bivariate_cells(codes[:, j], codes[:, -1], k)
+        cells[f'{col}_cell'] = cell
+        cells[f'{col}_color'] = np.where(cell >= 0, palette[cell], None)
+    return grids, cells
+
+
+def _quantile_edges(x, group_codes, k):
+    # (n groups, k + 1) cut points per group, numpy's linear quantiles (what pd.qcut uses)
+    n_groups = group_codes.max(initial=-1) + 1
+    known = ~np.isnan(x) & (group_codes >= 0)
+    values = x[known]
+    codes = group_codes[known]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+
+    # quantile levels rounded up where k * level isn't exact, as pd.qcut does, then numpy's (n - 1) * level
+    levels = np.linspace(0, 1, k + 1)
+    np.putmask(levels, k * levels != np.arange(k + 1), np.nextafter(levels, 1))
+    position = levels[None, :] * (counts[:, None] - 1)
+    below = np.floor(position).astype(np.int64)
+    t = position - below
+    above = np.minimum(below + 1, counts[:, None] - 1)
+
+    # only the order statistics at below / above are needed: partition each group instead of sorting it
+    # (one lexsort when there are lots of small groups and the per-group loop would cost more)
+    ordered = values[np.argsort(codes, kind='stable')]
+    if n_groups > MAX_PARTITION_GROUPS:
+        ordered = values[np.lexsort((values, codes))]
+    else:
+        for g in np.flatnonzero(counts):
+            segment = ordered[starts[g]:starts[g] + counts[g]]
+            segment.partition(np.unique(np.concatenate([below[g], above[g]])))
+
+    edges = np.full((n_groups, k + 1), np.nan)
+    has_values = counts > 0
+    a = ordered[(starts[:, None] + below)[has_values]]
+    b = ordered[(starts[:, None] + above)[has_values]]
+    t = t[has_values]
+    # same lerp as numpy's quantile, so the cut points are bit-identical to pd.qcut's
+    edges[has_values] = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+    return edges
+
+
+def _check_edges(edges, values, j, group_names):
+    repeated = (np.diff(edges, axis=1) == 0).any(1)
+    if repeated.any():
+        name = values.columns[j] if isinstance(values, pd.DataFrame) else f'column {j}'
+        where = '' if group_names is None else f" in group {group_names[np.flatnonzero(repeated)[0]]!r}"
+        raise ValueError(f"quantile cut points for {name}{where} aren't unique, too many ties for these bins")
@@ -0,0 +1,181 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # no pyarrow -> every load falls back to pd.read_csv
+    pa = None
+
+'''
+Columnar cache of the raw 2-1-1 exports (Client tab, Interaction tab, area indicators).
+
+The first time a raw CSV is loaded it gets converted (streamed, so memory stays flat) into an
+Arrow IPC file under .cache/raw/. Every later load from any script memory-maps that file and
+skips CSV parsing completely.
+
+Cache files are keyed by the source file's path, content hash + size, so when the NDA data drop is
+refreshed the old copy is thrown away and rebuilt automatically. To avoid re-hashing multi-GB
+files on every run, the hash is remembered in .cache/raw/manifest.json and only recomputed
+when the file's size or modified time changes.
+
+The cache keeps the raw text of every column; columns are re-typed on load (int -> float -> bool -> text,
+like read_csv) unless the caller asks for them as 'str'.
+'''
+
+CACHE_DIR = os.path.join('.cache', 'raw')
+MANIFEST = 'manifest.json'
+HASH_BLOCK = 1 << 20
+CACHE_FORMAT = 2  # bump when the conversion changes, so copies written by an older version get rebuilt
+TRUE_VALUES = ['True', 'TRUE', 'true']  # what read_csv turns into booleans by default
+FALSE_VALUES = ['False', 'FALSE', 'false']
+
+
+def fingerprint(path):
+    # content hash + size of a source file
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            sha1.update(block)
+    return sha1.hexdigest(), os.path.getsize(path)
+
+
+def cached_path(path, cache_dir=CACHE_DIR):
+    '''
+    Returns the Arrow copy of a raw CSV, (re)building it if the source changed.
+    Returns None when pyarrow isn't installed.
+    '''
+    if pa is None:
+        return None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, MANIFEST)
+    manifest = _read_manifest(manifest_path)
+
+    source = os.path.abspath(path)
+    stat = os.stat(source)
+    entry = manifest.get(source)
+    if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+        sha1, size = fingerprint(source)
+        entry = {'sha1': sha1, 'size': size, 'mtime_ns': stat.st_mtime_ns}
+
+    stem = _stem(source)
+    target = os.path.join(cache_dir, f"{stem}-v{CACHE_FORMAT}-{entry['sha1'][:16]}-{entry['size']}.arrow")
+    if not os.path.exists(target):
+        # new data drop (or first run) - drop this export's stale copy (the one the manifest points at) and convert
+        # again; other exports' copies are left alone even when their names start the same way
+        previous = manifest.get(source, {}).get('cache')
+        if previous and os.path.exists(os.path.join(cache_dir, previous)):
+            os.remove(os.path.join(cache_dir, previous))
+        _convert(source, target)
+
+    entry['cache'] = os.path.basename(target)
+    manifest[source] = entry
+    _write_manifest(manifest_path, manifest)
+    return target
+
+
+def read_csv_cached(path, usecols=None, dtype=None):
+    # drop-in for pd.read_csv(path, usecols=..., dtype=...) that reads the columnar copy
+    target = cached_path(path)
+    if target is None:
+        return pd.read_csv(path, usecols=usecols, dtype=dtype, low_memory=False)
+    with pa.memory_map(target) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if usecols is not None:
+        table = table.select(list(usecols))
+    return _to_pandas(table, dtype)
+
+
+def iter_csv_cached(path, usecols=None, dtype=None, chunksize=None):
+    # drop-in for pd.read_csv(path, usecols=..., dtype=..., chunksize=...)
+    target = cached_path(path)
+    if target is None:
+        yield from pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+        return
+    with pa.memory_map(target) as source:
+        reader = pa.ipc.open_file(source)
+        pending, pending_rows = [], 0
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if usecols is not None:
+                batch = batch.select(list(usecols))
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if chunksize is None or pending_rows >= chunksize:
+                yield _to_pandas(pa.Table.from_batches(pending), dtype)
+                pending, pending_rows = [], 0
+        if pending:
+            yield _to_pandas(pa.Table.from_batches(pending), dtype)
+
+
+def _convert(source, target):
+    # stream the CSV into an Arrow IPC file, keeping every column as (nullable) text
+    # (utf-8-sig: a BOM would stay glued to the first name, and that column would miss its pa.string() type)
+    with open(source, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f))
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in header},
+        strings_can_be_null=True,
+    )
+    tmp = target + '.tmp'
+    with pa_csv.open_csv(source, convert_options=convert_options) as reader:
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    os.replace(tmp, target)
+
+
+def _to_pandas(table, dtype=None):
+    dtype = dtype or {}
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if dtype.get(name) not in ('str', str, 'object', object):
+            column = _infer(column)
+        columns.append(column)
+    df = pa.table(columns, names=table.column_names).to_pandas()
+    for name, column in zip(table.column_names, columns):
+        if pa.types.is_boolean(column.type) and column.null_count:
+            # read_csv gives object True / False / NaN here, arrow gives None for the gaps
+            df[name] = np.where(df[name].isna(), np.nan, df[name]).astype(object)
+    extra = {k: v for k, v in dtype.items() if k in df.columns and v not in ('str', str)}
+    return df.astype(extra) if extra else df
+
+
+def _infer(column):
+    # same order read_csv tries: integers, then floats, then booleans, then leave it as text
+    for target in (pa.int64(), pa.float64()):
+        try:
+            return pc.cast(column, target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    missing = pc.is_null(column)
+    if pc.all(pc.or_(missing, pc.is_in(column, value_set=pa.array(TRUE_VALUES + FALSE_VALUES)))).as_py():
+        return pc.if_else(missing, pa.scalar(None, pa.bool_()), pc.is_in(column, value_set=pa.array(TRUE_VALUES)))
+    return column
+
+
+def _stem(source):
+    # file name + a hash of the absolute path, so same-named exports in different folders get their own copies
+    name = os.path.splitext(os.path.basename(source))[0].replace(' ', '_')
+    return f"{name}-{hashlib.sha1(source.encode()).hexdigest()[:8]}"
+
+
+def _read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
@@ -0,0 +1,225 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+'''
+LISA x LISA cross-tabulation (need indicator vs caller rate) on integer label codes.
+
+The cross-tab scripts read the *_Results.csv files back from disk, merged them per pair, ran pd.crosstab for
+each indicator, and coloured every cell / ZIP with membership tests against blue_cells / red_cells / ns_cells
+lists. Here the quad labels of a LISA table (lisa_table, or the same columns from the CSVs) become codes
+0-4 in CROSSTAB_LABELS order, every indicator's 5x5 alignment matrix comes out of one np.bincount over
+indicator * 25 + need * 5 + caller, and each ZIP's alignment class is a lookup in the 5x5 ALIGNMENT table.
+
+Alignment classes, rows = need indicator quad label, columns = caller rate quad label:
+- underserved: high need (HH / HL) with low caller rate (LH / LL), red on the maps
+- misaligned: low need (LH / LL) with high caller rate (HH / HL), blue
+- aligned: both high or both low, grey
+- not significant: NS on either side, white
+
+AlignmentCube goes past pairs: one count per combination of quad labels over any number of LISA variables
+(poverty, below ALICE, ALICE only, caller rate ...), with the ZIPs of every cell kept alongside, so questions
+like "which ZIPs are HH on poverty, NS on ALICE only and LL on calls" are a lookup instead of another merge
+of the *_Results.csv files. 'LISA Batch.py' builds it once per run and saves it to CUBE_PATH:
+
+    cube = AlignmentCube.load()
+    cube.zips(poverty='HH', alice_only='NS', callers='LL')      # ZIP codes in that cell
+    cube.count(poverty=['HH', 'HL'], callers=['LH', 'LL'])      # lists select several labels on an axis
+    cube.crosstab('alice', 'callers')                           # any 2-D marginal, same as lisa_crosstabs
+    lisa_crosstabs(cube.labels(), {'poverty': 'Poverty LISA'})  # the saved run's labels, e.g. for the cross-tab
+'''
+
+CROSSTAB_LABELS = ['HH', 'LH', 'HL', 'LL', 'NS']
+ALIGNMENT_CLASSES = ['aligned', 'underserved', 'misaligned', 'not significant']
+ALIGNMENT_COLORS = ['#CCCCCC', '#D12626', '#21296B', '#FFFFFF']  # map colours, same order as ALIGNMENT_CLASSES
+CUBE_LABELS = CROSSTAB_LABELS + ['NA']  # NA: the ZIP wasn't scored for that variable (missing value)
+CUBE_PATH = os.path.join('.cache', 'lisa', 'alignment_cube.pkl')
+
+
+def _alignment_table():
+    high = np.array([True, False, True, False])  # HH, LH, HL, LL: is the ZIP's own value high
+    table = np.full((5, 5), 3, dtype=np.int64)
+    table[:4, :4] = np.where(high[:, None] == high[None, :], 0, np.where(high[:, None], 1, 2))
+    return table
+
+
+ALIGNMENT = _alignment_table()  # [need code, caller code] -> index into ALIGNMENT_CLASSES
+
+
+def label_codes(labels):
+    # quad labels (array / Series / DataFrame) -> codes into CROSSTAB_LABELS, -1 where missing
+    values = np.asarray(labels, dtype=object)
+    codes = pd.Categorical(values.ravel(), categories=CROSSTAB_LABELS).codes.astype(np.int64)
+    return codes.reshape(values.shape)
+
+
+def alignment_matrices(need_codes, caller_codes):
+    '''
+    need_codes (n, m): one column of label codes per indicator, caller_codes (n,).
+    Returns (m, 5, 5) counts, [indicator, need code, caller code]; rows missing either label aren't counted.
+    '''
+    need_codes = np.asarray(need_codes).reshape(len(need_codes), -1)
+    caller_codes = np.broadcast_to(np.asarray(caller_codes)[:, None], need_codes.shape)
+    m = need_codes.shape[1]
+    known = (need_codes >= 0) & (caller_codes >= 0)
+    cell = np.arange(m)[None, :] * 25 + need_codes * 5 + caller_codes
+    return np.bincount(cell[known], minlength=m * 25).reshape(m, 5, 5)
+
+
+def alignment_classes(need_codes, caller_codes):
+    # ALIGNMENT class per ZIP and indicator (same shape as need_codes), -1 where either label is missing
+    need_codes = np.asarray(need_codes)
+    caller_codes = np.asarray(caller_codes)
+    if need_codes.ndim == 2:
+        caller_codes = caller_codes[:, None]
+    known = (need_codes >= 0) & (caller_codes >= 0)
+    return np.where(known, ALIGNMENT[np.maximum(need_codes, 0), np.maximum(caller_codes, 0)], -1)
+
+
+def lisa_crosstabs(table, indicators, caller='callers', caller_table=None, zip_col='zip_code'):
+    '''
+    Every indicator vs caller rate from a LISA table with lisa_<name>_quad_label columns.
+    indicators: {name: row title}, e.g. {'poverty': 'Poverty LISA', 'alice': 'Below ALICE LISA'}.
+    caller_table: take the caller labels from another table (matched on zip_col, ZIPs in both only),
+    e.g. the statewide caller LISA against Bexar-only indicator LISAs.
+    Returns (matrices, zips):
+        matrices  {name: 5 x 5 DataFrame of ZIP counts}, rows = indicator label, columns = caller label
+        zips      zip_col + <name>_alignment (ALIGNMENT_CLASSES name) + <name>_color (ALIGNMENT_COLORS)
+                  per indicator, ZIPs with a caller label
+    '''
+    if caller_table is not None:
+        table = table.merge(caller_table[[zip_col, f'lisa_{caller}_quad_label']], on=zip_col, how='inner')
+    table = table[table[f'lisa_{caller}_quad_label'].notna()]
+    need = label_codes(table[[f'lisa_{name}_quad_label' for name in indicators]])
+    callers = label_codes(table[f'lisa_{caller}_quad_label'])
+
+    counts = alignment_matrices(need, callers)
+    matrices = {}
+    for j, (name, title) in enumerate(indicators.items()):
+        matrices[name] = pd.DataFrame(counts[j], index=pd.Index(CROSSTAB_LABELS, name=title),
+                                      columns=pd.Index(CROSSTAB_LABELS, name='Caller Rate LISA'))
+
+    classes = alignment_classes(need, callers)
+    names = np.array(ALIGNMENT_CLASSES + [None], dtype=object)  # -1 (missing indicator label) -> None
+    colors = np.array(ALIGNMENT_COLORS + [None], dtype=object)
+    zips = pd.DataFrame({zip_col: table[zip_col].to_numpy()})
+    for j, name in enumerate(indicators):
+        zips[f'{name}_alignment'] = names[classes[:, j]]
+        zips[f'{name}_color'] = colors[classes[:, j]]
+    return matrices, zips
+
+
+class AlignmentCube:
+    '''
+    ZIP counts over every combination of quad labels of several LISA variables.
+    counts has one axis per name, CUBE_LABELS along each (so 6 ** len(names) cells), and the ZIPs are stored
+    sorted by cell with per-cell offsets, so a cell's ZIP list is a slice.
+    Selections are keyword arguments name=label or name=[labels]; names left out are summed over.
+    '''
+
+    def __init__(self, table, names, zip_col='zip_code'):
+        self.names = list(names)
+        self.zip_codes = table[zip_col].to_numpy()
+        codes = label_codes(table[[f'lisa_{name}_quad_label' for name in self.names]])
+        self.codes = np.where(codes < 0, len(CROSSTAB_LABELS), codes)
+        shape = (len(CUBE_LABELS),) * len(self.names)
+        cells = np.ravel_multi_index(tuple(self.codes.T), shape)
+        self.counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+        # the ZIPs in flat cell c are zip_codes[_order[_offsets[c]:_offsets[c + 1]]]
+        self._order = np.argsort(cells, kind='stable')
+        self._offsets = np.concatenate([[0], np.cumsum(self.counts.ravel())])
+
+    def select(self, **labels):
+        # counts restricted to the selection: a single label drops its axis, a list keeps it (in list order)
+        counts = self.counts
+        axis = 0
+        for codes in self._index(labels):
+            if codes is None:
+                axis += 1
+            elif isinstance(codes, list):
+                counts = counts.take(codes, axis=axis)
+                axis += 1
+            else:
+                counts = counts.take(codes, axis=axis)
+        return counts
+
+    def count(self, **labels):
+        return int(self.select(**labels).sum())
+
+    def zips(self, **labels):
+        # ZIP codes in the selected cells, in table order
+        mask = self.counts > 0
+        for axis, codes in enumerate(self._index(labels)):
+            if codes is not None:
+                keep = np.zeros(len(CUBE_LABELS), dtype=bool)
+                keep[codes] = True
+                mask &= keep.reshape([-1 if a == axis else 1 for a in range(mask.ndim)])
+        cells = np.flatnonzero(mask)
+        sizes = self.counts.ravel()[cells]
+        starts = np.repeat(self._offsets[cells] - np.cumsum(sizes) + sizes, sizes)
+        return self.zip_codes[np.sort(self._order[starts + np.arange(sizes.sum())])]
+
+    def marginal(self, *names):
+        # counts summed over every other axis, axes in the order given
+        axes = [self.names.index(name) for name in names]
+        counts = self.counts.sum(axis=tuple(a for a in range(len(self.names)) if a not in axes))
+        kept = sorted(axes)
+        return counts.transpose([kept.index(a) for a in axes])
+
+    def crosstab(self, row, col, missing=False):
+        # 2-D marginal as a labelled DataFrame, NA row / column dropped unless missing=True
+        labels = CUBE_LABELS if missing else CROSSTAB_LABELS
+        counts = self.marginal(row, col)[:len(labels), :len(labels)]
+        return pd.DataFrame(counts, index=pd.Index(labels, name=row), columns=pd.Index(labels, name=col))
+
+    def cells(self):
+        # one row per non-empty cell: a label column per name, the ZIP count and the ZIP codes
+        cells = np.flatnonzero(self.counts.ravel())
+        labels = np.array(CUBE_LABELS, dtype=object)
+        out = pd.DataFrame({name: labels[codes]
+                            for name, codes in zip(self.names, np.unravel_index(cells, self.counts.shape))})
+        out['zips'] = self.counts.ravel()[cells]
+        zips = self.zip_codes[self._order].astype(str)
+        out['zip_codes'] = [' '.join(zips[a:b]) for a, b in zip(self._offsets[cells], self._offsets[cells + 1])]
+        return out
+
+    def labels(self, zip_col='zip_code'):
+        # back to a lisa_table-style frame (zip_col + lisa_<name>_quad_label, None where NA), for lisa_crosstabs
+        labels = np.array(CROSSTAB_LABELS + [None], dtype=object)
+        out = pd.DataFrame({zip_col: self.zip_codes})
+        for j, name in enumerate(self.names):
+            out[f'lisa_{name}_quad_label'] = labels[self.codes[:, j]]
+        return out
+
+    def save(self, path=CUBE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        pd.to_pickle(self, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        return pd.read_pickle(path)
+
+    def _index(self, labels):
+        # per axis: None (everything), a label code, or a list of codes
+        unknown = set(labels) - set(self.names)
+        if unknown:
+            raise KeyError(f"not in the cube: {sorted(unknown)}, it has {self.names}")
+        index = []
+        for name in self.names:
+            value = labels.get(name)
+            if value is None:
+                index.append(None)
+            elif isinstance(value, str):
+                index.append(_cube_code(value))
+            else:
+                index.append([_cube_code(v) for v in value])
+        return index
+
+
+def _cube_code(label):
+    if label not in CUBE_LABELS:
+        raise ValueError(f"unknown quad label {label!r}, expected one of {CUBE_LABELS}")
+    return CUBE_LABELS.index(label)
@@ -0,0 +1,127 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from uw211.lisa import ALPHA, QUAD_LABELS, SEED, adjust_p, group_weights, local_moran_batch, p_values
+from uw211.parallel import n_workers, worker_pool
+
+'''
+Seed-stability ensemble for the LISA quad labels.
+
+Every LISA run uses seed=42, but with 999 permutations a ZIP whose p-value sits near 0.05 can come out
+'HL' under one seed and 'NS' under the next - and those labels decide which ZIPs land on the underserved /
+misaligned lists in 'Cross Tabulation LISA x LISA.py'. lisa_ensemble re-runs the batch LISA under many seeds
+and reports, per ZIP and variable, how often each label came up and how much the p-value moved.
+
+Seeds are split across workers (uw211/parallel.py, the same pool as the LISA permutations). Each worker
+adds its seeds' outcomes into its own slot of one shared-memory array - label counts, sum / sum of squares /
+min / max of p - and the slots are summed at the end.
+Nothing is kept per seed, so memory depends on the number of ZIPs, variables and workers, not on how many
+seeds are run.
+'''
+
+ENSEMBLE_SEEDS = 100
+ENSEMBLE_LABELS = ['HH', 'LH', 'LL', 'HL', 'NS']  # q codes 1-4, then not significant
+_P_SUM, _P_SUMSQ, _P_MIN, _P_MAX = range(len(ENSEMBLE_LABELS), len(ENSEMBLE_LABELS) + 4)
+_FIELDS = len(ENSEMBLE_LABELS) + 4
+
+
+def lisa_ensemble(gdf, variables, seeds=ENSEMBLE_SEEDS, w=None, alpha=ALPHA, zip_col='zip_code', correction='none',
+                  n_jobs=-1, **options):
+    '''
+    variables: {name: column}, same as lisa_table. seeds: a number of seeds (SEED, SEED + 1, ... so seed 42,
+    the one every script uses, is always in it) or the seeds themselves.
+    Returns zip_code + for every variable:
+        ens_<name>_HH / _LH / _LL / _HL / _NS   share of seeds giving that label
+        ens_<name>_modal, ens_<name>_stability  most common label and its share
+        ens_<name>_p_mean / _p_sd / _p_min / _p_max   p-value across seeds
+    Labels use raw p < alpha, or the FDR / Bonferroni adjusted p with correction= (as lisa_table).
+    options go to local_moran_batch (permutations, sequential); results aren't memoized.
+    '''
+    if options.get('inference', 'permutation') != 'permutation':
+        raise ValueError("the seed ensemble needs inference='permutation'")
+    seeds = list(range(SEED, SEED + seeds)) if np.ndim(seeds) == 0 else [int(seed) for seed in seeds]
+    if not seeds:
+        raise ValueError("lisa_ensemble needs at least one seed")
+    options.update(cache=False, n_jobs=1)  # one seed per worker at a time, nothing worth keeping on disk
+
+    # same row groups as lisa_table: variables with the same missing pattern share W and the draws
+    names = list(variables)
+    masks = {}
+    for name, col in variables.items():
+        mask = gdf[col].notna().to_numpy()
+        masks.setdefault(mask.tobytes(), (mask, []))[1].append(name)
+    groups = []
+    for mask, group in masks.values():
+        Y = gdf.loc[mask, [variables[name] for name in group]].to_numpy(dtype=float)
+        groups.append((np.flatnonzero(mask), [names.index(name) for name in group], Y,
+                       group_weights(gdf, mask, w, zip_col)))
+
+    workers = min(n_workers(n_jobs), len(seeds))
+    shape = (workers, len(gdf), len(names), _FIELDS)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        slots = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        slots[...] = 0
+        slots[..., _P_MIN] = np.inf
+        slots[..., _P_MAX] = -np.inf
+        args = (shm.name, shape, groups, alpha, correction, options)
+        if workers == 1:
+            _ensemble_slot(0, seeds, *args)
+        else:
+            with worker_pool(workers) as pool:
+                list(pool.map(_ensemble_slot, range(workers), [seeds[k::workers] for k in range(workers)],
+                              *[[a] * workers for a in args]))
+        totals = slots[..., :_P_MIN].sum(axis=0)
+        p_min = slots[..., _P_MIN].min(axis=0)
+        p_max = slots[..., _P_MAX].max(axis=0)
+        del slots
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return _ensemble_table(gdf, zip_col, names, totals, p_min, p_max, len(seeds))
+
+
+def _ensemble_slot(slot, seeds, shm_name, shape, groups, alpha, correction, options):
+    # run each seed and add its labels / p-values into this worker's slot of the shared array
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        acc = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)[slot]
+        for seed in seeds:
+            for rows, cols, Y, wg in groups:
+                result = local_moran_batch(Y, wg, seed=seed, **options)
+                p = p_values(result)
+                sig = (p if correction == 'none' else adjust_p(p, correction)) < alpha
+                code = np.where(sig, result['q'] - 1, len(QUAD_LABELS))
+                block = acc[rows[:, None], cols]  # (rows, variables, fields) copy, written back below
+                np.put_along_axis(block, code[..., None], np.take_along_axis(block, code[..., None], 2) + 1, 2)
+                block[..., _P_SUM] += p
+                block[..., _P_SUMSQ] += p * p
+                block[..., _P_MIN] = np.minimum(block[..., _P_MIN], p)
+                block[..., _P_MAX] = np.maximum(block[..., _P_MAX], p)
+                acc[rows[:, None], cols] = block
+        del acc
+    finally:
+        shm.close()
+
+
+def _ensemble_table(gdf, zip_col, names, totals, p_min, p_max, runs):
+    out = pd.DataFrame({zip_col: gdf[zip_col].to_numpy()})
+    for j, name in enumerate(names):
+        counts = totals[:, j, :len(ENSEMBLE_LABELS)]
+        scored = counts.sum(1) > 0  # rows missing this variable were never scored
+        shares = counts / runs
+        for k, label in enumerate(ENSEMBLE_LABELS):
+            out[f'ens_{name}_{label}'] = np.where(scored, shares[:, k], np.nan)
+        modal = np.array(ENSEMBLE_LABELS, dtype=object)[shares.argmax(1)]
+        out[f'ens_{name}_modal'] = np.where(scored, modal, None)
+        out[f'ens_{name}_stability'] = np.where(scored, shares.max(1), np.nan)
+        mean = totals[:, j, _P_SUM] / runs
+        out[f'ens_{name}_p_mean'] = np.where(scored, mean, np.nan)
+        out[f'ens_{name}_p_sd'] = np.where(scored, np.sqrt(np.maximum(totals[:, j, _P_SUMSQ] / runs - mean ** 2, 0)),
+                                           np.nan)
+        out[f'ens_{name}_p_min'] = np.where(scored, p_min[:, j], np.nan)
+        out[f'ens_{name}_p_max'] = np.where(scored, p_max[:, j], np.nan)
+    return out
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+
+try:
+    import pyarrow  # noqa: F401  (GeoParquet needs it)
+except ImportError:  # no pyarrow -> every load falls back to downloading the GeoJSON
+    pyarrow = None
+
+'''
+Local store for the Texas ZIP (ZCTA) shapes.
+
+Every map / LISA script used to call gpd.read_file on the OpenDataDE GeoJSON, which downloads and parses
+the whole Texas layer on every run. load_zip_shapes ingests it once into a GeoParquet file under .cache/geo/
+with zip_code already normalized (5-digit string, same as the scripts' str.zfill(5)), so later loads are offline
+and can pull just the ZIPs a script needs.
+
+Rows stay in the GeoJSON's order. The scripts' GeoDataFrames (and so the rows of W) follow it, and the seeded
+LISA permutations are drawn by row position, so a different order would give different p-values and labels.
+
+To refresh the shapes (or ingest from a local copy of the GeoJSON when offline) call ingest_zip_shapes
+directly, or delete .cache/geo/.
+'''
+
+GEOJSON_URL = 'https://raw.githubusercontent.com/OpenDataDE/State-zip-code-geojson/master/tx_texas_zip_codes_geo.min.json'
+GEO_DIR = os.path.join('.cache', 'geo')
+SHAPES_PATH = os.path.join(GEO_DIR, 'tx_zip_shapes.parquet')
+ROW_GROUP_SIZE = 256
+STORE_FORMAT = 2  # bump when ingest changes, older stores get re-ingested (1 sorted the rows by ZIP)
+
+
+def ingest_zip_shapes(source=GEOJSON_URL, path=SHAPES_PATH):
+    '''
+    Reads the GeoJSON (URL or local file) once and writes the normalized GeoParquet store.
+    Returns the stored GeoDataFrame.
+    '''
+    gdf = gpd.read_file(source)
+    gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    gdf.to_parquet(tmp, index=False, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    with open(_meta_path(path), 'w') as f:
+        json.dump({'source': source, 'rows': len(gdf), 'version': sha1.hexdigest()[:16], 'format': STORE_FORMAT}, f,
+                  indent=2)
+    return gdf
+
+
+def load_zip_shapes(zips=None, columns=None, path=SHAPES_PATH):
+    '''
+    Drop-in for gpd.read_file(GEOJSON_URL) + the zip_code normalization.
+    zips: only return these ZIPs (read with a parquet filter, so the rest of Texas is never decoded).
+    columns: only return these attribute columns (zip_code and geometry are always included).
+    '''
+    if pyarrow is None:
+        gdf = gpd.read_file(GEOJSON_URL)
+        gdf['zip_code'] = gdf['ZCTA5CE10'].astype(str).str.zfill(5)
+        if zips is not None:
+            gdf = gdf[gdf['zip_code'].isin(list(zips))]
+        return gdf if columns is None else gdf[_columns(columns)]
+
+    _ensure_store(path)
+
+    filters = None
+    if zips is not None:
+        filters = [('zip_code', 'in', sorted({str(z).zfill(5) for z in zips}))]
+    gdf = gpd.read_parquet(path, columns=None if columns is None else _columns(columns), filters=filters)
+    return gdf.reset_index(drop=True)
+
+
+def zip_geojson(zips=None):
+    # GeoJSON dict for plotly's choropleth(geojson=...) with the same properties as the OpenDataDE file
+    return json.loads(load_zip_shapes(zips).to_json())
+
+
+def geometry_version(path=SHAPES_PATH):
+    # identifies the stored shapes, anything derived from them (e.g. spatial weights) should key on this
+    if pyarrow is None:
+        return 'remote'
+    _ensure_store(path)
+    with open(_meta_path(path)) as f:
+        return json.load(f)['version']
+
+
+def _columns(columns):
+    return ['zip_code'] + [c for c in columns if c not in ('zip_code', 'geometry')] + ['geometry']
+
+
+def _ensure_store(path):
+    # ingest on first use, and again from the same source when an older ingest_zip_shapes wrote the store
+    if not (os.path.exists(path) and os.path.exists(_meta_path(path))):
+        ingest_zip_shapes(path=path)
+        return
+    with open(_meta_path(path)) as f:
+        meta = json.load(f)
+    if meta.get('format') != STORE_FORMAT:
+        ingest_zip_shapes(meta['source'], path)
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + '.json'
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+'''
+Integer interning for Client_Id / Interaction_Id.
+
+Deduping and semi-joining on the raw ID strings makes pandas hash a Python string for every row,
+every time. Instead each ID is mapped once to a dense integer code, and the dedup / isin steps run
+on plain int arrays (sort-based first occurrence, bitmap membership).
+
+The tables are append-only and persisted under .cache/ids/, so an ID keeps the same code across runs
+and every script that loads the exports sees the same codes.
+'''
+
+IDS_DIR = os.path.join('.cache', 'ids')
+CLIENT_IDS_PATH = os.path.join(IDS_DIR, 'client_ids.pkl')
+INTERACTION_IDS_PATH = os.path.join(IDS_DIR, 'interaction_ids.pkl')
+
+
+class IdTable:
+    '''
+    Append-only mapping of raw ID strings to dense codes 0..n-1.
+    '''
+
+    def __init__(self, ids=None):
+        self._index = pd.Index([] if ids is None else ids, dtype=object)
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def dtype(self):
+        return np.int32 if len(self._index) < np.iinfo(np.int32).max else np.int64
+
+    def encode(self, values, add=True):
+        # codes for `values`; unseen IDs are appended (or coded -1 when add=False)
+        values = pd.Index(np.asarray(values, dtype=object))
+        codes = self._index.get_indexer(values)
+        missing = codes == -1
+        if add and missing.any():
+            new = values[missing].dropna().unique()
+            self._index = self._index.append(new)
+            codes[missing] = self._index.get_indexer(values[missing])
+        return codes.astype(self.dtype)
+
+    def decode(self, codes):
+        return self._index.take(np.asarray(codes)).to_numpy()
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        pd.to_pickle(self._index.to_numpy(), tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        return cls(pd.read_pickle(path))
+
+
+def first_occurrence(codes):
+    # positions of the first row for each distinct code, in row order (drop_duplicates keep='first')
+    codes = np.asarray(codes)
+    _, first = np.unique(codes, return_index=True)
+    first.sort()
+    return first
+
+
+def in_set(codes, members, size=None):
+    # bitmap semi-join: True where codes[i] is one of `members` (isin for non-negative int codes)
+    codes = np.asarray(codes)
+    members = np.asarray(members)
+    if size is None:
+        size = int(max(codes.max(initial=-1), members.max(initial=-1))) + 1
+    bitmap = np.zeros(size + 1, dtype=bool)  # last slot absorbs the -1 "unknown" code
+    bitmap[members] = True
+    bitmap[-1] = False
+    return bitmap[codes]
@@ -0,0 +1,290 @@
+import csv
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from uw211.aggregates import BAD_CALL_TYPES, add_callers_per_1000, area_zips
+from uw211.loaders import (CALL_TYPE_COL, CHUNKSIZE, CLIENT_DTYPES, CLIENT_TAB, CLIENT_ZIP_COL,
+                           INTERACTION_DTYPES, INTERACTION_TAB, extract_zip, parse_call_types)
+
+'''
+Incremental version of the strict caller counts from 'Filter Clients Calls ZIP.py'.
+
+The Client and Interaction tabs are cumulative ("All Years") and new data is appended to the end,
+so instead of re-deduping everything from zero on every refresh we keep a small persisted state:
+- a high-water mark per export (byte offset just past the last complete CSV record read + a fingerprint of
+  the bytes before it)
+- every Client_Id seen so far with its first ZIP and its first parsed call type
+- every Interaction_Id seen so far
+- the strict unique-caller count per ZIP
+
+A refresh only parses the rows past the high-water mark and adds the newly counted callers to the
+per-ZIP counts. If an export was rewritten instead of appended to (it shrank, or the bytes before the
+high-water mark changed) or the area indicators file changed, the state is rebuilt from scratch.
+States saved before STATE_FORMAT are rebuilt too (their marks were found by newline, and could sit inside a
+quoted multi-line field).
+
+A caller is counted exactly like the strict script does it: first client row has a ZIP present in the
+area indicators file, and the caller's first interaction with a parseable call type isn't Phantom / Wrong #.
+'''
+
+STATE_PATH = os.path.join('.cache', 'incremental', 'client_calls_state.pkl')
+OUTPUT_PATH = 'New_211_Client_Cleaned.csv'
+SAMPLE_BYTES = 1 << 16
+STATE_FORMAT = 2  # bump when the state layout or the way marks are found changes
+
+
+def new_state():
+    return {
+        'format': STATE_FORMAT,
+        'marks': {},
+        'area_key': None,
+        'clients': pd.DataFrame(
+            {'zip_code': pd.Series(dtype=object), 'has_row': pd.Series(dtype=bool),
+             'call_type': pd.Series(dtype=object)},
+            index=pd.Index([], dtype=object, name='Client_Id'),
+        ),
+        'interaction_ids': pd.Index([], dtype=object),
+        'zip_counts': pd.Series(dtype='int64', name='total_callers'),
+        'counted': pd.Index([], dtype=object),
+    }
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return new_state()
+    return pd.read_pickle(path)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)  # bare file name -> current directory
+    tmp = path + '.tmp'
+    pd.to_pickle(state, tmp)
+    os.replace(tmp, path)
+
+
+def update_client_counts(df_area, client_path=CLIENT_TAB, interaction_path=INTERACTION_TAB,
+                         state_path=STATE_PATH, output_path=OUTPUT_PATH, chunksize=CHUNKSIZE):
+    '''
+    Brings the persisted state up to date with the exports and rewrites New_211_Client_Cleaned.csv
+    (zip_code, total_callers, population, callers_per_1000).
+    Returns (zip_data, summary) where summary counts what this refresh had to process.
+    '''
+    state = load_state(state_path)
+    valid_zips = pd.Index(area_zips(df_area).dropna().unique())
+    area_key = hashlib.sha1('|'.join(sorted(valid_zips)).encode()).hexdigest()
+
+    rebuilt = state.get('format') != STATE_FORMAT
+    for path in (client_path, interaction_path):
+        if not _mark_is_valid(state['marks'].get(os.path.abspath(path)), path):
+            rebuilt = True
+    if rebuilt:
+        state = new_state()
+
+    summary = {'rebuilt': rebuilt, 'new_client_rows': 0, 'new_interaction_rows': 0, 'new_callers': 0}
+
+    # new client rows: first row per Client_Id wins, so only never-seen IDs matter
+    # (new rows are collected per chunk and added to the state once, at the end; the state's indexes keep their
+    # hash tables between chunks, so each chunk costs its own size, not the size of the state)
+    clients = state['clients']
+    touched, fresh_rows = [], []
+    for chunk in _read_new_rows(state, client_path, CLIENT_DTYPES, chunksize):
+        summary['new_client_rows'] += len(chunk)
+        chunk = chunk.drop_duplicates(subset=['Client_Id'])
+        known = clients.index.get_indexer(chunk['Client_Id']) >= 0
+
+        # IDs first seen through the interaction tab don't have a client row yet
+        seen_without_row = chunk.loc[known, 'Client_Id']
+        seen_without_row = seen_without_row[~clients.loc[seen_without_row, 'has_row'].to_numpy()]
+        clients.loc[seen_without_row, 'zip_code'] = extract_zip(
+            chunk.set_index('Client_Id').loc[seen_without_row, CLIENT_ZIP_COL]
+        ).to_numpy()
+        clients.loc[seen_without_row, 'has_row'] = True
+
+        fresh = chunk[~known]
+        fresh_rows.append(pd.DataFrame(
+            {'zip_code': extract_zip(fresh[CLIENT_ZIP_COL]).to_numpy(dtype=object), 'has_row': True,
+             'call_type': None},
+            index=pd.Index(fresh['Client_Id'].to_numpy(dtype=object), name='Client_Id'),
+        ))
+        touched.append(chunk['Client_Id'])
+    clients = _add_clients(clients, fresh_rows)
+
+    # new interaction rows: dedup by Interaction_Id, then the first parseable call type per client wins
+    # (a repeated Interaction_Id can be a different row, so IDs from earlier chunks of this refresh are kept in a set)
+    interaction_ids = state['interaction_ids']
+    new_ids, fresh_rows = [], []
+    seen = set()
+    for chunk in _read_new_rows(state, interaction_path, INTERACTION_DTYPES, chunksize):
+        summary['new_interaction_rows'] += len(chunk)
+        chunk = chunk.drop_duplicates(subset=['Interaction_Id'])
+        ids = chunk['Interaction_Id'].to_numpy(dtype=object)
+        keys = np.where(pd.isna(ids), None, ids)  # every missing ID is the same one, like drop_duplicates
+        new = (interaction_ids.get_indexer(ids) < 0) & np.fromiter((key not in seen for key in keys), bool, len(keys))
+        seen.update(keys[new])
+        chunk = chunk[new]
+        new_ids.append(ids[new])
+
+        chunk = chunk.assign(clean_call_type=parse_call_types(chunk[CALL_TYPE_COL]))
+        chunk = chunk[chunk['clean_call_type'].notna()].drop_duplicates(subset=['Client_Id'])
+
+        known = clients.index.get_indexer(chunk['Client_Id']) >= 0
+        first_call = chunk.loc[known].set_index('Client_Id')['clean_call_type']
+        first_call = first_call[clients.loc[first_call.index, 'call_type'].isna().to_numpy()]
+        clients.loc[first_call.index, 'call_type'] = first_call.to_numpy(dtype=object)
+
+        fresh = chunk[~known]
+        fresh_rows.append(pd.DataFrame(
+            {'zip_code': None, 'has_row': False, 'call_type': fresh['clean_call_type'].to_numpy(dtype=object)},
+            index=pd.Index(fresh['Client_Id'].to_numpy(dtype=object), name='Client_Id'),
+        ))
+        touched.append(chunk['Client_Id'])
+    state['clients'] = clients = _add_clients(clients, fresh_rows)
+    if new_ids:
+        state['interaction_ids'] = interaction_ids.append(pd.Index(np.concatenate(new_ids), dtype=object))
+
+    if state['area_key'] != area_key:
+        # ZIP list changed (or first run) - recount everybody, it's just a groupby over the state
+        state['zip_counts'] = _count(clients, valid_zips)
+        state['area_key'] = area_key
+        summary['new_callers'] = int(state['zip_counts'].sum())
+    elif touched:
+        # a caller's ZIP and first call type never change once set, so callers can only become counted
+        # -> only the IDs touched by this refresh can add to the per-ZIP counts
+        ids = pd.Index(pd.concat(touched).unique())
+        ids = ids[~ids.isin(state['counted'])]
+        delta = _count(clients.loc[ids], valid_zips)
+        state['zip_counts'] = state['zip_counts'].add(delta, fill_value=0).astype('int64')
+        summary['new_callers'] = int(delta.sum())
+    state['counted'] = _counted_ids(clients, valid_zips)
+
+    save_state(state, state_path)
+
+    zip_counts = state['zip_counts'][state['zip_counts'] > 0].sort_values(ascending=False, kind='stable')
+    zip_counts = zip_counts.rename_axis('zip_code').rename('total_callers').reset_index()
+    zip_data = add_callers_per_1000(zip_counts, df_area)
+    zip_data.to_csv(output_path, index=False)
+    return zip_data, summary
+
+
+def _add_clients(clients, fresh_rows):
+    # one concat for the whole refresh; an ID new to this refresh can be in several chunks, its first row wins
+    if not fresh_rows:
+        return clients
+    clients = pd.concat([clients] + fresh_rows)
+    return clients[~clients.index.duplicated()]
+
+
+def _counted_mask(clients, valid_zips):
+    return (
+        clients['has_row'].to_numpy(dtype=bool)
+        & clients['zip_code'].isin(valid_zips).to_numpy()
+        & clients['call_type'].notna().to_numpy()
+        & ~clients['call_type'].isin(BAD_CALL_TYPES).to_numpy()
+    )
+
+
+def _counted_ids(clients, valid_zips):
+    return clients.index[_counted_mask(clients, valid_zips)]
+
+
+def _count(clients, valid_zips):
+    counted = clients.loc[_counted_mask(clients, valid_zips), 'zip_code']
+    return counted.value_counts().rename('total_callers').astype('int64')
+
+
+def _read_new_rows(state, path, dtypes, chunksize):
+    # yields the rows appended to `path` since the last high-water mark, then moves the mark
+    source = os.path.abspath(path)
+    mark = state['marks'].get(source)
+    with open(source, 'rb') as f:
+        header = f.readline()
+        start = mark['offset'] if mark else len(header)
+        end = _last_complete_record(f, start)
+        if end > start:
+            f.seek(start)
+            names = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+            yield from pd.read_csv(_LimitedReader(f, end - start), names=names, header=None, usecols=list(dtypes),
+                                   dtype=dtypes, chunksize=chunksize)
+    state['marks'][source] = {'offset': max(end, start), 'sample': _sample(source, max(end, start))}
+
+
+def _mark_is_valid(mark, path):
+    if mark is None:
+        return True  # nothing ingested yet, reading from the top is the same as a rebuild
+    if os.path.getsize(path) < mark['offset']:
+        return False
+    return _sample(path, mark['offset']) == mark['sample']
+
+
+def _sample(path, offset):
+    # cheap fingerprint of everything before the high-water mark: the head of the file plus the bytes
+    # right before the mark (catches both a re-export with new history and an edited last batch)
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        sha1.update(f.read(min(SAMPLE_BYTES, offset)))
+        f.seek(max(0, offset - SAMPLE_BYTES))
+        sha1.update(f.read(offset - max(0, offset - SAMPLE_BYTES)))
+    return sha1.hexdigest()
+
+
+def _last_complete_record(f, start):
+    # byte offset just past the last complete CSV record after `start` (a record boundary), so a half-written
+    # final row is left for next time. Parsed with csv.reader, not split on newlines: a quoted free-text field can
+    # hold a newline, and a mark inside it would make the next refresh read half a row as a new record.
+    # (latin-1 maps every byte to one character, quotes and newlines are the same bytes in utf-8)
+    consumed = start
+    exhausted = False
+
+    def lines():
+        nonlocal consumed, exhausted
+        f.seek(start)
+        for line in iter(f.readline, b''):
+            if not line.endswith(b'\n'):
+                break  # half-written last line
+            consumed += len(line)
+            yield line.decode('latin-1')
+        exhausted = True
+
+    end = start
+    for _ in csv.reader(lines()):
+        # a record handed back only because the lines ran out ended inside an open quote - not complete yet
+        if exhausted:
+            break
+        end = consumed
+    return end
+
+
+class _LimitedReader:
+    # file-like view of the next `length` bytes of f, so pandas never reads a half-written tail
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.f.readline(self.remaining if size is None or size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from uw211.spearman import rank_columns
+from uw211.weights import subset_weights
+
+'''
+Leave-one-out influence of single ZIPs on the Spearman correlations and global Moran's I.
+
+Downtown 78205 (tiny population, huge callers_per_1000) was dropped by hand in the Spearman and cleanup
+scripts because it dominated the results. influence_table makes that call from the data: every statistic
+is recomputed with each ZIP left out in turn, and ZIPs are ranked by how far their removal moves it.
+
+Neither statistic is recomputed from scratch n times:
+- Spearman: removing ZIP i lowers every other ZIP's average rank by [x_i < x_j] + 0.5 [x_i == x_j], and the
+  remaining n - 1 ranks always average n / 2, so rho without i comes from the full-data ranks updated in
+  place (blocks of ZIPs at a time), no re-ranking
+- Moran's I (row-standardized Queen weights, as subset_weights would build them without the ZIP): the
+  cross-product, sum of squares and S0 are running sums over all ZIPs, and only the ZIP's own neighbours
+  need a correction (their row loses one neighbour, or becomes an island), O(n + number of neighbour pairs)
+  for all n leave-one-out values
+
+influence: each statistic's change divided by its jackknife standard error (like DFBETAS), the largest of
+those per ZIP. leave_k_out drops the most influential ZIP, re-scores the rest and repeats k times.
+'''
+
+BLOCK = 256
+
+
+def spearman_loo(X, y):
+    '''
+    Spearman rho of each column of X against y with each row left out: (n, k), row i = rho without ZIP i.
+    Rows must be complete.
+    '''
+    X = np.asarray(X, dtype=float).reshape(len(X), -1)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    Rx = rank_columns(X)
+    ry = rank_columns(y)[:, 0]
+    out = np.empty(X.shape)
+    for start in range(0, n, BLOCK):
+        rows = np.arange(start, min(start + BLOCK, n))
+        cy = _loo_centred(y, ry, rows)
+        for j in range(X.shape[1]):
+            cx = _loo_centred(X[:, j], Rx[:, j], rows)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[rows, j] = (cx * cy).sum(1) / np.sqrt((cx ** 2).sum(1) * (cy ** 2).sum(1))
+    return out
+
+
+def moran_loo(y, w):
+    '''
+    Global Moran's I of y with each ZIP left out, (n,): entry i equals esda's Moran(y without i, w) with w
+    cut to the other ZIPs and row-standardized again (same as subset_weights on the remaining ZIPs).
+    '''
+    y = np.asarray(y, dtype=float)
+    A = _binary(w)
+    n = len(y)
+    d = np.asarray(A.sum(1)).ravel()
+    L = A @ y
+    scored = d > 0
+    lag = np.where(scored, L / np.maximum(d, 1), 0)
+
+    # mean of the other n - 1 values, then the running sums with every ZIP in
+    m = (y.sum() - y) / (n - 1)
+    P = (y * lag)[scored].sum()
+    Q = (y + lag)[scored].sum()
+    K = scored.sum()
+    cross = P - m * Q + m ** 2 * K
+
+    # ZIP i's own row drops out
+    cross -= np.where(scored, (y - m) * (lag - m), 0)
+    S0 = K - scored.astype(int)
+
+    # each neighbour j of i: its row loses i (or turns into an island when i was its only neighbour)
+    A = A.tocoo()
+    i, j = A.row, A.col
+    mi = m[i]
+    before = (y[j] - mi) * (lag[j] - mi)
+    left = d[j] - 1
+    after = np.where(left > 0, (y[j] - mi) * ((L[j] - y[i]) / np.maximum(left, 1) - mi), 0)
+    cross += np.bincount(i, after - before, minlength=n)
+    S0 = S0 - np.bincount(i, left == 0, minlength=n)
+
+    squares = (y ** 2).sum() - y ** 2 - (n - 1) * m ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (n - 1) / S0 * cross / squares
+
+
+def moran_i(y, w):
+    # global Moran's I (esda's Moran(y, w).I for row-standardized w)
+    y = np.asarray(y, dtype=float)
+    A = _binary(w)
+    d = np.asarray(A.sum(1)).ravel()
+    z = y - y.mean()
+    lag = np.where(d > 0, (A @ z) / np.maximum(d, 1), 0)
+    return len(y) / (d > 0).sum() * (z * lag).sum() / (z ** 2).sum()
+
+
+def influence_table(df, x_cols, y_col, w=None, moran_cols=None, zip_col='zip_code'):
+    '''
+    Leave-one-out scores for every ZIP with all the columns present.
+    Statistics: rho_<x> (Spearman of each x column vs y_col) and moran_<col> (global Moran's I of each of
+    moran_cols, default x_cols + [y_col]; [] skips them). w: weights for those rows, default subset_weights.
+    Returns (full, table):
+        full   {statistic: value on all the ZIPs}
+        table  zip_col, <statistic>_loo / <statistic>_change per statistic, influence and influence_rank
+               (1 = most influential), sorted by rank
+    '''
+    x_cols = list(x_cols)
+    moran_cols = x_cols + [y_col] if moran_cols is None else list(moran_cols)
+    df = df.dropna(subset=list(dict.fromkeys(x_cols + [y_col] + moran_cols)))
+    full, loo = _statistics(df, x_cols, y_col, moran_cols, w, zip_col)
+    return full, _ranked(df[zip_col].to_numpy(), full, loo, zip_col)
+
+
+def leave_k_out(df, x_cols, y_col, k, moran_cols=None, zip_col='zip_code'):
+    '''
+    Greedy leave-k-out: drop the most influential ZIP, re-score the rest, k times.
+    One row per step: the ZIP dropped, its influence at that step, and every statistic after dropping it.
+    '''
+    x_cols = list(x_cols)
+    moran_cols = x_cols + [y_col] if moran_cols is None else list(moran_cols)
+    df = df.dropna(subset=list(dict.fromkeys(x_cols + [y_col] + moran_cols)))
+    steps = []
+    for step in range(1, k + 1):
+        full, loo = _statistics(df, x_cols, y_col, moran_cols, None, zip_col)
+        table = _ranked(df[zip_col].to_numpy(), full, loo, zip_col)
+        top = table.iloc[0]
+        steps.append({'step': step, zip_col: top[zip_col], 'influence': top['influence'],
+                      **{name: top[f'{name}_loo'] for name in full}})
+        df = df[df[zip_col] != top[zip_col]]
+    return pd.DataFrame(steps)
+
+
+def _statistics(df, x_cols, y_col, moran_cols, w, zip_col):
+    full, loo = {}, {}
+    if x_cols:
+        rho = spearman_loo(df[x_cols], df[y_col])
+        whole = np.corrcoef(rank_columns(df[x_cols + [y_col]]), rowvar=False)[-1, :-1]
+        for j, col in enumerate(x_cols):
+            full[f'rho_{col}'], loo[f'rho_{col}'] = whole[j], rho[:, j]
+    if moran_cols:
+        w = subset_weights(df[zip_col]) if w is None else w
+        for col in moran_cols:
+            full[f'moran_{col}'], loo[f'moran_{col}'] = moran_i(df[col], w), moran_loo(df[col], w)
+    return full, loo
+
+
+def _ranked(zips, full, loo, zip_col):
+    n = len(zips)
+    table = pd.DataFrame({zip_col: zips})
+    scores = []
+    for name, values in loo.items():
+        table[f'{name}_loo'] = values
+        table[f'{name}_change'] = values - full[name]
+        # jackknife standard error of the statistic
+        se = np.sqrt((n - 1) / n * np.nansum((values - np.nanmean(values)) ** 2))
+        scores.append(np.abs(values - full[name]) / se if se > 0 else np.zeros(n))
+    table['influence'] = np.nanmax(scores, axis=0) if scores else np.zeros(n)
+    table['influence_rank'] = table['influence'].rank(ascending=False, method='first').astype(int)
+    return table.sort_values('influence_rank').reset_index(drop=True)
+
+
+def _loo_centred(x, r, rows):
+    # ranks of everyone else with each of `rows` removed, minus their mean n / 2; 0 at the removed ZIP itself
+    n = len(x)
+    xi = x[rows, None]
+    ranks = r[None, :] - (x[None, :] > xi) - 0.5 * (x[None, :] == xi)
+    centred = ranks - n / 2
+    centred[np.arange(len(rows)), rows] = 0
+    return centred
+
+
+def _binary(w):
+    # binary adjacency (CSR) from a W or a sparse / dense matrix
+    A = sparse.csr_matrix(w.sparse if hasattr(w, 'sparse') else w)
+    return sparse.csr_matrix((A != 0).astype(float))
@@ -0,0 +1,771 @@
+import functools
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from uw211.memo import memoized
+from uw211.parallel import n_workers, worker_pool
+from uw211.weights import subset_weights
+
+'''
+Batch local Moran's I (LISA) for several ZIP-level variables at once.
+
+The LISA scripts each ran Moran_Local(y, w, permutations=999, seed=42) on one column. Every one of those
+runs draws the exact same conditional-randomization neighbour sets (they only depend on the number of ZIPs,
+the largest neighbour count, the number of permutations and the seed), then scores one variable against them.
+local_moran_batch draws those neighbour sets once and scores every column of a variable matrix against them.
+
+The draws, statistics, quadrants and pseudo p-values follow esda's Moran_Local (no-numba path) step for step,
+so for the same W / permutations / seed the q and p_sim values match the single-column runs.
+
+lisa_table wraps it for a ZIP GeoDataFrame and returns the lisa_<name>_q / _p / _sig / _quad_label columns
+the scripts write to their *_Results.csv files. local_moran_bv_batch / moran_local_bv do the same for
+bivariate LISA (Moran_Local_BV: x at the ZIP vs the spatial lag of y), and local_moran_bv_pairs /
+bivariate_lisa_table score every (x, y) combination of two variable lists in one go.
+
+n_jobs > 1 (or -1 for every core) spreads the permutation scoring over a pool of workers. The neighbour draws
+are still made once, up front, from the one seeded stream, and each worker scores a fixed block of ZIPs
+against them - so the results are bit-identical for any number of workers (and to esda). Workers are
+processes where the OS can fork them (Linux, macOS), see uw211/parallel.py. On Windows they fall back to
+threads, and the per-ZIP scoring loop holds the GIL, so there n_jobs doesn't make the permutations faster.
+
+sequential=True turns on early stopping: draws are scored in batches of SEQUENTIAL_BATCH and a ZIP stops
+as soon as its count of extreme draws makes it clear which side of alpha its p-value is on (Besag-Clifford
+style, using binomial bounds under p = alpha on both sides), so only borderline ZIPs go all the way to
+`permutations`. Stopped ZIPs get p = (extreme + 1) / (draws + 1) from the draws they used; the draws used
+per ZIP come back as 'draws'. ZIPs that run to the end get exactly the full-run p-value, since they are
+scored against the same pre-drawn neighbour sets in the same order.
+
+Results are memoized on disk (uw211/memo.py), keyed by the standardized values, the weights, the
+permutation count, the seed and the sequential alpha, so re-running a script with nothing changed upstream
+loads the I values / quadrants / p-values instead of re-drawing 999 permutations. cache=False skips it.
+
+inference='analytic' is the fast mode for exploratory passes: no permutations, just z-scores from the exact
+mean / variance of each I_i under the same conditional randomization null the permutations sample
+(Sokal et al. 1998), with one-tailed normal p-values ('z' / 'p_z', like esda's z_sim / p_z_sim).
+The tables label which kind of p-value they hold in their *_inference column; moran_global does the same
+switch for the global Moran's I (esda's p_rand instead of the permutation p_sim).
+
+With hundreds of ZIPs per map, a raw p < 0.05 flags a fair number of ZIPs by chance. The tables also carry
+FDR (Benjamini-Hochberg) and Bonferroni adjusted p-values / flags (apply_correction, vectorized over every
+variable at once), and correction='fdr' / 'bonferroni' makes the quad labels use them. apply_correction only
+needs the stored p-values, so a table can be relabelled with a different correction without re-running anything.
+
+The same engine scores Getis-Ord Gi* / Gi (local_g_batch, hotspot_table) and local Geary, univariate and
+multivariate (local_geary_batch, local_geary_mv, geary_table). Only the statistic computed from each draw
+changes (_simulated); the weights and the neighbour draws are the same ones the LISA runs use (the draws are
+kept for the run, _shared_draws), so scoring three more statistics is about one more pass over the draws.
+Gi* matches esda's G_Local with the same seed. esda's local Geary doesn't seed its draws, so only its
+statistic can be matched; the p-values here come from the shared seeded draws.
+'''
+
+PERMUTATIONS = 999
+SEED = 42
+ALPHA = 0.05
+SEQUENTIAL_BATCH = 99
+SEQUENTIAL_DELTA = 0.001  # chance of stopping on the wrong side of alpha at any one check
+QUAD_LABELS = {1: 'HH', 2: 'LH', 3: 'LL', 4: 'HL'}
+HOTSPOT_LABELS = {1: 'Hot Spot', 2: 'Cold Spot'}
+GEARY_LABELS = {1: 'HH', 2: 'LL', 3: 'Negative', 4: 'Positive'}  # 4: multivariate, similar on every variable
+_LABELS = {  # table prefix -> (label column, q codes)
+    'lisa': ('quad_label', QUAD_LABELS),
+    'biv': ('quad_label', QUAD_LABELS),
+    'gi': ('label', HOTSPOT_LABELS),
+    'geary': ('label', GEARY_LABELS),
+}
+INFERENCE = ('permutation', 'analytic')
+CORRECTIONS = ('none', 'fdr', 'bonferroni')
+
+
+def neighbor_draws(n, max_card, permutations=PERMUTATIONS, seed=SEED):
+    '''
+    (permutations, max_card) random neighbour ids, same as esda.crand.vec_permutations.
+    Ids index the other n-1 observations (i itself removed), see other_ids.
+    '''
+    rs = np.random.RandomState(seed)
+    draws = np.empty((permutations, max_card), dtype=np.int64)
+    for k in range(permutations):
+        draws[k] = rs.choice(n - 1, size=max_card, replace=False)
+    return draws
+
+
+def local_moran_batch(Y, w, permutations=PERMUTATIONS, seed=SEED, n_jobs=1, sequential=False, alpha=ALPHA,
+                      cache=True, inference='permutation'):
+    '''
+    Local Moran's I for every column of Y (n x k) against one row-standardized W.
+    Returns a dict of (n, k) arrays: 'Is', 'q' (1 HH, 2 LH, 3 LL, 4 HL), 'p_sim', 'draws' (permutations used),
+    or 'Is', 'q', 'z', 'p_z' with inference='analytic' (no permutations, see _analytic_p).
+    '''
+    Z = standardize(Y)
+    pairs = (np.arange(Z.shape[1]), np.arange(Z.shape[1]))
+    return _local_moran(Z, Z, pairs, w, permutations, seed, n_jobs, alpha if sequential else None, cache,
+                        inference)
+
+
+def local_moran_bv_batch(X, Y, w, permutations=PERMUTATIONS, seed=SEED, n_jobs=1, sequential=False, alpha=ALPHA,
+                         cache=True, inference='permutation'):
+    '''
+    Bivariate local Moran's I for every column pair (X[:, j], Y[:, j]) against one row-standardized W,
+    same as Moran_Local_BV(X[:, j], Y[:, j], w, permutations=..., seed=...).
+    Returns a dict of (n, k) arrays: 'Is', 'q', 'p_sim', 'draws'.
+    '''
+    Zx = standardize(X)
+    Zy = standardize(Y)
+    pairs = (np.arange(Zx.shape[1]), np.arange(Zx.shape[1]))
+    return _local_moran(Zx, Zy, pairs, w, permutations, seed, n_jobs, alpha if sequential else None, cache,
+                        inference)
+
+
+def local_moran_bv_pairs(X, Y, w, permutations=PERMUTATIONS, seed=SEED, n_jobs=1, sequential=False, alpha=ALPHA,
+                         cache=True, inference='permutation'):
+    '''
+    Bivariate local Moran's I for every (X[:, a], Y[:, b]) combination against one row-standardized W.
+    Each y gets one spatial lag (and one random lag per permutation) shared by every x it's paired with.
+    Returns a dict of (n, kx * ky) arrays ('Is', 'q', 'p_sim', 'draws') plus 'pairs' = (x index, y index)
+    per column, x-major: (0, 0), (0, 1), ..., (1, 0), ...
+    '''
+    Zx = standardize(X)
+    Zy = standardize(Y)
+    xs, ys = np.divmod(np.arange(Zx.shape[1] * Zy.shape[1]), Zy.shape[1])
+    out = _local_moran(Zx, Zy, (xs, ys), w, permutations, seed, n_jobs, alpha if sequential else None, cache,
+                        inference)
+    out['pairs'] = list(zip(xs.tolist(), ys.tolist()))
+    return out
+
+
+def moran_global(y, w, inference='permutation', permutations=PERMUTATIONS):
+    '''
+    esda's global Moran(y, w) with .p / .inference added: .p is p_sim (one-tailed pseudo p from the permutations),
+    or with inference='analytic' the permutations are skipped and .p is p_rand (two-tailed, normal approximation
+    under randomization; p_norm is there too).
+    '''
+    from esda.moran import Moran
+
+    if inference not in INFERENCE:
+        raise ValueError(f"inference must be one of {INFERENCE}, got {inference!r}")
+    if inference == 'analytic':
+        moran = Moran(y, w, permutations=0)
+        moran.p = moran.p_rand
+    else:
+        moran = Moran(y, w, permutations=permutations)
+        moran.p = moran.p_sim
+    moran.inference = inference
+    return moran
+
+
+def moran_local(y, w, permutations=PERMUTATIONS, seed=SEED, **options):
+    # drop-in for Moran_Local(y, w, permutations=999, seed=42) when only .Is / .q / .p_sim are used (e.g. lisa_cluster)
+    result = local_moran_batch(np.asarray(y, dtype=float), w, permutations=permutations, seed=seed, **options)
+    return SimpleNamespace(**{key: values[:, 0] for key, values in result.items()})
+
+
+def moran_local_bv(x, y, w, permutations=PERMUTATIONS, seed=SEED, **options):
+    # drop-in for Moran_Local_BV(x, y, w, permutations=999, seed=42) when only .Is / .q / .p_sim are used
+    result = local_moran_bv_batch(np.asarray(x, dtype=float), np.asarray(y, dtype=float), w,
+                                  permutations=permutations, seed=seed, **options)
+    return SimpleNamespace(**{key: values[:, 0] for key, values in result.items()})
+
+
+def local_g_batch(Y, w, star=True, permutations=PERMUTATIONS, seed=SEED, n_jobs=1, sequential=False, alpha=ALPHA,
+                  cache=True, inference='permutation'):
+    '''
+    Getis-Ord local G for every column of Y (n x k, non-negative values like rates), same as
+    G_Local(Y[:, j], w, star=star, permutations=..., seed=...). star=True is Gi* (the ZIP counts in its own
+    neighbourhood, self-weight = the row's neighbour weight, then row-standardized, like esda does it).
+    Returns a dict of (n, k) arrays: 'Gs', 'z' (esda's analytic Zs), 'q' (1 hot spot, 2 cold spot), 'p_sim',
+    'draws', or 'p_z' (esda's p_norm) instead of 'p_sim' / 'draws' with inference='analytic'.
+    '''
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    if inference not in INFERENCE:
+        raise ValueError(f"inference must be one of {INFERENCE}, got {inference!r}")
+
+    def compute():
+        from scipy.stats import norm
+
+        gw = _star_weights(w) if star else w
+        W = gw.sparse
+        n = Y.shape[0]
+        remove_self = not star
+        N = n - remove_self
+        cardinality = np.asarray(W.sum(axis=1)).squeeze()
+        Gs = np.empty(Y.shape)
+        z = np.empty(Y.shape)
+        for j in range(Y.shape[1]):
+            y = np.ascontiguousarray(Y[:, j])
+            Gs[:, j] = (W @ y) / (y.sum() - y * remove_self)
+            # analytic moments, as in G_Local.calc
+            empirical_mean = (y.sum() - y * remove_self) / N
+            empirical_variance = ((y ** 2).sum() - (y ** 2) * remove_self) / N - empirical_mean ** 2
+            expected_variance = cardinality * (N - cardinality) / (N - 1) * (1 / N ** 2)
+            expected_variance *= empirical_variance / (empirical_mean ** 2)
+            z[:, j] = (Gs[:, j] - cardinality / N) / np.sqrt(expected_variance)
+
+        out = {'Gs': Gs, 'z': z, 'q': np.where(z > 0, 1, 2)}
+        if inference == 'analytic':
+            out['p_z'] = norm.sf(np.abs(z))
+        elif permutations:
+            pairs = (np.arange(Y.shape[1]), np.arange(Y.shape[1]))
+            out['p_sim'], out['draws'] = _conditional_p('gstar' if star else 'g', Y, Y, pairs, Gs, adjacency_matrix(gw),
+                                                        np.array([y.sum() for y in Y.T]), permutations, seed, n_jobs,
+                                                        alpha if sequential else None, W.diagonal())
+        return out
+
+    if not cache or inference == 'analytic':
+        return compute()
+    return memoized('local_g', compute, (Y,), w, star=star, permutations=permutations, seed=seed,
+                    alpha=alpha if sequential else None)
+
+
+def local_geary_batch(Y, w, permutations=PERMUTATIONS, seed=SEED, n_jobs=1, sequential=False, alpha=ALPHA,
+                      cache=True):
+    '''
+    Local Geary c for every column of Y (n x k), the statistic of esda's Geary_Local(connectivity=w).fit(Y[:, j]):
+    W-weighted squared differences between the standardized value at the ZIP and at its neighbours.
+    Small = like its neighbours (positive association), large = unlike them.
+    Returns a dict of (n, k) arrays: 'localG', 'q' (1 HH, 2 LL, 3 negative association - esda's labs),
+    'p_sim', 'draws'. Geary_Local doesn't pass its seed to the draws, so its p-values change run to run;
+    here they come from the same seeded draws as the LISA runs.
+    '''
+    Z = standardize(Y)
+    pairs = (np.arange(Z.shape[1]), np.arange(Z.shape[1]))
+
+    def compute():
+        localG = np.column_stack([_geary(Z[:, [j]], w) for j in range(Z.shape[1])])
+        q = np.where(localG < localG.mean(axis=0), np.where(Z > 0, 1, 2), 3)
+        return _geary_p('geary', Z, pairs, localG, q, w, permutations, seed, n_jobs, sequential, alpha)
+
+    if not cache:
+        return compute()
+    return memoized('local_geary', compute, (Z,), w, permutations=permutations, seed=seed,
+                    alpha=alpha if sequential else None)
+
+
+def local_geary_mv(Y, w, permutations=PERMUTATIONS, seed=SEED, n_jobs=1, sequential=False, alpha=ALPHA, cache=True):
+    '''
+    Multivariate local Geary over all the columns of Y at once, the statistic of esda's
+    Geary_Local_MV(connectivity=w).fit([Y[:, 0], Y[:, 1], ...]): each variable's local Geary, averaged, so it's
+    small where a ZIP looks like its neighbours on every variable together.
+    Returns a dict of (n, 1) arrays: 'localG', 'q' (4 positive association: below the average localG,
+    3 negative), 'p_sim', 'draws'.
+    '''
+    Z = standardize(Y)
+    pairs = (np.zeros(1, dtype=int), np.zeros(1, dtype=int))
+
+    def compute():
+        localG = _geary(Z, w)[:, None]
+        q = np.where(localG < localG.mean(), 4, 3)
+        return _geary_p('geary_mv', Z, pairs, localG, q, w, permutations, seed, n_jobs, sequential, alpha)
+
+    if not cache:
+        return compute()
+    return memoized('local_geary_mv', compute, (Z,), w, permutations=permutations, seed=seed,
+                    alpha=alpha if sequential else None)
+
+
+def standardize(Y):
+    # column-wise (y - mean) / std with the population std, one column at a time like Moran_Local does it
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    Z = np.empty_like(Y)
+    for j in range(Y.shape[1]):
+        y = np.ascontiguousarray(Y[:, j])
+        z = y - y.mean()
+        with np.errstate(all='ignore'):
+            z /= y.std()
+        Z[:, j] = z
+    return Z
+
+
+def lisa_table(gdf, variables, w=None, alpha=ALPHA, zip_col='zip_code', correction='none', **options):
+    '''
+    variables: {name: column}, e.g. {'poverty': 'poverty_rate', 'callers': 'callers_per_1000'}.
+    Returns zip_code + lisa_<name>_q / _p / _sig / _quad_label / _inference for every variable, in gdf row order,
+    plus lisa_<name>_draws when sequential=True and lisa_<name>_z when inference='analytic',
+    plus the multiple-testing columns from apply_correction (quad labels follow `correction`).
+    options go to local_moran_batch (permutations, seed, n_jobs, sequential, inference).
+
+    Each variable is scored on the rows where it isn't missing (same as the scripts' dropna before
+    building W). Variables with the same missing pattern share one W and one set of neighbour draws;
+    w, if given, is used for the variables with no missing values.
+    '''
+    columns = _local_columns(gdf, variables, w, alpha, zip_col, 'lisa', local_moran_batch, None, options)
+    return apply_correction(assemble_table(gdf, zip_col, variables, columns), correction, alpha)
+
+
+def hotspot_table(gdf, variables, w=None, alpha=ALPHA, zip_col='zip_code', correction='none', star=True, **options):
+    '''
+    Getis-Ord hot / cold spots (Gi*, or Gi with star=False) for every variable, laid out like lisa_table:
+    zip_code + gi_<name>_G / _q / _p / _sig / _label ('Hot Spot' / 'Cold Spot' / 'NS') / _inference / _z,
+    plus the apply_correction columns. Same W and neighbour draws as the LISA runs on the same rows.
+    options go to local_g_batch (permutations, seed, n_jobs, sequential, inference).
+    '''
+    run = functools.partial(local_g_batch, star=star)
+    columns = _local_columns(gdf, variables, w, alpha, zip_col, 'gi', run, ('Gs', 'G'), options)
+    return apply_correction(assemble_table(gdf, zip_col, variables, columns), correction, alpha)
+
+
+def geary_table(gdf, variables, w=None, alpha=ALPHA, zip_col='zip_code', correction='none', multivariate=None,
+                **options):
+    '''
+    Local Geary for every variable, laid out like lisa_table: zip_code + geary_<name>_c / _q / _p / _sig / _label
+    ('HH' / 'LL' / 'Negative' / 'NS') / _inference, plus the apply_correction columns.
+    multivariate: {name: [columns]} adds a multivariate local Geary over those columns (label 'Positive' /
+    'Negative'), scored on the rows where all of them are present.
+    options go to local_geary_batch / local_geary_mv (permutations, seed, n_jobs, sequential).
+    '''
+    columns = _local_columns(gdf, variables, w, alpha, zip_col, 'geary', local_geary_batch, ('localG', 'c'), options)
+    for name, cols in (multivariate or {}).items():
+        mask = gdf[list(cols)].notna().all(axis=1).to_numpy()
+        result = local_geary_mv(gdf.loc[mask, list(cols)].to_numpy(dtype=float), group_weights(gdf, mask, w, zip_col),
+                                alpha=alpha, **options)
+        columns[name] = result_columns(f'geary_{name}', result, 0, mask, alpha, options, ('localG', 'c'))
+    return apply_correction(assemble_table(gdf, zip_col, list(variables) + list(multivariate or {}), columns),
+                            correction, alpha)
+
+
+def bivariate_lisa_table(gdf, x_cols, y_cols, w=None, alpha=ALPHA, zip_col='zip_code', correction='none',
+                         **options):
+    '''
+    Long table of bivariate LISA results for every (x, y) column pair:
+        zip_code, x, y, x_value, y_value, biv_I, biv_p, biv_q, biv_sig, biv_quad_label, biv_inference
+    (+ biv_draws if sequential, biv_z if inference='analytic', and the apply_correction columns)
+    One block of rows per pair, each block in gdf row order (so block['biv_I'].to_numpy() lines up with gdf).
+    Each pair is scored on the rows where its own x and y are present; w, if given, is used for pairs with nothing
+    missing, otherwise W is cut from the statewide adjacency for those rows. Rows left out get missing results.
+    options go to local_moran_bv_pairs (permutations, seed, n_jobs, sequential, inference).
+    '''
+    x_cols, y_cols = list(x_cols), list(y_cols)
+    present_x = gdf[x_cols].notna().to_numpy()
+    present_y = gdf[y_cols].notna().to_numpy()
+
+    # pairs with the same missing rows share one W and one local_moran_bv_pairs run
+    groups = {}
+    for a in range(len(x_cols)):
+        for b in range(len(y_cols)):
+            mask = present_x[:, a] & present_y[:, b]
+            groups.setdefault(mask.tobytes(), (mask, []))[1].append((a, b))
+    results = {}
+    for mask, pairs in groups.values():
+        xs = sorted({a for a, _ in pairs})
+        ys = sorted({b for _, b in pairs})
+        result = local_moran_bv_pairs(gdf.loc[mask, [x_cols[a] for a in xs]].to_numpy(dtype=float),
+                                      gdf.loc[mask, [y_cols[b] for b in ys]].to_numpy(dtype=float),
+                                      group_weights(gdf, mask, w, zip_col), alpha=alpha, **options)
+        p = p_values(result)
+        for j, (i, k) in enumerate(result['pairs']):
+            if (xs[i], ys[k]) in pairs:  # combinations outside the group were scored on the wrong rows
+                columns = {key: result[key][:, j] for key in ('Is', 'q', 'z', 'draws') if key in result}
+                results[xs[i], ys[k]] = mask, columns, p[:, j]
+
+    blocks = []
+    for a in range(len(x_cols)):
+        for b in range(len(y_cols)):
+            mask, result, p = results[a, b]
+            block = pd.DataFrame({
+                zip_col: gdf[zip_col].to_numpy(),
+                'x': x_cols[a],
+                'y': y_cols[b],
+                'x_value': gdf[x_cols[a]].to_numpy(dtype=float),
+                'y_value': gdf[y_cols[b]].to_numpy(dtype=float),
+            })
+            block['biv_I'] = np.nan
+            block.loc[mask, 'biv_I'] = result['Is']
+            block['biv_p'] = np.nan
+            block.loc[mask, 'biv_p'] = p
+            block['biv_q'] = pd.Series(pd.NA, index=block.index, dtype='Int64')
+            block.loc[mask, 'biv_q'] = result['q']
+            block['biv_sig'] = pd.Series(pd.NA, index=block.index, dtype='boolean')
+            block.loc[mask, 'biv_sig'] = p < alpha
+            block['biv_quad_label'] = quad_labels(block['biv_q'], block['biv_sig'])
+            block['biv_inference'] = _inference_label(options)
+            if 'z' in result:
+                block['biv_z'] = np.nan
+                block.loc[mask, 'biv_z'] = result['z']
+            if 'draws' in result and options.get('sequential'):
+                block['biv_draws'] = pd.Series(pd.NA, index=block.index, dtype='Int64')
+                block.loc[mask, 'biv_draws'] = result['draws']
+            blocks.append(block)
+    return apply_correction(pd.concat(blocks, ignore_index=True), correction, alpha)
+
+
+def apply_correction(table, correction='none', alpha=ALPHA):
+    '''
+    Adds FDR (Benjamini-Hochberg) and Bonferroni adjusted p-values + significance flags to a lisa_table /
+    hotspot_table / geary_table (lisa_<name>_p_fdr / _sig_fdr / _p_bonferroni / _sig_bonferroni, gi_..., geary_...)
+    or bivariate_lisa_table (biv_p_fdr / ...), and redoes the labels with the significance from `correction`
+    ('none' = raw p < alpha, like the original scripts).
+    Each variable / pair is its own family (the ZIPs on one map). Only the stored p-values are used,
+    so switching the correction never re-runs the permutations.
+    '''
+    if correction not in CORRECTIONS:
+        raise ValueError(f"correction must be one of {CORRECTIONS}, got {correction!r}")
+    table = table.copy()
+    if 'biv_p' in table.columns:
+        # long table: equal-sized blocks of ZIPs, one per (x, y) pair -> one column per pair
+        pairs = table.groupby(['x', 'y'], sort=False).ngroups
+        prefixes = ['biv']
+        P = table['biv_p'].to_numpy(dtype=float).reshape(pairs, -1).T
+    else:
+        prefixes = [col[:-2] for col in table.columns if re.fullmatch(r'(lisa|gi|geary)_.+_p', col)]
+        P = table[[f'{prefix}_p' for prefix in prefixes]].to_numpy(dtype=float)
+
+    scored = ~np.isnan(P)
+    flags = {'none': P < alpha}
+    adjusted = {}
+    for method in CORRECTIONS[1:]:
+        adjusted[method] = adjust_p(P, method)
+        flags[method] = adjusted[method] < alpha
+
+    def column(values, j):
+        # per-prefix column back in table row order (the long table stacks the pair columns)
+        return values.T.ravel() if prefixes == ['biv'] else values[:, j]
+
+    for j, prefix in enumerate(prefixes):
+        has_p = column(scored, j)
+        for method in CORRECTIONS[1:]:
+            table[f'{prefix}_p_{method}'] = column(adjusted[method], j)
+            sig = pd.Series(pd.NA, index=table.index, dtype='boolean')
+            sig[has_p] = column(flags[method], j)[has_p]
+            table[f'{prefix}_sig_{method}'] = sig
+        sig = pd.Series(pd.NA, index=table.index, dtype='boolean')
+        sig[has_p] = column(flags['none'], j)[has_p]
+        table[f'{prefix}_sig'] = sig
+        chosen = sig if correction == 'none' else table[f'{prefix}_sig_{correction}']
+        label, labels = _LABELS[prefix.split('_')[0]]
+        table[f'{prefix}_{label}'] = quad_labels(table[f'{prefix}_q'], chosen, labels)
+    return table
+
+
+def adjust_p(P, correction='fdr'):
+    '''
+    Multiple-testing adjusted p-values for every column of P (n x k, or one 1-D column) at once,
+    each column its own family. NaNs (ZIPs that weren't scored) stay NaN and don't count toward it.
+    'fdr': Benjamini-Hochberg step-up, 'bonferroni': p * m, both capped at 1. 'none' returns a copy.
+    '''
+    P = np.array(P, dtype=float)
+    flat = P.ndim == 1
+    if flat:
+        P = P[:, None]
+    m = (~np.isnan(P)).sum(axis=0)
+    if correction == 'bonferroni':
+        adjusted = np.minimum(P * m, 1.0)
+    elif correction == 'fdr':
+        order = np.argsort(P, axis=0, kind='stable')  # NaNs sort last
+        ranked = np.take_along_axis(P, order, axis=0)
+        ranked = ranked * m / np.arange(1, P.shape[0] + 1)[:, None]
+        ranked[np.isnan(ranked)] = np.inf
+        # step-up: each p gets the smallest scaled p at or above its rank
+        ranked = np.minimum(np.minimum.accumulate(ranked[::-1], axis=0)[::-1], 1.0)
+        adjusted = np.empty_like(P)
+        np.put_along_axis(adjusted, order, ranked, axis=0)
+        adjusted[np.isnan(P)] = np.nan
+    elif correction == 'none':
+        adjusted = P
+    else:
+        raise ValueError(f"correction must be one of {CORRECTIONS}, got {correction!r}")
+    return adjusted[:, 0] if flat else adjusted
+
+
+def quad_labels(q, sig, labels=QUAD_LABELS):
+    # 'HH' / 'LH' / 'LL' / 'HL' (or the labels given) where significant, 'NS' otherwise (missing rows stay missing)
+    labels = pd.Series(np.asarray(q.map(labels), dtype=object), index=q.index)
+    labels[sig.eq(False)] = 'NS'
+    return labels
+
+
+def _local_columns(gdf, variables, w, alpha, zip_col, prefix, run, stat, options):
+    # {name: {column: values}}, each variable scored on the rows where it isn't missing; variables with the
+    # same missing pattern share one W and one set of neighbour draws
+    masks = {}
+    for name, col in variables.items():
+        mask = gdf[col].notna().to_numpy()
+        masks.setdefault(mask.tobytes(), (mask, []))[1].append(name)
+
+    columns = {}
+    for mask, names in masks.values():
+        Y = gdf.loc[mask, [variables[name] for name in names]].to_numpy(dtype=float)
+        result = run(Y, group_weights(gdf, mask, w, zip_col), alpha=alpha, **options)
+        for j, name in enumerate(names):
+            columns[name] = result_columns(f'{prefix}_{name}', result, j, mask, alpha, options, stat)
+    return columns
+
+
+def group_weights(gdf, mask, w, zip_col):
+    # w if it covers the rows, otherwise cut from the statewide adjacency for them
+    if w is not None and mask.all():
+        return w
+    return subset_weights(gdf.loc[mask, zip_col].to_numpy(), silence_warnings=True)
+
+
+def result_columns(prefix, result, j, mask, alpha, options, stat=None):
+    # table columns for column j of a batch result, back in gdf row order (missing where the row wasn't scored)
+    index = range(len(mask))
+    columns = {}
+    if stat is not None:
+        key, suffix = stat
+        columns[f'{prefix}_{suffix}'] = pd.Series(np.nan, index=index)
+        columns[f'{prefix}_{suffix}'][mask] = result[key][:, j]
+    q = pd.Series(pd.NA, index=index, dtype='Int64')
+    q[mask] = result['q'][:, j]
+    p = pd.Series(np.nan, index=index)
+    p[mask] = p_values(result)[:, j]
+    sig = pd.Series(pd.NA, index=index, dtype='boolean')
+    sig[mask] = p_values(result)[:, j] < alpha
+    label, labels = _LABELS[prefix.split('_')[0]]
+    columns.update({
+        f'{prefix}_q': q,
+        f'{prefix}_p': p,
+        f'{prefix}_sig': sig,
+        f'{prefix}_{label}': quad_labels(q, sig, labels),
+        f'{prefix}_inference': _inference_label(options),
+    })
+    if 'z' in result:
+        columns[f'{prefix}_z'] = pd.Series(np.nan, index=index)
+        columns[f'{prefix}_z'][mask] = result['z'][:, j]
+    if 'draws' in result and options.get('sequential'):
+        columns[f'{prefix}_draws'] = pd.Series(pd.NA, index=index, dtype='Int64')
+        columns[f'{prefix}_draws'][mask] = result['draws'][:, j]
+    return columns
+
+
+def assemble_table(gdf, zip_col, names, columns):
+    # zip_col + every name's result_columns, in names order
+    out = pd.DataFrame({zip_col: gdf[zip_col].to_numpy()})
+    for name in names:
+        for col, values in columns[name].items():
+            out[col] = values
+    return out
+
+
+def p_values(result):
+    # permutation pseudo p-values, or the normal-approximation ones from an analytic run
+    return result['p_sim'] if 'p_sim' in result else result['p_z']
+
+
+def _inference_label(options):
+    # what the p column holds, written next to it in the tables
+    if options.get('inference', 'permutation') == 'analytic':
+        return 'analytic'
+    sequential = ', sequential' if options.get('sequential') else ''
+    return f"permutation ({options.get('permutations', PERMUTATIONS)}{sequential}, seed {options.get('seed', SEED)})"
+
+
+def _local_moran(Zx, Zy, pairs, w, permutations, seed, n_jobs, alpha, cache=True, inference='permutation'):
+    # Is / q / p_sim / draws for each (x column, y column) pair: x at the ZIP vs the spatial lag of y
+    xs, ys = pairs
+    if inference not in INFERENCE:
+        raise ValueError(f"inference must be one of {INFERENCE}, got {inference!r}")
+
+    def compute():
+        n = Zx.shape[0]
+        adjacency = adjacency_matrix(w)
+        lags = np.column_stack([adjacency @ Zy[:, b] for b in range(Zy.shape[1])])
+
+        Is = np.empty((n, len(xs)))
+        q = np.empty((n, len(xs)), dtype=np.int64)
+        for j, (a, b) in enumerate(zip(xs, ys)):
+            zx = Zx[:, a]
+            Is[:, j] = (n - 1) * zx * lags[:, b] / (zx * zx).sum()
+            q[:, j] = quadrants(zx, lags[:, b])
+
+        out = {'Is': Is, 'q': q}
+        if inference == 'analytic':
+            out['z'], out['p_z'] = _analytic_p(Zx, Zy, pairs, Is, adjacency)
+        elif permutations:
+            scaling = np.array([(n - 1) / (Zx[:, a] * Zx[:, a]).sum() for a in range(Zx.shape[1])])
+            out['p_sim'], out['draws'] = _conditional_p('moran', Zx, Zy, pairs, Is, adjacency, scaling,
+                                                        permutations, seed, n_jobs, alpha)
+        return out
+
+    if not cache or inference == 'analytic':
+        return compute()  # the analytic pass is a few mat-vecs, not worth a disk round trip
+    # n_jobs isn't part of the key, the results are the same for any number of workers
+    return memoized('local_moran', compute, (Zx, Zy, np.asarray(xs), np.asarray(ys)), w,
+                    permutations=permutations, seed=seed, alpha=alpha)
+
+
+def adjacency_matrix(w):
+    # W.sparse without self-weights, the way esda's crand prepares it
+    adjacency = w.sparse.tocsr(copy=True)
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    return adjacency
+
+
+def quadrants(z, lag):
+    # q codes (QUAD_LABELS) of each ZIP from the sign of its value and of its spatial lag
+    zp = z > 0
+    lp = lag > 0
+    return 1 * (zp & lp) + 2 * (~zp & lp) + 3 * (~zp & ~lp) + 4 * (zp & ~lp)
+
+
+@functools.lru_cache(maxsize=4)
+def _shared_draws(n, max_card, permutations, seed):
+    # neighbor_draws, made once per run for every statistic scored on the same ZIP set (read-only, it's shared)
+    draws = neighbor_draws(n, max_card, permutations, seed)
+    draws.flags.writeable = False
+    return draws
+
+
+def other_ids(draws, i):
+    # draws index z with observation i removed -> positions in the full z
+    return draws + (draws >= i)
+
+
+def _star_weights(w):
+    # Gi* weights the way G_Local(star=True) builds them from a row-standardized W
+    from libpysal.weights import fill_diagonal
+
+    star = fill_diagonal(w, np.asarray(w.sparse.max(axis=1).todense()).flatten())
+    star.transform = 'R'
+    return star
+
+
+def _geary(Z, w):
+    # (multivariate) local Geary: sum over neighbours of w_ij (z_i - z_j)^2, averaged over the columns of Z
+    adjacency = adjacency_matrix(w)
+    rows = np.repeat(np.arange(adjacency.shape[0]), np.diff(adjacency.indptr))
+    total = 0
+    for v in range(Z.shape[1]):
+        diff = Z[rows, v] - Z[adjacency.indices, v]
+        total = total + np.bincount(rows, weights=adjacency.data * diff ** 2, minlength=adjacency.shape[0])
+    return total / Z.shape[1]
+
+
+def _geary_p(stat, Z, pairs, localG, q, w, permutations, seed, n_jobs, sequential, alpha):
+    out = {'localG': localG, 'q': q}
+    if permutations:
+        out['p_sim'], out['draws'] = _conditional_p(stat, Z, Z, pairs, localG, adjacency_matrix(w), None, permutations,
+                                                    seed, n_jobs, alpha if sequential else None)
+    return out
+
+
+def _analytic_p(Zx, Zy, pairs, Is, adjacency):
+    # z-scores / one-tailed p-values from the exact mean and variance of I_i under the conditional
+    # randomization null (the n-1 other values shuffled into i's neighbours, drawn without replacement)
+    from scipy.stats import norm
+
+    n = Zx.shape[0]
+    others = n - 1
+    wi = np.asarray(adjacency.sum(axis=1)).ravel()
+    wi2 = np.asarray(adjacency.multiply(adjacency).sum(axis=1)).ravel()
+    xs, ys = pairs
+    z = np.empty(Is.shape)
+    for j, (a, b) in enumerate(zip(xs, ys)):
+        zx, zy = Zx[:, a], Zy[:, b]
+        scale = (n - 1) * zx / (zx * zx).sum()
+        mean = (zy.sum() - zy) / others
+        spread = ((zy * zy).sum() - zy * zy) / others - mean * mean
+        expectation = scale * wi * mean
+        variance = scale * scale * spread * (others * wi2 - wi * wi) / (others - 1)
+        with np.errstate(all='ignore'):
+            z[:, j] = np.where(variance > 0, (Is[:, j] - expectation) / np.sqrt(variance), 0.0)
+    return z, norm.sf(np.abs(z))
+
+
+def _conditional_p(stat, Zx, Zy, pairs, observed, adjacency, scaling, permutations, seed, n_jobs=1, alpha=None,
+                   self_weights=None):
+    # folded pseudo p-values (+ draws used) from one shared set of conditional-randomization draws
+    # Zx holds the values at the ZIP, Zy the variables that get shuffled into its neighbours (same array for LISA)
+    # stat picks the statistic the draws are scored with (see _simulated); adjacency has no self-weights,
+    # Gi*'s self-weights come in separately like esda's crand does it
+    # alpha=None scores every draw, otherwise ZIPs stop early once they're clearly on one side of alpha
+    n = Zx.shape[0]
+    cardinalities = np.diff(adjacency.indptr)
+    draws = _shared_draws(n, max(int(cardinalities.max(initial=0)), 1), permutations, seed)
+    bounds = None if alpha is None else _sequential_bounds(permutations, alpha)
+    args = (stat, np.ascontiguousarray(Zx.T), np.ascontiguousarray(Zy.T), pairs, observed, adjacency.indptr,
+            adjacency.data, self_weights, draws, scaling, bounds)
+
+    workers = n_workers(n_jobs)
+    if workers == 1:
+        larger, used = _count_larger(0, n, *args)
+    else:
+        # fixed blocks of ZIPs (a few per worker for load balance), stitched back in order
+        blocks = np.linspace(0, n, min(n, workers * 4) + 1).astype(int)
+        with worker_pool(workers) as pool:
+            parts = list(pool.map(_count_larger, blocks[:-1], blocks[1:], *[[a] * (len(blocks) - 1) for a in args]))
+        larger = np.concatenate([part[0] for part in parts])
+        used = np.concatenate([part[1] for part in parts])
+
+    low_extreme = (used - larger) < larger
+    larger[low_extreme] = used[low_extreme] - larger[low_extreme]
+    return (larger + 1.0) / (used + 1.0), used
+
+
+def _count_larger(start, stop, stat, ZxT, ZyT, pairs, observed, indptr, data, self_weights, draws, scaling,
+                  bounds=None):
+    # for ZIPs start..stop-1: how many permuted statistics are >= the observed one, and how many draws that took
+    xs, ys = pairs
+    permutations = draws.shape[0]
+    step = permutations if bounds is None else SEQUENTIAL_BATCH
+    larger = np.zeros((stop - start, len(xs)), dtype=np.int64)
+    used = np.full((stop - start, len(xs)), permutations, dtype=np.int64)
+    for i in range(start, stop):
+        card = indptr[i + 1] - indptr[i]
+        if card == 0:
+            # islands: the shuffled neighbourhood is empty, every draw lands on the same side of the observed value
+            larger[i - start] = permutations
+            continue
+        weights = data[indptr[i]:indptr[i + 1]]
+        ids = other_ids(draws[:, :card], i)
+        count = np.zeros(len(xs), dtype=np.int64)
+        active = np.ones(len(xs), dtype=bool)
+        for lo in range(0, permutations, step):
+            batch = ids[lo:lo + step]
+            done = lo + len(batch)
+            shared = {}  # one random lag per y, shared by every x paired with it
+            for j in np.flatnonzero(active):
+                sims = _simulated(stat, i, xs[j], ys[j], batch, weights, ZxT, ZyT, scaling, self_weights, shared)
+                count[j] += (sims >= observed[i, j]).sum()
+            if bounds is None or done >= permutations:
+                break
+            extreme = np.minimum(count, done - count)
+            low, high = bounds[done]
+            stopped = active & ((extreme <= low) | (extreme >= high))
+            used[i - start, stopped] = done
+            active &= ~stopped
+            if not active.any():
+                break
+        larger[i - start] = count
+    return larger, used
+
+
+def _simulated(stat, i, a, b, batch, weights, ZxT, ZyT, scaling, self_weights, shared):
+    # statistic at ZIP i for each draw in the batch (rows of neighbour ids), same arithmetic as esda's crand stat_funcs
+    if stat == 'geary_mv':
+        # every variable, averaged (Geary_Local_MV)
+        total = 0
+        for v in range(ZyT.shape[0]):
+            total = total + ((ZyT[v, i] - ZyT[v][batch]) ** 2 * weights).sum(1) / ZyT.shape[0]
+        return total
+    if stat == 'geary':
+        return (ZyT[b, i] - ZyT[b][batch]) ** 2 @ weights
+    if b not in shared:
+        shared[b] = ZyT[b][batch] @ weights
+    if stat == 'moran':
+        return ZxT[a, i] * shared[b] * scaling[a]
+    if stat == 'g':
+        return shared[b] / (scaling[b] - ZyT[b, i])
+    return (shared[b] + self_weights[i] * ZyT[b, i]) / scaling[b]  # gstar
+
+
+def _sequential_bounds(permutations, alpha, delta=SEQUENTIAL_DELTA):
+    # {draws so far: (low, high)} - stop as significant with <= low extreme draws, as not significant with >= high
+    from scipy.stats import binom
+
+    bounds = {}
+    for done in range(SEQUENTIAL_BATCH, permutations, SEQUENTIAL_BATCH):
+        extreme = np.arange(done + 1)
+        p_hat = (extreme + 1.0) / (done + 1.0)
+        # few extremes: a true p-value >= alpha would rarely give this few (and the estimate agrees)
+        low = extreme[(binom.cdf(extreme, done, alpha) < delta) & (p_hat < alpha)]
+        # many extremes: a true p-value < alpha would rarely give this many
+        high = extreme[(binom.sf(extreme - 1, done, alpha) < delta) & (p_hat >= alpha)]
+        bounds[done] = (low.max() if len(low) else -1, high.min() if len(high) else done + 1)
+    return bounds
@@ -0,0 +1,210 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from uw211.lisa import (ALPHA, PERMUTATIONS, SEED, adjacency_matrix, apply_correction, assemble_table, neighbor_draws,
+                        other_ids, quadrants, result_columns)
+
+'''
+Incremental local Moran's I for when a few ZIP values change.
+
+A corrected caller count (a fixed ZIP typo in the cleanup) used to mean re-running the whole LISA map.
+lisa_state does one full run and keeps what the result is built from; update_lisa then takes the changed
+ZIPs and only redoes the parts that depend on them:
+- mean and variance come from running sums (sum, sum of squares), updated by the old -> new differences
+- spatial lags are recomputed only for the changed ZIPs' neighbours
+- permutation counts are redone in full for those neighbours (their observed lag moved), and for every
+  other ZIP only the few draws that put a changed ZIP into its random neighbourhood are re-scored
+
+The last step works because the conditional permutation test doesn't need the standardization: with the
+same weights on both sides, a random lag of z is >= the observed lag of z exactly when the random lag of the
+raw values is >= the observed raw lag. So the state keeps, per ZIP, how many draws came out >= and <= the
+observed raw lag, and the sign of z at the ZIP (the only place the mean comes in) picks which count is the
+esda 'larger' count. The draws are the same seeded neighbour sets as Moran_Local / local_moran_batch, so
+p-values match a full run. The one exception is exact ties on heavily rounded data (a random neighbourhood
+averaging to exactly the observed lag): they count as extreme here, where the full run's standardized
+arithmetic tips them either way by rounding.
+
+The state is a plain dict, saved / loaded with save_lisa_state / load_lisa_state under .cache/incremental/.
+Adding or dropping ZIPs (or changing the weights) needs a new lisa_state.
+'''
+
+LISA_STATE_DIR = os.path.join('.cache', 'incremental')
+
+
+def lisa_state(y, w, zips=None, permutations=PERMUTATIONS, seed=SEED):
+    '''
+    Full local Moran's I run on y (n,) with weights w, kept as a state for update_lisa.
+    zips: ZIP per row, so changes can be given by ZIP (positions otherwise).
+    '''
+    y = np.array(y, dtype=float)
+    if not np.isfinite(y).all():
+        raise ValueError("lisa_state needs a value for every ZIP, drop the missing rows first")
+    adjacency = adjacency_matrix(w)
+    n = len(y)
+    cardinalities = np.diff(adjacency.indptr)
+    neighbours, weights = _padded(adjacency, max(int(cardinalities.max(initial=0)), 1))
+    state = {
+        'zips': None if zips is None else pd.Index(np.asarray(zips).astype(str)),
+        'y': y,
+        'sum': y.sum(),
+        'sumsq': (y * y).sum(),
+        'adjacency': adjacency,
+        'neighbours': neighbours,
+        'weights': weights,
+        'draws': neighbor_draws(n, neighbours.shape[1], permutations, seed),
+        'permutations': permutations,
+        'seed': seed,
+    }
+    state['lag'] = _lags(state, y, np.arange(n))
+    state['above'], state['below'] = _counts(state, y, np.arange(n))
+    return state
+
+
+def update_lisa(state, changes):
+    '''
+    changes: {ZIP (or row position): new value}. Updates state in place and returns lisa_result(state).
+    '''
+    rows = np.array([_position(state, key) for key in changes], dtype=np.int64)
+    values = np.array(list(changes.values()), dtype=float)
+    if not np.isfinite(values).all():
+        raise ValueError("update_lisa can't drop a ZIP, build a new lisa_state without it")
+    old = state['y']
+    new = old.copy()
+    new[rows] = values
+
+    # running sums for the standardization
+    state['sum'] += (values - old[rows]).sum()
+    state['sumsq'] += (values * values - old[rows] * old[rows]).sum()
+
+    # ZIPs with a changed ZIP among their neighbours: new observed lag, every draw re-scored
+    moved = np.unique(state['adjacency'][:, rows].tocoo().row)
+    state['lag'][moved] = _lags(state, new, moved)
+    state['above'][moved], state['below'][moved] = _counts(state, new, moved)
+
+    # everyone else: only the draws with a changed ZIP in them change, swap their old outcome for the new one
+    hits, draw_rows = _draws_with(state, rows, moved)
+    if len(hits):
+        lag = state['lag'][hits]
+        before = _random_lags(state, old, hits, draw_rows)
+        after = _random_lags(state, new, hits, draw_rows)
+        np.add.at(state['above'], hits, (after >= lag).astype(np.int64) - (before >= lag))
+        np.add.at(state['below'], hits, (after <= lag).astype(np.int64) - (before <= lag))
+
+    state['y'] = new
+    return lisa_result(state)
+
+
+def lisa_result(state):
+    '''
+    {'Is', 'q', 'p_sim'} (n,) arrays from the state, as local_moran_batch / Moran_Local would give them.
+    '''
+    y = state['y']
+    n = len(y)
+    mean = state['sum'] / n
+    sd = np.sqrt(max(state['sumsq'] / n - mean * mean, 0.0))
+    with np.errstate(all='ignore'):
+        z = (y - mean) / sd
+        lag = (state['lag'] - mean * state['weights'].sum(1)) / sd
+    Is = (n - 1) / n * z * lag  # sum of z ** 2 is n under this standardization
+
+    # esda's larger count: draws on the far side of the observed value, in the direction z points
+    permutations = state['permutations']
+    larger = np.where(z > 0, state['above'], np.where(z < 0, state['below'], permutations))
+    low_extreme = (permutations - larger) < larger
+    larger[low_extreme] = permutations - larger[low_extreme]
+    return {'Is': Is, 'q': quadrants(z, lag), 'p_sim': (larger + 1.0) / (permutations + 1.0)}
+
+
+def state_table(state, name, alpha=ALPHA, correction='none'):
+    '''
+    zip_code + lisa_<name>_q / _p / _sig / _quad_label / ... for the state, same columns as lisa_table.
+    '''
+    if state['zips'] is None:
+        raise ValueError("state_table needs a state built with zips=")
+    result = {key: value[:, None] for key, value in lisa_result(state).items()}
+    options = {'permutations': state['permutations'], 'seed': state['seed']}
+    mask = np.ones(len(state['y']), dtype=bool)
+    columns = {name: result_columns(f'lisa_{name}', result, 0, mask, alpha, options)}
+    table = assemble_table(pd.DataFrame({'zip_code': state['zips']}), 'zip_code', [name], columns)
+    return apply_correction(table, correction, alpha)
+
+
+def lisa_state_path(name, state_dir=LISA_STATE_DIR):
+    return os.path.join(state_dir, f'lisa_{name}_state.pkl')
+
+
+def load_lisa_state(path):
+    if not os.path.exists(path):
+        return None
+    return pd.read_pickle(path)
+
+
+def save_lisa_state(state, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    pd.to_pickle(state, tmp)
+    os.replace(tmp, path)
+
+
+def _position(state, key):
+    if state['zips'] is None:
+        return int(key)
+    position = state['zips'].get_indexer([str(key)])[0]
+    if position < 0:
+        raise KeyError(f"ZIP {key} isn't in the LISA state, build a new lisa_state to add it")
+    return position
+
+
+def _padded(adjacency, width):
+    # (n, width) neighbour ids and weights, zero weights past each ZIP's neighbour count
+    n = adjacency.shape[0]
+    cardinalities = np.diff(adjacency.indptr)
+    neighbours = np.zeros((n, width), dtype=np.int64)
+    weights = np.zeros((n, width))
+    slots = np.arange(width) < cardinalities[:, None]
+    neighbours[slots] = adjacency.indices
+    weights[slots] = adjacency.data
+    return neighbours, weights
+
+
+def _lags(state, y, rows):
+    # observed raw lags, summed the same way as the random ones so a draw of the actual neighbours ties exactly
+    return (y[state['neighbours'][rows]] * state['weights'][rows]).sum(1)
+
+
+def _random_lags(state, y, rows, draw_rows):
+    # raw lag of each (ZIP, draw) pair, same padded sum as _lags
+    ids = other_ids(state['draws'][draw_rows], rows[:, None])
+    return (y[ids] * state['weights'][rows]).sum(1)
+
+
+def _counts(state, y, rows):
+    # for each ZIP in rows: draws with a random raw lag >= and <= its observed one
+    above = np.empty(len(rows), dtype=np.int64)
+    below = np.empty(len(rows), dtype=np.int64)
+    everything = np.arange(state['permutations'])
+    for k, i in enumerate(rows):
+        lags = _random_lags(state, y, np.full(len(everything), i), everything)
+        above[k] = (lags >= state['lag'][i]).sum()
+        below[k] = (lags <= state['lag'][i]).sum()
+    return above, below
+
+
+def _draws_with(state, changed, skip):
+    # (ZIP, draw) pairs, ZIPs outside skip, whose random neighbourhood includes one of the changed ZIPs
+    draws = state['draws']
+    cardinalities = (state['weights'] != 0).sum(1)
+    keep = np.ones(len(state['y']), dtype=bool)
+    keep[skip] = False
+    pairs = [np.empty(0, dtype=np.int64)]
+    for c in changed:
+        for drawn, side in ((c - 1, np.arange(len(keep)) < c), (c, np.arange(len(keep)) > c)):
+            # a drawn id d lands on ZIP d for ZIPs above it and on d + 1 for ZIPs at or below it, see other_ids
+            draw_rows, slots = np.nonzero(draws == drawn)
+            zips = np.flatnonzero(keep & side)
+            z_idx, d_idx = np.nonzero(slots[None, :] < cardinalities[zips, None])
+            pairs.append(zips[z_idx] * len(draws) + draw_rows[d_idx])
+    # a draw with two changed ZIPs in it is still one pair
+    return np.divmod(np.unique(np.concatenate(pairs)), len(draws))
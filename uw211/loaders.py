@@ -0,0 +1,168 @@
+import ast
+
+import numpy as np
+import pandas as pd
+
+from uw211.cache import iter_csv_cached
+from uw211.ids import CLIENT_IDS_PATH, INTERACTION_IDS_PATH, IdTable, first_occurrence
+
+'''
+Streaming loaders for the raw 2-1-1 Client and Interaction tab exports.
+
+Both exports are cumulative ("All Years") and only a handful of their columns are ever used,
+so instead of pd.read_csv(..., low_memory=False) on the whole file we:
+- read only the columns we need, with explicit compact dtypes
+- read in bounded-size chunks
+- dedup, extract ZIPs and parse call types per chunk, so only the slimmed-down rows are kept
+
+The final cross-chunk dedup runs on the compact frame, so the results (first occurrence wins)
+are the same as the old full-file drop_duplicates.
+
+Client_Id / Interaction_Id are also interned to integer codes (client_code / interaction_code, see
+uw211/ids.py) while streaming, and all the dedup work runs on those codes instead of the strings.
+'''
+
+CLIENT_TAB = '211 Call Data_Client Tab_All Years.csv'
+INTERACTION_TAB = '211 Call Data_Interaction Tab_All Years.csv'
+
+CLIENT_ZIP_COL = 'ClientAddressus_ClientAddressus_zip'
+CALL_TYPE_COL = 'InteractionOption_CallType'
+
+# only the columns the cleanup scripts actually touch, all read as strings
+# (IDs and ZIPs are labels, not numbers - reading them as str also keeps '01234' style values intact)
+CLIENT_DTYPES = {
+    'Client_Id': 'str',
+    CLIENT_ZIP_COL: 'str',
+}
+INTERACTION_DTYPES = {
+    'Interaction_Id': 'str',
+    'Client_Id': 'str',
+    CALL_TYPE_COL: 'str',
+}
+
+CHUNKSIZE = 250_000
+
+
+def extract_zip(values):
+    # pull the 5-digit ZIP out of raw ZIP strings (handles ZIP+4, '78205.0', etc.)
+    return values.astype(str).str.extract(r'(\d{5})', expand=False)
+
+
+def clean_call_type(val):
+    # safely parse and extract the first call type
+    try:
+        parsed = ast.literal_eval(val)
+        return parsed[0] if isinstance(parsed, list) and len(parsed) > 0 else None
+    except:
+        return None
+
+
+def all_call_types(val):
+    # same as clean_call_type but keeps every call type in the list
+    try:
+        parsed = ast.literal_eval(val)
+        return parsed if isinstance(parsed, list) and len(parsed) > 0 else None
+    except:
+        return None
+
+
+def parse_call_types(values, first_only=True):
+    '''
+    Vectorized version of values.apply(clean_call_type).
+
+    The raw InteractionOption_CallType strings only take a few dozen distinct values, so we
+    parse each distinct string once and broadcast the result back with the factorized codes.
+    Missing values come back as None, same as a malformed string.
+    With first_only=False each row gets the full list of call types instead of the first one.
+    '''
+    values = pd.Series(values)
+    parse = clean_call_type if first_only else all_call_types
+    codes, uniques = pd.factorize(values)
+    # one extra None slot at the end so the -1 code for missing values lands on it
+    lookup = np.empty(len(uniques) + 1, dtype=object)
+    lookup[:-1] = [parse(str(u)) for u in uniques]
+    lookup[-1] = None
+    return pd.Series(lookup[codes], index=values.index, dtype=object)
+
+
+def iter_chunks(path, dtypes, chunksize=CHUNKSIZE, all_columns=False):
+    # yields column-pruned chunks of a raw export (from the columnar cache when pyarrow is installed)
+    # all_columns=True keeps every column, the dtypes still apply to the ones listed
+    return iter_csv_cached(path, usecols=None if all_columns else list(dtypes), dtype=dtypes, chunksize=chunksize)
+
+
+def load_clients(path=CLIENT_TAB, chunksize=CHUNKSIZE, client_ids=None, all_columns=False):
+    '''
+    Returns one row per Client_Id (first occurrence) with the raw ZIP, the extracted 5-digit zip_code
+    and the interned client_code.
+    all_columns=True keeps every column of the tab as well (for outputs that write the client rows back out).
+    The number of raw rows read is kept in df.attrs['rows_read'] for the before/after prints.
+    When no IdTable is passed, the persisted client ID table is loaded and saved back.
+    '''
+    persist = client_ids is None
+    if persist:
+        client_ids = IdTable.load(CLIENT_IDS_PATH)
+
+    parts = []
+    rows_read = 0
+    for chunk in iter_chunks(path, CLIENT_DTYPES, chunksize, all_columns):
+        rows_read += len(chunk)
+        codes = client_ids.encode(chunk['Client_Id'])
+        keep = first_occurrence(codes)
+        chunk = chunk.iloc[keep].copy()
+        chunk['client_code'] = codes[keep]
+        chunk['zip_code'] = extract_zip(chunk[CLIENT_ZIP_COL])
+        parts.append(chunk)
+
+    df = _concat(parts, list(CLIENT_DTYPES) + ['client_code', 'zip_code'])
+    df = df.iloc[first_occurrence(df['client_code'])].reset_index(drop=True)
+    df.attrs['rows_read'] = rows_read
+    if persist:
+        client_ids.save(CLIENT_IDS_PATH)
+    return df
+
+
+def load_interactions(path=INTERACTION_TAB, chunksize=CHUNKSIZE, client_ids=None, interaction_ids=None):
+    '''
+    Returns one row per Interaction_Id (first occurrence) with the raw call type, the parsed
+    clean_call_type (None when missing or malformed) and the interned client_code / interaction_code.
+    Rows are NOT dropped on a bad call type here, the scripts decide what to filter so their summaries
+    still line up. The number of raw rows read is kept in df.attrs['rows_read'].
+    When no IdTables are passed, the persisted ID tables are loaded and saved back.
+    '''
+    persist_clients = client_ids is None
+    persist_interactions = interaction_ids is None
+    if persist_clients:
+        client_ids = IdTable.load(CLIENT_IDS_PATH)
+    if persist_interactions:
+        interaction_ids = IdTable.load(INTERACTION_IDS_PATH)
+
+    parts = []
+    rows_read = 0
+    for chunk in iter_chunks(path, INTERACTION_DTYPES, chunksize):
+        rows_read += len(chunk)
+        codes = interaction_ids.encode(chunk['Interaction_Id'])
+        keep = first_occurrence(codes)
+        chunk = chunk.iloc[keep].copy()
+        chunk['interaction_code'] = codes[keep]
+        chunk['client_code'] = client_ids.encode(chunk['Client_Id'])
+        chunk['clean_call_type'] = parse_call_types(chunk[CALL_TYPE_COL])
+        parts.append(chunk)
+
+    df = _concat(parts, list(INTERACTION_DTYPES) + ['interaction_code', 'client_code', 'clean_call_type'])
+    df = df.iloc[first_occurrence(df['interaction_code'])].reset_index(drop=True)
+    # only a few dozen distinct call types, so categories keep these columns tiny
+    df[CALL_TYPE_COL] = df[CALL_TYPE_COL].astype('category')
+    df['clean_call_type'] = df['clean_call_type'].astype('category')
+    df.attrs['rows_read'] = rows_read
+    if persist_clients:
+        client_ids.save(CLIENT_IDS_PATH)
+    if persist_interactions:
+        interaction_ids.save(INTERACTION_IDS_PATH)
+    return df
+
+
+def _concat(parts, columns):
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)
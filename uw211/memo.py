@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+'''
+On-disk memo of spatial statistic results (LISA, bivariate LISA, ...).
+
+The 999-permutation statistics are the slow part of the Moran / LISA scripts, and re-running a script
+to tweak a map re-did all of them even when nothing upstream changed. memoized() keys a result by a
+content hash of everything it depends on - the statistic type, the variable values, the weights
+(neighbour structure and weight values), the permutation count, the seed and any other settings -
+and keeps the result arrays (I values, quadrants, p-values, ...) in .cache/memo/<key>.npz.
+A repeat call with the same inputs loads that file instead of recomputing.
+
+Keys are content hashes, so there's nothing to invalidate: new data or new weights just hash to a
+new key. The directory is an LRU with a size cap (MEMO_MAX_BYTES): every hit touches the file's
+modified time, and after a write the least recently used files are dropped until the total fits.
+'''
+
+MEMO_DIR = os.path.join('.cache', 'memo')
+MEMO_MAX_BYTES = 512 * 1024 * 1024
+
+
+def memo_key(stat, arrays, w=None, **params):
+    '''
+    Content hash for a statistic: stat name, the input arrays (values, dtype and shape),
+    the weights (sparse structure + values, so the transform counts) and the settings in params.
+    '''
+    sha1 = hashlib.sha1(stat.encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        sha1.update(f'{array.dtype.str}{array.shape}'.encode())
+        sha1.update(array.tobytes())
+    if w is not None:
+        matrix = w.sparse.tocsr()
+        matrix.sort_indices()
+        sha1.update(np.ascontiguousarray(matrix.indptr, dtype=np.int64).tobytes())
+        sha1.update(np.ascontiguousarray(matrix.indices, dtype=np.int64).tobytes())
+        sha1.update(np.ascontiguousarray(matrix.data, dtype=np.float64).tobytes())
+    sha1.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return sha1.hexdigest()
+
+
+def memoized(stat, compute, arrays, w=None, memo_dir=MEMO_DIR, max_bytes=MEMO_MAX_BYTES, **params):
+    '''
+    compute() -> {name: array}, run only on a miss. Returns the same dict from the memo on a hit.
+    arrays / w / params are what the result depends on (see memo_key); params aren't passed to compute.
+    '''
+    path = os.path.join(memo_dir, f'{stat}-{memo_key(stat, arrays, w, **params)}.npz')
+    result = _load(path)
+    if result is not None:
+        return result
+
+    result = compute()
+    os.makedirs(memo_dir, exist_ok=True)
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp.npz'  # unique name so parallel runs don't trip over each other
+    np.savez(tmp, **result)
+    os.replace(tmp, path)
+    evict(memo_dir, max_bytes)
+    return result
+
+
+def evict(memo_dir=MEMO_DIR, max_bytes=MEMO_MAX_BYTES):
+    # drop least recently used results until the memo fits in max_bytes
+    if not os.path.isdir(memo_dir):
+        return
+    entries = []
+    for name in os.listdir(memo_dir):
+        if name.endswith('.npz') and '.tmp' not in name:
+            stat = os.stat(os.path.join(memo_dir, name))
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(memo_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def clear_memo(memo_dir=MEMO_DIR):
+    evict(memo_dir, max_bytes=0)
+
+
+def _load(path):
+    try:
+        with np.load(path) as stored:
+            result = {name: stored[name] for name in stored.files}
+    except (FileNotFoundError, OSError, ValueError):
+        return None  # not there yet, or a half-written / corrupt file - recompute
+    try:
+        os.utime(path)  # mark as recently used
+    except FileNotFoundError:
+        pass
+    return result
@@ -0,0 +1,30 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+'''
+Worker pools shared by the batch statistics (uw211/lisa.py, ensemble.py, spearman.py).
+
+n_jobs follows the scikit-learn convention: 1 (or None) runs in the calling process, -1 uses every core,
+any other number is the worker count. Workers are processes where the OS can fork them, threads otherwise.
+
+Windows can't fork, and a spawned process pool would re-run the calling script in every worker (the scripts
+have no __main__ guard), so it gets threads. Those only help where numpy releases the GIL, e.g. the Spearman
+batches; the per-ZIP permutation loops in lisa.py (and the seed ensemble built on them) run no faster there.
+'''
+
+
+def n_workers(n_jobs):
+    # worker count for an n_jobs setting
+    if n_jobs is None or n_jobs == 1:
+        return 1
+    if n_jobs < 0:
+        return os.cpu_count() or 1
+    return int(n_jobs)
+
+
+def worker_pool(workers):
+    # executor with `workers` workers, use as a context manager
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    return ThreadPoolExecutor(workers)
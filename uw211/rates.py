@@ -0,0 +1,92 @@
+import numpy as np
+
+from uw211.lisa import PERMUTATIONS, moran_global
+
+'''
+Population-aware caller rates: Empirical Bayes smoothing and Moran's I for rates.
+
+callers_per_1000 is total_callers / population * 1000 with missing population filled with 1, so a ZIP with
+no population estimate gets its raw caller count as a rate, and a small ZIP's rate swings with every caller.
+Here rates come straight from the counts (total_callers) and the population at risk (Pop_Estimate), and ZIPs
+without a usable population are left missing instead:
+- eb_rates: Empirical Bayes smoothed rates (Marshall 1991, esda's Empirical_Bayes). Each ZIP's rate is pulled
+  toward the overall rate, more so the smaller its population, so a ZIP with few residents can't produce an
+  extreme rate from a handful of callers. A rate built on many callers is left almost as it is: downtown 78205
+  (thousands of callers, ~2972 per 1,000) stays an outlier and is still dropped by hand where the scripts do
+- eb_zscores: the Assuncao-Reis EB standardized rates (esda's assuncao_rate) - the rate's distance from the
+  overall rate in units of its own EB standard error. This is what Moran_Rate / Moran_Local_Rate score, and
+  it is a drop-in column for lisa_table / local_moran_batch and the other local engines
+- moran_rate: global Moran's I on eb_zscores, same as esda's Moran_Rate(adjusted=True)
+
+Everything is vectorized over columns as well as ZIPs: pass (n ZIPs, k) arrays of counts (e.g. one column per
+year) with one population column or one per year, and every column is smoothed against its own overall rate.
+'''
+
+PER = 1000
+
+
+def crude_rates(events, population, per=PER):
+    # events / population * per, missing where the population is missing or not positive
+    events, population, flat = _prepare(events, population)
+    return _shaped(events / population * per, flat)
+
+
+def eb_rates(events, population, per=PER):
+    '''
+    Empirical Bayes smoothed rates * per, same shape as events.
+    The between-ZIP variance is floored at 0 (esda leaves it negative, which can push rates past the mean).
+    '''
+    events, population, flat = _prepare(events, population)
+    rate, mean, between = _moments(events, population)
+    between = np.maximum(between, 0)
+    weight = between / (between + mean / population)
+    return _shaped((weight * rate + (1 - weight) * mean) * per, flat)
+
+
+def eb_zscores(events, population):
+    '''
+    Assuncao-Reis EB standardized rates, same shape as events: (rate - overall rate) / EB standard error.
+    Equal to esda.smoothing.assuncao_rate column by column on the ZIPs with a usable population.
+    '''
+    events, population, flat = _prepare(events, population)
+    rate, mean, between = _moments(events, population)
+    variance = between + mean / population
+    variance = np.where(variance < 0, mean / population, variance)
+    return _shaped((rate - mean) / np.sqrt(variance), flat)
+
+
+def moran_rate(events, population, w, inference='permutation', permutations=PERMUTATIONS):
+    '''
+    Global Moran's I for a rate, as esda's Moran_Rate(events, population, w) (Assuncao-Reis adjusted),
+    with .p / .inference from moran_global. ZIPs without a usable population are scored at the overall rate (z = 0).
+    '''
+    z = eb_zscores(np.asarray(events, dtype=float).ravel(), np.asarray(population, dtype=float).ravel())
+    return moran_global(np.nan_to_num(z), w, inference, permutations)
+
+
+def _prepare(events, population):
+    # float (n, k) events and population, both missing wherever the population can't be divided by
+    events = np.asarray(events, dtype=float)
+    population = np.asarray(population, dtype=float)
+    flat = events.ndim == 1
+    events = events.reshape(len(events), -1)
+    population = np.broadcast_to(population.reshape(len(population), -1), events.shape)
+    usable = (population > 0) & np.isfinite(events)
+    events = np.where(usable, events, np.nan)
+    population = np.where(usable, population, np.nan)
+    return events, population, flat
+
+
+def _shaped(values, flat):
+    return values[:, 0] if flat else values
+
+
+def _moments(events, population):
+    # per column: crude rates, overall rate, and the EB estimate of the between-ZIP rate variance (can be < 0)
+    rate = events / population
+    total = np.nansum(population, axis=0)
+    mean = np.nansum(events, axis=0) / total
+    n = np.isfinite(rate).sum(axis=0)
+    spread = np.nansum(population * (rate - mean) ** 2, axis=0) / total
+    between = spread - mean / (total / n)
+    return rate, mean, between
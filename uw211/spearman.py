@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+from scipy.stats import t as t_dist
+
+from uw211.lisa import PERMUTATIONS, SEED
+from uw211.parallel import n_workers, worker_pool
+
+'''
+Batch Spearman correlations between need indicators and caller rates, with resampling inference.
+
+The Spearman scripts called scipy.stats.spearmanr once per indicator (poverty, ALICE, poverty + ALICE vs
+callers_per_1000) and only reported rho and the asymptotic p-value. spearman_batch ranks every column once
+and gets the whole indicator x demand rho matrix from one product of the standardized ranks (rho and p are
+the same as spearmanr's), then adds:
+- permutation p-values: the demand ranks are shuffled against the indicators, `permutations` times, every
+  shuffle scored for all pairs at once; p = (shuffles with |rho| at least the observed + 1) / (permutations + 1)
+- bootstrap percentile confidence intervals: ZIPs resampled with replacement, re-ranked, rho recomputed.
+  Each column's distinct values are numbered once up front, so re-ranking a resample is a bincount of those
+  numbers (how many resampled ZIPs fall at or below each value) instead of another sort
+
+Shuffles and resamples run in batches of BATCH, each batch from its own seeded stream, so the results are
+the same for any n_jobs (-1 = every core, uw211/parallel.py). The batches are mostly numpy products, so
+they also spread over the thread pool used where the OS can't fork.
+'''
+
+BOOTSTRAPS = 2000
+CONFIDENCE = 0.95
+BATCH = 100
+
+
+def rank_columns(X):
+    # average ranks per column (ties share their mean rank, as spearmanr does), (n,) or (n, k) -> (n, k)
+    X = np.asarray(X, dtype=float)
+    return rankdata(X.reshape(len(X), -1), axis=0)
+
+
+def spearman_matrix(X, Y):
+    '''
+    rho (kx, ky) and two-sided asymptotic p (kx, ky) for every column of X against every column of Y,
+    rows must be complete (drop missing values first, as spearmanr with the default nan_policy needs).
+    '''
+    Rx = _standardized(rank_columns(X))
+    Ry = _standardized(rank_columns(Y))
+    rho = np.clip(Rx.T @ Ry, -1, 1)
+    return rho, _asymptotic_p(rho, len(Rx))
+
+
+def spearman_batch(X, Y, permutations=PERMUTATIONS, bootstraps=BOOTSTRAPS, confidence=CONFIDENCE, seed=SEED,
+                   n_jobs=1):
+    '''
+    Returns a dict of (kx, ky) arrays: rho, p (asymptotic), p_perm, ci_low, ci_high.
+    permutations=0 / bootstraps=0 skip that part (its arrays come back as NaN).
+    '''
+    X = np.asarray(X, dtype=float).reshape(len(X), -1)
+    Y = np.asarray(Y, dtype=float).reshape(len(Y), -1)
+    Rx = _standardized(rank_columns(X))
+    Ry = _standardized(rank_columns(Y))
+    rho = np.clip(Rx.T @ Ry, -1, 1)
+    p = _asymptotic_p(rho, len(Rx))
+
+    # (kind, first replicate, last replicate), each batch seeded with [seed, kind, first replicate]
+    tasks = [('permutation', start, min(start + BATCH, permutations)) for start in range(0, permutations, BATCH)]
+    tasks += [('bootstrap', start, min(start + BATCH, bootstraps)) for start in range(0, bootstraps, BATCH)]
+    workers = min(n_workers(n_jobs), max(len(tasks), 1))
+    values = _value_codes(X), _value_codes(Y)
+    args = [(kind, start, stop, seed, Rx, Ry, rho, values) for kind, start, stop in tasks]
+    if workers == 1:
+        results = [_replicates(*a) for a in args]
+    else:
+        with worker_pool(workers) as pool:
+            results = list(pool.map(_replicates, *zip(*args)))
+
+    extreme = sum((r for (kind, _, _), r in zip(tasks, results) if kind == 'permutation'), np.zeros(rho.shape))
+    p_perm = (extreme + 1) / (permutations + 1) if permutations else np.full(rho.shape, np.nan)
+
+    ci_low = ci_high = np.full(rho.shape, np.nan)
+    boot = [r for (kind, _, _), r in zip(tasks, results) if kind == 'bootstrap']
+    if boot:
+        boot = np.concatenate(boot)
+        tail = (1 - confidence) / 2 * 100
+        ci_low, ci_high = np.nanpercentile(boot, [tail, 100 - tail], axis=0)
+    return {'rho': rho, 'p': p, 'p_perm': p_perm, 'ci_low': ci_low, 'ci_high': ci_high}
+
+
+def spearman_table(df, metrics, demand, confidence=CONFIDENCE, **options):
+    '''
+    One row per indicator against the demand column, in the 211_Spearman_Correlation_Results.csv layout
+    (Metric, Spearman ρ, p-value) plus the permutation p-value and the bootstrap interval.
+    metrics: {row name: column}, e.g. {'Poverty Rate': 'poverty_rate', ...}. Rows missing any of the columns
+    are left out.
+    '''
+    df = df.dropna(subset=list(metrics.values()) + [demand])
+    result = spearman_batch(df[list(metrics.values())], df[demand], confidence=confidence, **options)
+    level = f'{confidence * 100:g}%'
+    return pd.DataFrame({
+        'Metric': list(metrics),
+        'Spearman ρ': result['rho'][:, 0],
+        'p-value': result['p'][:, 0],
+        'permutation p-value': result['p_perm'][:, 0],
+        f'{level} CI lower': result['ci_low'][:, 0],
+        f'{level} CI upper': result['ci_high'][:, 0],
+    })
+
+
+def _standardized(R, axis=-2):
+    # centred ranks scaled to unit length along the ZIP axis, so a dot product is rho (NaN for constant columns)
+    R = R - R.mean(axis=axis, keepdims=True)
+    norm = np.sqrt((R ** 2).sum(axis=axis, keepdims=True))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return R / norm
+
+
+def _asymptotic_p(rho, n):
+    # spearmanr's two-sided p: t = rho * sqrt((n - 2) / (1 - rho^2)) on n - 2 degrees of freedom
+    with np.errstate(divide='ignore'):
+        t = rho * np.sqrt((n - 2) / ((1 + rho) * (1 - rho)))
+    return 2 * t_dist.sf(np.abs(t), n - 2)
+
+
+def _value_codes(X):
+    # per column: each ZIP's distinct-value number 0..u-1 (in value order) and u
+    codes = np.empty(X.shape, dtype=np.int64)
+    sizes = []
+    for j in range(X.shape[1]):
+        distinct, codes[:, j] = np.unique(X[:, j], return_inverse=True)
+        sizes.append(len(distinct))
+    return codes, sizes
+
+
+def _resampled_ranks(values, rows):
+    # average ranks within each resample, rows (b, n) -> (b, n, k), same as rankdata(X[rows], axis=1)
+    codes, sizes = values
+    b = len(rows)
+    ranks = np.empty(rows.shape + (len(sizes),))
+    for j, u in enumerate(sizes):
+        drawn = codes[rows, j]
+        counts = np.bincount((np.arange(b)[:, None] * u + drawn).ravel(), minlength=b * u).reshape(b, u)
+        average = np.cumsum(counts, axis=1) - (counts - 1) / 2  # ties share the mean of their ranks
+        ranks[:, :, j] = np.take_along_axis(average, drawn, axis=1)
+    return ranks
+
+
+def _replicates(kind, start, stop, seed, Rx, Ry, rho, values):
+    # permutation: count of shuffles with |rho| >= observed (kx, ky); bootstrap: rho per resample (b, kx, ky)
+    rng = np.random.default_rng([seed, kind == 'bootstrap', start])
+    n = len(Rx)
+    if kind == 'permutation':
+        order = rng.permuted(np.tile(np.arange(n), (stop - start, 1)), axis=1)
+        shuffled = np.einsum('nk,bnl->bkl', Rx, Ry[order])
+        # tolerance: a shuffle that reproduces the observed ranking can differ from rho in the last bits
+        return (np.abs(shuffled) >= np.abs(rho) - 1e-12).sum(0)
+    rows = rng.integers(0, n, (stop - start, n))
+    Rxb = _standardized(_resampled_ranks(values[0], rows))
+    Ryb = _standardized(_resampled_ranks(values[1], rows))
+    return np.einsum('bnk,bnl->bkl', Rxb, Ryb)
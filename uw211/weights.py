@@ -0,0 +1,158 @@
+import hashlib
+import os
+
+import numpy as np
+from libpysal.weights import W, Queen
+from scipy import sparse
+
+from uw211.geo import geometry_version, load_zip_shapes
+
+'''
+Disk cache for the Queen contiguity weights.
+
+Queen.from_dataframe works out adjacency from the polygon topology, which is the slowest non-permutation
+step in the LISA / Moran scripts and was being redone several times per script on the same ZIPs.
+queen_weights stores the binary adjacency as a sparse matrix under .cache/weights/, keyed by a hash of the
+sorted ZIP list plus the geometry version of the local shapes store (uw211/geo.py), and hands back a
+row-standardized W built straight from that matrix - the polygons are only looked at on a cache miss.
+
+The returned W is ordered like the rows of the GeoDataFrame passed in, with ids 0..n-1
+(same as Queen.from_dataframe(gdf)), so it drops straight into Moran / Moran_Local.
+
+Queen contiguity is a pairwise property, so the weights for any ZIP subset (e.g. just Bexar County) are the
+induced sub-graph of the statewide adjacency. subset_weights cuts that sub-graph out of the cached statewide
+matrix instead of re-running the polygon topology on the subset.
+'''
+
+WEIGHTS_DIR = os.path.join('.cache', 'weights')
+
+_statewide = {}  # geometry version -> (sorted ZIPs, adjacency), so repeated subsets in one run skip the disk
+
+
+def queen_weights(gdf, zip_col='zip_code', transform='r'):
+    '''
+    Drop-in for:
+        w = Queen.from_dataframe(gdf)
+        w.transform = 'r'
+    gdf rows must be ZIP shapes from uw211.geo.load_zip_shapes (one row per ZIP).
+    '''
+    zips = gdf[zip_col].astype(str).to_numpy()
+    if len(np.unique(zips)) != len(zips):
+        # duplicate ZIP rows can't be keyed by ZIP, build it the old way
+        w = Queen.from_dataframe(gdf, use_index=False)
+        w.transform = transform
+        return w
+
+    state_zips, state_adjacency = load_statewide_adjacency()
+    if state_adjacency is not None and np.isin(zips, state_zips).all():
+        return _subset(state_zips, state_adjacency, zips, transform)
+
+    order = np.argsort(zips, kind='stable')
+    adjacency = load_adjacency(zips[order])
+    if adjacency is None:
+        adjacency = _queen_adjacency(gdf.iloc[order])
+        save_adjacency(zips[order], adjacency)
+
+    # sorted-ZIP adjacency -> gdf row order
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    adjacency = adjacency[rank][:, rank]
+    return weights_from_adjacency(adjacency, transform)
+
+
+def statewide_adjacency():
+    '''
+    (sorted ZIPs, binary CSR adjacency) for every ZIP in the local shapes store.
+    Built from the polygons once per geometry version, loaded from disk after that.
+    '''
+    version = geometry_version()
+    if version in _statewide:
+        return _statewide[version]
+    zips, adjacency = load_statewide_adjacency()
+    if adjacency is None:
+        gdf = load_zip_shapes(columns=[]).drop_duplicates('zip_code').sort_values('zip_code')
+        zips = gdf['zip_code'].to_numpy(dtype=str)
+        adjacency = _queen_adjacency(gdf)
+        save_adjacency(zips, adjacency)
+        _write_statewide_pointer(zips)
+    _statewide[version] = zips, adjacency
+    return zips, adjacency
+
+
+def subset_weights(zips, transform='r', silence_warnings=False):
+    '''
+    Row-standardized W for a ZIP subset (any order, e.g. gdf['zip_code'] or county_zips(df_area, 'Bexar')),
+    cut out of the statewide adjacency. Rows follow `zips`, ids are 0..n-1.
+    Neighbours outside the subset are dropped, so ZIPs on the edge of the cut can become islands
+    (no neighbours -> lag 0, LISA p-value 1/(permutations+1)); they're listed in w.islands.
+    ZIPs that aren't in the shapes store are islands too.
+    '''
+    state_zips, state_adjacency = statewide_adjacency()
+    return _subset(state_zips, state_adjacency, np.asarray(zips).astype(str), transform, silence_warnings)
+
+
+def weights_from_adjacency(adjacency, transform='r', silence_warnings=False):
+    # W with ids 0..n-1 from a binary CSR adjacency; rows without neighbours stay in as islands
+    adjacency = sparse.csr_matrix(adjacency)
+    adjacency.sort_indices()
+    indptr, indices = adjacency.indptr, adjacency.indices
+    neighbors = {i: indices[indptr[i]:indptr[i + 1]].tolist() for i in range(adjacency.shape[0])}
+    weights = {i: [1.0] * len(nbrs) for i, nbrs in neighbors.items()}
+    w = W(neighbors, weights, id_order=list(range(adjacency.shape[0])), silence_warnings=silence_warnings)
+    w.transform = transform
+    return w
+
+
+def weights_key(sorted_zips, version=None):
+    version = geometry_version() if version is None else version
+    return hashlib.sha1((version + ':' + '|'.join(sorted_zips)).encode()).hexdigest()[:20]
+
+
+def load_adjacency(sorted_zips, weights_dir=WEIGHTS_DIR):
+    path = os.path.join(weights_dir, f'queen-{weights_key(sorted_zips)}.npz')
+    if not os.path.exists(path):
+        return None
+    return sparse.load_npz(path).tocsr()
+
+
+def save_adjacency(sorted_zips, adjacency, weights_dir=WEIGHTS_DIR):
+    os.makedirs(weights_dir, exist_ok=True)
+    path = os.path.join(weights_dir, f'queen-{weights_key(sorted_zips)}.npz')
+    tmp = path + '.tmp.npz'
+    sparse.save_npz(tmp, sparse.csr_matrix(adjacency, dtype=np.int8))
+    os.replace(tmp, path)
+
+
+def load_statewide_adjacency(weights_dir=WEIGHTS_DIR):
+    # (None, None) until statewide_adjacency has been built for the current shapes
+    pointer = os.path.join(weights_dir, f'statewide-{geometry_version()}.npy')
+    if not os.path.exists(pointer):
+        return None, None
+    zips = np.load(pointer)
+    return zips, load_adjacency(zips, weights_dir)
+
+
+def _write_statewide_pointer(zips, weights_dir=WEIGHTS_DIR):
+    # the statewide ZIP list for this geometry version, so the statewide matrix can be found without the shapes
+    for old in os.listdir(weights_dir):
+        if old.startswith('statewide-'):
+            os.remove(os.path.join(weights_dir, old))
+    np.save(os.path.join(weights_dir, f'statewide-{geometry_version()}.npy'), zips)
+
+
+def _subset(state_zips, state_adjacency, zips, transform, silence_warnings=False):
+    # induced sub-graph of the statewide adjacency, rows / cols in `zips` order
+    pos = np.searchsorted(state_zips, zips)
+    pos = np.minimum(pos, len(state_zips) - 1)
+    known = state_zips[pos] == zips
+    picker = sparse.csr_matrix((np.ones(known.sum(), dtype=np.int8), (np.flatnonzero(known), pos[known])),
+                               shape=(len(zips), len(state_zips)))
+    adjacency = picker @ state_adjacency @ picker.T
+    return weights_from_adjacency(adjacency, transform, silence_warnings)
+
+
+def _queen_adjacency(gdf):
+    w = Queen.from_dataframe(gdf, use_index=False, silence_warnings=True)
+    adjacency = w.sparse.tocsr()  # rows / cols follow gdf row order (ids 0..n-1)
+    return sparse.csr_matrix((np.ones_like(adjacency.data, dtype=np.int8), adjacency.indices, adjacency.indptr),
+                             shape=adjacency.shape)